@@ -21,10 +21,11 @@ from ipi.interfaces.sockets import InterfaceSocket
 from ipi.utils.depend import dobject
 from ipi.utils.depend import dstrip
 from ipi.utils.io import read_file
-from ipi.utils.units import unit_to_internal
+from ipi.utils.units import unit_to_internal, UnitMap
+from ipi.utils.mathtools import grid_add_gaussian, grid_spline
 
 
-__all__ = ['ForceField', 'FFSocket', 'FFLennardJones', 'FFPES2014', 'FFDebye', 'FFPlumed', 'FFYaff']
+__all__ = ['ForceField', 'FFSocket', 'FFLennardJones', 'FFPES2014', 'FFDebye', 'FFPlumed', 'FFYaff', 'FFGridMetaD']
 
 
 class ForceRequest(dict):
@@ -62,6 +63,11 @@ class ForceField(dobject):
         _doloop: A list of booleans. Used to decide when to stop running the
             polling loop.
         _threadlock: Python handle used to lock the thread held in _thread.
+        _reqpool: A dictionary of the last request filed for each request id,
+            recycled by queue() once it has been released.
+        _par_str: The parameter string sent to the driver, built once.
+        _activehere: The per-coordinate indices of the active atoms, cached
+            for the system size they were last built for.
     """
 
     def __init__(self, latency=1.0, name="", pars=None, dopbc=True, active=np.array([-1])):
@@ -91,6 +97,47 @@ class ForceField(dobject):
         self._thread = None
         self._doloop = [False]
         self._threadlock = threading.Lock()
+        self._reqpool = {}
+        self._par_str = None
+        self._activehere = None
+
+    def get_par_str(self):
+        """Returns the parameter string sent to the driver on initialisation,
+        building it from the pars dictionary the first time it is needed."""
+
+        if self._par_str is None:
+            par_str = " "
+            if not self.pars is None:
+                for k, v in self.pars.items():
+                    par_str += k + " : " + str(v) + " , "
+            self._par_str = par_str
+        return self._par_str
+
+    def get_active(self, n3):
+        """Returns the indices of the coordinates that are sent to the driver.
+
+        Indexes come from input in a per atom basis and we need to make a per
+        atom-coordinate basis. If the whole system is active a full slice is
+        returned, so that positions can be sent without any copy.
+
+        Args:
+            n3: The number of coordinates (3 times the number of atoms).
+        """
+
+        if self._activehere is not None and self._activehere[0] == n3:
+            return self._activehere[1]
+
+        if self.active[0] == -1:
+            activehere = slice(None)
+        else:
+            activehere = (3 * np.asarray(self.active)[:, np.newaxis] + np.arange(3)).flatten()
+
+            # Perform sanity check for active atoms
+            if (len(activehere) > n3 or activehere[-1] > (n3 - 1)):
+                raise ValueError("There are more active atoms than atoms!")
+
+        self._activehere = (n3, activehere)
+        return activehere
 
     def queue(self, atoms, cell, reqid=-1):
         """Adds a request.
@@ -109,59 +156,52 @@ class ForceField(dobject):
         Returns:
             A list giving the status of the request of the form {'pos': An array
             giving the atom positions folded back into the unit cell,
-            'cell': Cell object giving the system box, 'pars': parameter string,
+            'cell': a tuple with the cell matrix and its inverse, 'active':
+            the indices of the coordinates to be sent to the driver,
+            'pars': parameter string,
             'result': holds the result as a list once the computation is done,
             'status': a string labelling the status of the calculation,
             'id': the id of the request, usually the bead number, 'start':
             the starting time for the calculation, used to check for timeouts.}.
         """
 
-        par_str = " "
-
-        if not self.pars is None:
-            for k, v in self.pars.items():
-                par_str += k + " : " + str(v) + " , "
-        else:
-            par_str = " "
-
-        pbcpos = dstrip(atoms.q).copy()
-
-        # Indexes come from input in a per atom basis and we need to make a per atom-coordinate basis
-        # Reformat indexes for full system (default) or piece of system
-#        fullat=True
-        if self.active[0] == -1:
-            activehere = np.array([i for i in range(len(pbcpos))])
-        else:
-            activehere = np.array([[3 * n, 3 * n + 1, 3 * n + 2] for n in self.active])
-
-#           fullat=False
-#
-#        if (self.active[0]!=-1 and fullat==False):
-#           temp=np.array([[3*n, 3*n+1, 3*n+2] for n in self.active])
-
-        # Reassign active indexes in order to use them
-        activehere = activehere.flatten()
-
-        # Perform sanity check for active atoms
-        if (len(activehere) > len(pbcpos) or activehere[-1] > (len(pbcpos) - 1)):
-            raise ValueError("There are more active atoms than atoms!")
-
+        pbcpos = dstrip(atoms.q)
+        activehere = self.get_active(len(pbcpos))
+
+        # recycles the request that was last filed with the same id, if it has
+        # already been released, so that in a steady state no new buffers
+        # need to be allocated. anonymous requests always get a new object.
+        newreq = None
+        if reqid >= 0:
+            with self._threadlock:
+                newreq = self._reqpool.get(reqid)
+                if newreq is not None and (newreq in self.requests or len(newreq["pos"]) != len(pbcpos)):
+                    newreq = None
+
+        if newreq is None:
+            newreq = ForceRequest({
+                "id": reqid,
+                "pos": np.zeros(len(pbcpos), float),
+                "active": activehere,
+                "cell": (np.zeros((3, 3), float), np.zeros((3, 3), float)),
+                "pars": self.get_par_str()
+            })
+            if reqid >= 0:
+                with self._threadlock:
+                    self._reqpool[reqid] = newreq
+
+        newreq["pos"][:] = pbcpos
         if self.dopbc:
-            cell.array_pbc(pbcpos)
-
-        newreq = ForceRequest({
-            "id": reqid,
-            "pos": pbcpos,
-            "active": activehere,
-            "cell": (dstrip(cell.h).copy(), dstrip(cell.ih).copy()),
-            "pars": par_str,
-            "result": None,
-            "status": "Queued",
-            "start": -1,
-            "t_queued": time.time(),
-            "t_dispatched": 0,
-            "t_finished": 0
-        })
+            cell.array_pbc(newreq["pos"])
+        newreq["cell"][0][:] = dstrip(cell.h)
+        newreq["cell"][1][:] = dstrip(cell.ih)
+        newreq["active"] = activehere
+        newreq["result"] = None
+        newreq["status"] = "Queued"
+        newreq["start"] = -1
+        newreq["t_queued"] = time.time()
+        newreq["t_dispatched"] = 0
+        newreq["t_finished"] = 0
 
         self._threadlock.acquire()
         try:
@@ -732,3 +772,150 @@ class FFYaff(ForceField):
         r["result"] = [e, -gpos.ravel(), -vtens, ""]
         r["status"] = "Done"
         r["t_finished"] = time.time()
+
+
+class FFGridMetaD(ForceField):
+
+    """Metadynamics bias on collective variables defined as in ghts.
+
+    The bias is kept on a regular grid of the collective variables. The
+    Gaussians are added to the grid when they are deposited, and the bias
+    and its gradient are obtained by spline interpolation of the grid, so
+    that their cost does not depend on the number of Gaussians. The
+    Gaussians are deposited by the metadynamics smotion, which calls
+    mtd_update at the end of each step.
+
+    Attributes:
+        ghts_input: The ghts state file with the definition of the
+            collective variables.
+        coordinate: "cv" to bias the collective variables of the state file,
+            "sigma" to bias the distance from the ghts dividing surface.
+        grid_min, grid_max: The range of the grid along each dimension.
+        grid_bins: The number of nodes of the grid along each dimension.
+        height: The height of the Gaussians.
+        width: The widths of the Gaussians along each dimension.
+        pace: A Gaussian is deposited every pace calls to mtd_update.
+        grid: The bias at the nodes of the grid.
+        mtdstep: The number of calls to mtd_update so far.
+    """
+
+    def __init__(self, latency=1.0e-3, name="", pars=None, dopbc=False, ghts_input="ghts.json", coordinate="cv",
+                 grid_min=None, grid_max=None, grid_bins=None, height=0.0, width=None, pace=1, grid=None, mtdstep=0):
+        """Initialises FFGridMetaD.
+
+        Args:
+           pars: Optional dictionary, giving the parameters needed by the driver.
+        """
+
+        # the ghts tools need molmod, which is only required for this
+        from ghts import io as ghtsio
+        from ghts.cv import get_cv
+        from ghts.cv_geometry import normal
+
+        # NEVER DO PBC -- the collective variables are computed without.
+        super(FFGridMetaD, self).__init__(latency, name, pars, dopbc=False)
+
+        state = ghtsio.load_state(ghts_input)
+        if state is None:
+            raise ValueError("Cannot read the ghts state file " + ghts_input)
+        self.cvdefs = state["CV"]
+        self.get_cv = get_cv
+
+        self.ghts_input = ghts_input
+        self.coordinate = coordinate
+        if coordinate == "sigma":
+            # same units as in ghts: the coordinate is the distance from the
+            # dividing surface, in mass-weighted CV space
+            amu = 1.0 / UnitMap["mass"]["dalton"]
+            minv = np.linalg.inv(np.asarray(state["ghts"]["M"], float) * amu)
+            n = normal(np.asarray(state["ghts"]["n"], float) * np.sqrt(amu), minv)
+            self.sigma_z = np.asarray(state["ghts"]["z"], float)
+            self.sigma_n = np.dot(minv, n) * np.sqrt(amu)
+            ndim = 1
+        elif coordinate == "cv":
+            ndim = len(self.cvdefs)
+        else:
+            raise ValueError("Unknown metadynamics coordinate " + coordinate)
+
+        if grid_min is None or grid_max is None or grid_bins is None:
+            raise ValueError("Must provide the range and the number of nodes of the metadynamics grid.")
+        self.grid_min = np.asarray(grid_min, float)
+        self.grid_max = np.asarray(grid_max, float)
+        self.grid_bins = np.asarray(grid_bins, int)
+        if not (len(self.grid_min) == len(self.grid_max) == len(self.grid_bins) == ndim):
+            raise ValueError("The metadynamics grid must have %d dimensions" % ndim)
+        if (self.grid_bins < 2).any() or (self.grid_max <= self.grid_min).any():
+            raise ValueError("Invalid metadynamics grid")
+        self.dx = (self.grid_max - self.grid_min) / (self.grid_bins - 1)
+
+        self.height = height
+        self.width = np.ones(ndim) if width is None else np.asarray(width, float)
+        if len(self.width) != ndim:
+            raise ValueError("The metadynamics Gaussians must have %d widths" % ndim)
+        self.pace = pace
+        self.mtdstep = mtdstep
+
+        if grid is None or len(grid) == 0:
+            self.grid = np.zeros(self.grid_bins)
+        elif np.size(grid) == np.prod(self.grid_bins):
+            self.grid = np.asarray(grid, float).reshape(self.grid_bins)
+        else:
+            raise ValueError("The size of the metadynamics grid does not match its number of nodes")
+
+    def cvs(self, q):
+        """Returns the biased coordinates of a configuration and their
+        gradients with respect to the atomic positions."""
+
+        values, gradients = zip(*[self.get_cv(q, c) for c in self.cvdefs])
+        s = np.asarray(values, float)
+        ds = np.asarray(gradients)
+        if self.coordinate == "sigma":
+            s = np.atleast_1d(np.dot(self.sigma_n, s - self.sigma_z))
+            ds = np.dot(self.sigma_n, ds)[np.newaxis, :]
+        return s, ds
+
+    def poll(self):
+        """Polls the forcefield checking if there are requests that should
+        be answered, and if necessary evaluates the associated forces and energy."""
+
+        # we have to be thread-safe, as in multi-system mode this might get
+        # called by many threads at once, and mtd_update changes the grid
+        self._threadlock.acquire()
+        try:
+            for r in self.requests:
+                if r["status"] == "Queued":
+                    r["status"] = "Running"
+                    r["t_dispatched"] = time.time()
+                    self.evaluate(r)
+        finally:
+            self._threadlock.release()
+
+    def evaluate(self, r):
+        """Interpolates the bias and its gradient from the grid."""
+
+        s, ds = self.cvs(r["pos"])
+        v, dv = grid_spline(self.grid, self.grid_min, self.dx, s)
+
+        r["result"] = [v, -np.dot(dv, ds), np.zeros((3, 3), float), ""]
+        r["status"] = "Done"
+        r["t_finished"] = time.time()
+
+    def mtd_update(self, pos, cell):
+        """Deposits a Gaussian at the coordinates of pos every pace calls.
+
+        Returns:
+            True if the bias has changed.
+        """
+
+        self.mtdstep += 1
+        if self.pace <= 0 or self.mtdstep % self.pace != 0:
+            return False
+
+        s = self.cvs(pos)[0]
+        self._threadlock.acquire()
+        try:
+            grid_add_gaussian(self.grid, self.grid_min, self.dx, s, self.height, self.width)
+        finally:
+            self._threadlock.release()
+        info(" @ForceField: Deposited a metadynamics Gaussian at " + " ".join(["%.6e" % x for x in s]), verbosity.high)
+        return True
@@ -26,7 +26,7 @@ from ipi.utils.nmtransform import nm_rescale
 from ipi.engine.beads import Beads
 
 
-__all__ = ['Forces', 'ForceComponent']
+__all__ = ['Forces', 'ForceComponent', 'ForceCopies']
 
 
 fbuid = 0
@@ -144,6 +144,15 @@ class ForceBead(dobject):
             if self.request is None and dd(self).ufvx.tainted():
                 self.request = self.ff.queue(self.atoms, self.cell, reqid=self.uid)
 
+    def release(self):
+        """Withdraws the job sent to the interface queue, if its result has
+        not been collected, so that the forcefield drops it."""
+
+        with self._threadlock:
+            if self.request is not None and self._getallcount == 0:
+                self.ff.release(self.request)
+                self.request = None
+
     def get_all(self):
         """Driver routine.
 
@@ -370,6 +379,13 @@ class ForceComponent(dobject):
         for b in range(self.nbeads):
             self._forces[b].queue()
 
+    def release(self):
+        """Withdraws the force calculations that were queued and not
+        collected."""
+
+        for b in range(self.nbeads):
+            self._forces[b].release()
+
     def pot_gather(self):
         """Obtains the potential energy for each replica.
 
@@ -483,6 +499,9 @@ class ScaledForceComponent(dobject):
     def queue(self):
         pass  # this should be taken care of when the force/potential/etc is accessed
 
+    def release(self):
+        pass
+
 
 class Forces(dobject):
 
@@ -701,10 +720,43 @@ class Forces(dobject):
             mself = self.mforces[k]
             if mreff.nbeads != mself.nbeads:
                 raise ValueError("Cannot copy forces between objects with different numbers of beads for the " + str(k) + "th component")
+            # brings the positions of the component up to date first: if they
+            # stayed tainted, moving the beads later would not reach the forces
+            # that are marked as computed below
+            dd(self.mbeads[k]).q.get()
             for b in xrange(mself.nbeads):
-                dfkbref = dd(mreff._forces[b])
-                dfkbself = dd(mself._forces[b])
-                dfkbself.ufvx.set(deepcopy(dfkbref.ufvx._value), manual=False)
+                self._transfer_bead(mself._forces[b], mreff._forces[b])
+
+    def transfer_bead_forces(self, refforce, bead):
+        """Low-level function copying over the value of a second force object
+        with a single bead to one of the beads of this one, in the same way as
+        transfer_forces(). The other beads are left untouched.
+
+        Args:
+            refforce: The force object the values are taken from.
+            bead: The index of the bead the values are copied to.
+        """
+
+        if len(self.mforces) != len(refforce.mforces):
+            raise ValueError("Cannot copy forces between objects with different numbers of components")
+
+        for k in xrange(len(self.mforces)):
+            mreff = refforce.mforces[k]
+            mself = self.mforces[k]
+            if mreff.nbeads != 1 or mself.nbeads != self.nbeads:
+                raise ValueError("Cannot copy the forces of a single bead for the contracted " + str(k) + "th component")
+            dd(self.mbeads[k]).q.get()
+            self._transfer_bead(mself._forces[bead], mreff._forces[0])
+
+    def _transfer_bead(self, fbself, fbref):
+        """Copies the ufvx value of a ForceBead object to another one."""
+
+        dfkbref = dd(fbref)
+        dfkbself = dd(fbself)
+        if dfkbref.ufvx.tainted():
+            return  # nothing has been computed that could be copied
+        dfkbself.ufvx.set(deepcopy(dfkbref.ufvx._value), manual=False)
+        dfkbself.ufvx.taint(taintme=False)
 
     def run(self):
         """Makes the socket start looking for driver codes.
@@ -735,6 +787,13 @@ class Forces(dobject):
             if ff.weight != 0:  # do not compute forces which have zero weight
                 ff.queue()
 
+    def release(self):
+        """Withdraws the force calculations submitted by queue() whose
+        results have not been collected."""
+
+        for ff in self.mforces:
+            ff.release()
+
     def get_vir(self):
         """Sums the virial of each forcefield.
 
@@ -1005,3 +1064,73 @@ class Forces(dobject):
         rc[0::2] = (self.alpha / self.omegan2 / 9.0)
         rc[1::2] = ((1.0 - self.alpha) / self.omegan2 / 9.0)
         return np.asmatrix(rc).T
+
+
+class ForceCopies(object):
+
+    """Copies of a forces object, used to compute the forces of several
+    configurations at the same time.
+
+    Attributes:
+        forces: The forces object that is copied.
+        cell: The cell object the copies are bound to.
+        nbeads: The number of beads of the copies, or -1 to copy all of them.
+        copies: The copies, each bound to its own copy of the beads. They
+            are only created the first time they are needed.
+        nlast: The number of copies that hold the configurations of the last
+            call to compute().
+        fcount: The number of configurations that have been sent to the
+            forcefield.
+    """
+
+    def __init__(self, forces, cell, nbeads=-1):
+        self.forces = forces
+        self.cell = cell
+        self.nbeads = nbeads
+        self.copies = []
+        self.nlast = 0
+        self.fcount = 0
+
+    def compute(self, qs):
+        """Computes the forces for several configurations.
+
+        All the configurations are queued before any of the results is
+        collected, so that they are dispatched to the clients at once. A copy
+        that already holds its configuration is not computed again.
+
+        Args:
+            qs: A list of bead positions.
+
+        Returns:
+            A list of forces objects, one for each configuration.
+        """
+
+        nold = len(self.copies)
+        while len(self.copies) < len(qs):
+            self.copies.append(self.forces.copy(self.forces.beads.copy(self.nbeads), self.cell))
+        fs = self.copies[:len(qs)]
+        for i, (q, f) in enumerate(zip(qs, fs)):
+            if i >= nold or not np.array_equal(dstrip(f.beads.q), q):
+                f.beads.q = q
+                self.fcount += 1
+            f.queue()
+        for f in fs:
+            dstrip(f.f)
+        self.nlast = len(qs)
+        return fs
+
+    def find(self, q):
+        """Returns the copy that holds the bead positions q after the last
+        call to compute(), or None if there is none."""
+
+        for f in self.copies[:self.nlast]:
+            if np.array_equal(dstrip(f.beads.q), q):
+                return f
+        return None
+
+    def transfer(self, forces):
+        """Copies the forces of the copies of the last call to compute(),
+        which must hold a single bead each, to the beads of a forces object."""
+
+        for b, f in enumerate(self.copies[:self.nlast]):
+            forces.transfer_bead_forces(f, b)
@@ -13,6 +13,7 @@ from .replay import Replay
 from .geop import GeopMotion
 from .instanton import InstantonMotion
 from .neb import NEBMover
+from .stringmethod import StringMover
 from .phonons import DynMatrixMover
 from .multi import MultiMotion
 from .alchemy import AlchemyMC
@@ -83,69 +83,66 @@ class AlchemyMC(Motion):
         return np.asarray(atomexchangelist)
 
     def step(self, step=None):
+        """Does one round of alchemical exchanges.
+
+        The exchanges are carried out on local copies of the names and masses
+        of the atoms, and the beads are only updated at the end of the round,
+        so that the quantities that depend on the masses are recomputed once.
+        """
 
         # picks number of attempted exchanges
         ntries = self.prng.rng.poisson(self.nxc)
         if ntries == 0: return
 
-        """Does one round of alchemical exchanges."""
-        # record the spring energy (divided by mass) for each atom in the exchange chain
-        q = dstrip(self.beads.q)
-        nb = self.beads.nbeads
         axlist = self.AXlist(self.names)
         lenlist = len(axlist)
-        atomspring = np.zeros(lenlist)
-        wk2 = dstrip(self.nm.omegak2)
-
-        i = 0
-        for atomnum in axlist:
-            na3 = atomnum * 3
-
-            # computes spring in NM representation
-            spr = 0.0
-            for b in range(1, nb):
-                spr += wk2[b] * (self.nm.qnm[b, na3:na3 + 3]**2).sum()
-            spr *= 0.5
+        if lenlist == 0: return
+        oldnames = dstrip(self.beads.names)[axlist]
+        if (oldnames == oldnames[0]).all(): return  # there is nothing to exchange
 
-            # no mass here - just the massless spring term
-            atomspring[i] = spr
-            i += 1
+        # record the spring energy (divided by mass) for each atom in the exchange chain,
+        # computed in NM representation. no mass here - just the massless spring term
+        nb = self.beads.nbeads
+        wk2 = dstrip(self.nm.omegak2)
+        qnm = dstrip(self.nm.qnm).reshape((nb, self.beads.natoms, 3))[1:, axlist]
+        atomspring = 0.5 * np.dot(wk2[1:], (qnm**2).sum(axis=2))
 
         # does the exchange
         betaP = 1.0 / (Constants.kb * self.ensemble.temp * nb)
-        nexch = 0
+        oldm = dstrip(self.beads.m)[axlist]
+        names = oldnames.copy()
+        m = oldm.copy()
+        dealc = 0.0
 
-        # this would be double-counting, we already have a bail-out condition above
-        # if (1.0/self.nxc < self.prng.u) : return  # tries a round of exhanges with probability 1/nmc
+        # draws all the random numbers of the round at once. the second atom
+        # is picked among those of a different kind, so we get a real exchange
+        ilist = self.prng.rng.randint(lenlist, size=ntries)
+        jlist = self.prng.rng.uniform(size=ntries)
+        ulist = self.prng.rng.uniform(size=ntries)
 
-        for x in xrange(ntries):
-            i = self.prng.rng.randint(lenlist)
-            j = self.prng.rng.randint(lenlist)
-            while self.beads.names[axlist[i]] == self.beads.names[axlist[j]]:
-                j = self.prng.rng.randint(lenlist)  # makes sure we pick a real exchange
+        for i, rj, u in zip(ilist, jlist, ulist):
+            others = np.flatnonzero(names != names[i])
+            j = others[int(rj * len(others))]
 
             # energy change due to the swap
-            difspring = (atomspring[i] - atomspring[j]) * (self.beads.m[axlist[j]] - self.beads.m[axlist[i]])
+            difspring = (atomspring[i] - atomspring[j]) * (m[j] - m[i])
             pexchange = np.exp(-betaP * difspring)
 
             # attemps the exchange
-            if (pexchange > self.prng.u):
-                nexch += 1
-                # print 'exchange atom No.  ', axlist[i], '  and  ', axlist[j]
-
-                # swap names
-                nameswap = self.beads.names[axlist[i]]
-                self.beads.names[axlist[i]] = self.beads.names[axlist[j]]
-                self.beads.names[axlist[j]] = nameswap
-
-                # change masses
-                massratio = self.beads.m[axlist[i]] / self.beads.m[axlist[j]]
-                self.beads.m[axlist[i]] /= massratio
-                self.beads.m[axlist[j]] *= massratio
-
-                # adjust the (classical) momenta to conserve ke
-                self.beads.p[:, 3 * axlist[i]:3 * (axlist[i] + 1)] /= np.sqrt(massratio)
-                self.beads.p[:, 3 * axlist[j]:3 * (axlist[j] + 1)] *= np.sqrt(massratio)
+            if (pexchange > u):
+                names[i], names[j] = names[j], names[i]
+                m[i], m[j] = m[j], m[i]
 
                 # adjusts the conserved quantity counter based on the change in spring energy
-                self.ealc += -difspring
+                dealc -= difspring
+
+        self.ealc += dealc
+
+        # swap names and masses, and adjusts the (classical) momenta to conserve ke
+        changed = np.flatnonzero(names != oldnames)
+        if len(changed) == 0: return
+        atoms = axlist[changed]
+        self.beads.names[atoms] = names[changed]
+        self.beads.m[atoms] = m[changed]
+        idx3 = (3 * atoms[:, np.newaxis] + np.arange(3)).flatten()
+        self.beads.p[:, idx3] = dstrip(self.beads.p)[:, idx3] * np.repeat(np.sqrt(m[changed] / oldm[changed]), 3)
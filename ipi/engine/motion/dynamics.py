@@ -218,6 +218,12 @@ class DummyIntegrator(dobject):
         self.cell = motion.cell
         dself = dd(self)
         dself.dt = dd(motion).dt
+
+        # work buffer in which all the force contributions are accumulated
+        # before being applied to the momenta in a single in-place update
+        self._fbuf = np.zeros((self.beads.nbeads, 3 * self.beads.natoms), float)
+        # per-coordinate indices of the fixed atoms
+        self._fixdof = (3 * np.asarray(self.fixatoms, int)[:, np.newaxis] + np.arange(3)).flatten()
         if motion.enstype == "mts": self.nmts = motion.nmts
         # mts on sc force in suzuki-chin
         if motion.enstype == "sc":
@@ -279,47 +285,42 @@ class NVEIntegrator(DummyIntegrator):
         """
 
         if (self.fixcom):
-            pcom = np.zeros(3, float)
-
             na3 = self.beads.natoms * 3
             nb = self.beads.nbeads
             p = dstrip(self.beads.p)
             m = dstrip(self.beads.m3)[:, 0:na3:3]
             M = self.beads[0].M
 
-            for i in range(3):
-                pcom[i] = p[:, i:na3:3].sum()
+            pcom = p.reshape((nb, -1, 3)).sum(axis=1).sum(axis=0)
 
             self.ensemble.eens += np.dot(pcom, pcom) / (2.0 * M * nb)
 
             # subtracts COM velocity
             pcom *= 1.0 / (nb * M)
-            for i in range(3):
-                self.beads.p[:, i:na3:3] -= m * pcom[i]
+            self.beads.p -= (m[:, :, np.newaxis] * pcom).reshape((nb, na3))
 
         if len(self.fixatoms) > 0:
-            for bp in self.beads.p:
-                m = dstrip(self.beads.m)
-                self.ensemble.eens += 0.5 * np.dot(bp[self.fixatoms * 3], bp[self.fixatoms * 3] / m[self.fixatoms])
-                self.ensemble.eens += 0.5 * np.dot(bp[self.fixatoms * 3 + 1], bp[self.fixatoms * 3 + 1] / m[self.fixatoms])
-                self.ensemble.eens += 0.5 * np.dot(bp[self.fixatoms * 3 + 2], bp[self.fixatoms * 3 + 2] / m[self.fixatoms])
-                bp[self.fixatoms * 3] = 0.0
-                bp[self.fixatoms * 3 + 1] = 0.0
-                bp[self.fixatoms * 3 + 2] = 0.0
+            pfix = dstrip(self.beads.p)[:, self._fixdof]
+            self.ensemble.eens += 0.5 * (pfix * pfix / dstrip(self.beads.m3)[:, self._fixdof]).sum()
+            self.beads.p[:, self._fixdof] = 0.0
 
     def pstep(self):
         """Velocity Verlet momenta propagator."""
 
-        self.beads.p += dstrip(self.forces.f) * (self.dt * 0.5)
-        # also adds the bias force
-        self.beads.p += dstrip(self.bias.f) * (self.dt * 0.5)
-        # also adds extra forces
-        self.beads.p += extraforces.calc(self) * (self.dt * 0.5)
+        # sums up physical, bias and extra forces, and applies them at once
+        fbuf = self._fbuf
+        np.add(dstrip(self.forces.f), dstrip(self.bias.f), out=fbuf)
+        fbuf += extraforces.calc(self)
+        fbuf *= self.dt * 0.5
+        self.beads.p += fbuf
 
     def qcstep(self):
         """Velocity Verlet centroid position propagator."""
 
-        self.nm.qnm[0, :] += dstrip(self.nm.pnm)[0, :] / dstrip(self.beads.m3)[0] * self.dt
+        vc = self._fbuf[0]
+        np.divide(dstrip(self.nm.pnm)[0, :], dstrip(self.beads.m3)[0], out=vc)
+        vc *= self.dt
+        self.nm.qnm[0, :] += vc
 
     def step(self, step=None):
         """Does one simulation time step."""
@@ -600,7 +601,9 @@ class MTSIntegrator(NVEIntegrator):
 
     def pstep(self, level=0, alpha=1.0):
         """Velocity Verlet monemtum propagator."""
-        self.beads.p += self.forces.forces_mts(level) * 0.5 * (self.dt / alpha)
+        fk = self.forces.forces_mts(level)
+        fk *= 0.5 * (self.dt / alpha)
+        self.beads.p += fk
 
     def qcstep(self, alpha=1.0):
         """Velocity Verlet centroid position propagator."""
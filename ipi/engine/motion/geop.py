@@ -15,9 +15,10 @@ import numpy as np
 import time
 
 from ipi.engine.motion import Motion
+from ipi.engine.forces import ForceCopies
 from ipi.utils.depend import dstrip, dobject
 from ipi.utils.softexit import softexit
-from ipi.utils.mintools import min_brent, BFGS, BFGSTRM, L_BFGS
+from ipi.utils.mintools import min_brent, min_brent_batch, BFGS, BFGSTRM, L_BFGS
 from ipi.utils.messages import verbosity, info
 
 
@@ -39,7 +40,8 @@ class GeopMotion(Motion):
         iter: maximum number of allowed iterations for minimization algorithm for each MD step
         step: initial step size for steepest descent and conjugate gradient
         adaptive: T/F adaptive step size for steepest descent and conjugate
-                gradient}
+                gradient
+        npoints: number of trial steps of the line search evaluated at the same time}
         tolerances:
         {energy: change in energy tolerance for ending minimization
         force: force/change in force tolerance foe ending minimization
@@ -60,7 +62,7 @@ class GeopMotion(Motion):
                  invhessian_bfgs=np.eye(0, 0, 0, float),
                  hessian_trm=np.eye(0, 0, 0, float),
                  tr_trm=np.zeros(0, float),
-                 ls_options={"tolerance": 1, "iter": 100, "step": 1e-3, "adaptive": 1.0},
+                 ls_options={"tolerance": 1, "iter": 100, "step": 1e-3, "adaptive": 1.0, "npoints": 1},
                  tolerances={"energy": 1e-7, "force": 1e-4, "position": 1e-4},
                  corrections_lbfgs=5,
                  scale_lbfgs=1,
@@ -149,6 +151,7 @@ class LineMapper(object):
         self.dbeads = dumop.beads.copy()
         self.dcell = dumop.cell.copy()
         self.dforces = dumop.forces.copy(self.dbeads, self.dcell)
+        self.fdcopies = ForceCopies(self.dforces, self.dcell)
 
     def set_dir(self, x0, mdir):
         self.x0 = x0.copy()
@@ -160,12 +163,23 @@ class LineMapper(object):
         """ computes energy and gradient for optimization step
             determines new position (x0+d*x)"""
 
-        self.fcount += 1
         self.dbeads.q = self.x0 + self.d * x
+        f = self.fdcopies.find(dstrip(self.dbeads.q))
+        if f is None:
+            self.fcount += 1
+        else:
+            self.dforces.transfer_forces(f)
         e = self.dforces.pot   # Energy
         g = - np.dot(dstrip(self.dforces.f).flatten(), self.d.flatten())   # Gradient
         return e, g
 
+    def batch(self, xs):
+        """ computes energy and gradient for several steps at the same time"""
+
+        self.fcount += len(xs)
+        fs = self.fdcopies.compute([self.x0 + self.d * x for x in xs])
+        return [(f.pot, - np.dot(dstrip(f.f).flatten(), self.d.flatten())) for f in fs]
+
 
 class GradientMapper(object):
 
@@ -186,16 +200,27 @@ class GradientMapper(object):
         self.dbeads = dumop.beads.copy()
         self.dcell = dumop.cell.copy()
         self.dforces = dumop.forces.copy(self.dbeads, self.dcell)
+        self.fdcopies = ForceCopies(self.dforces, self.dcell)
 
     def __call__(self, x):
         """computes energy and gradient for optimization step"""
 
-        self.fcount += 1
         self.dbeads.q = x
+        f = self.fdcopies.find(dstrip(self.dbeads.q))
+        if f is None:
+            self.fcount += 1
+        else:
+            self.dforces.transfer_forces(f)
         e = self.dforces.pot   # Energy
         g = -self.dforces.f   # Gradient
         return e, g
 
+    def batch(self, xs):
+        """computes energy and gradient for several positions at the same time"""
+
+        self.fcount += len(xs)
+        return [(f.pot, -f.f) for f in self.fdcopies.compute(xs)]
+
 
 class DummyOptimizer(dobject):
     """ Dummy class for all optimization classes """
@@ -352,7 +377,8 @@ class BFGSOptimizer(DummyOptimizer):
         # Do one iteration of BFGS
         # The invhessian and the directions are updated inside.
         BFGS(self.old_x, self.d, self.gm, fdf0, self.invhessian, self.big_step,
-             self.ls_options["tolerance"] * self.tolerances["energy"], self.ls_options["iter"])
+             self.ls_options["tolerance"] * self.tolerances["energy"], self.ls_options["iter"],
+             self.ls_options["npoints"])
 
         info("   Number of force calls: %d" % (self.gm.fcount)); self.gm.fcount = 0
         # Update positions and forces
@@ -485,7 +511,7 @@ class LBFGSOptimizer(DummyOptimizer):
         # We update everything  within L_BFGS (and all other calls).
         L_BFGS(self.old_x, self.d, self.gm, self.qlist, self.glist,
                fdf0, self.big_step, self.ls_options["tolerance"] * self.tolerances["energy"],
-               self.ls_options["iter"], self.corrections, self.scale, step)
+               self.ls_options["iter"], self.corrections, self.scale, step, self.ls_options["npoints"])
 
         info("   Number of force calls: %d" % (self.gm.fcount)); self.gm.fcount = 0
 
@@ -540,13 +566,19 @@ class SDOptimizer(DummyOptimizer):
         self.lm.set_dir(dstrip(self.beads.q), dq1_unit)
 
         # Reuse initial value since we have energy and forces already
-        u0, du0 = (self.forces.pot.copy(), np.dot(dstrip(self.forces.f.flatten()), dq1_unit.flatten()))
+        u0, du0 = (self.forces.pot.copy(), -np.dot(dstrip(self.forces.f.flatten()), dq1_unit.flatten()))
 
         # Do one SD iteration; return positions and energy
         #(x, fx,dfx) = min_brent(self.lm, fdf0=(u0, du0), x0=0.0,  #DELETE
-        min_brent(self.lm, fdf0=(u0, du0), x0=0.0,
-                  tol=self.ls_options["tolerance"] * self.tolerances["energy"],
-                  itmax=self.ls_options["iter"], init_step=self.ls_options["step"])
+        if self.ls_options["npoints"] > 1:
+            min_brent_batch(self.lm, fdf0=(u0, du0), x0=0.0,
+                            tol=self.ls_options["tolerance"] * self.tolerances["energy"],
+                            itmax=self.ls_options["iter"], init_step=self.ls_options["step"],
+                            npts=self.ls_options["npoints"])
+        else:
+            min_brent(self.lm, fdf0=(u0, du0), x0=0.0,
+                      tol=self.ls_options["tolerance"] * self.tolerances["energy"],
+                      itmax=self.ls_options["iter"], init_step=self.ls_options["step"])
         info("   Number of force calls: %d" % (self.lm.fcount)); self.lm.fcount = 0
 
         # Update positions and forces
@@ -625,12 +657,18 @@ class CGOptimizer(DummyOptimizer):
         self.lm.set_dir(dstrip(self.beads.q), dq1_unit)
 
         # Reuse initial value since we have energy and forces already
-        u0, du0 = (self.forces.pot.copy(), np.dot(dstrip(self.forces.f.flatten()), dq1_unit.flatten()))
+        u0, du0 = (self.forces.pot.copy(), -np.dot(dstrip(self.forces.f.flatten()), dq1_unit.flatten()))
 
         # Do one CG iteration; return positions and energy
-        min_brent(self.lm, fdf0=(u0, du0), x0=0.0,
-                  tol=self.ls_options["tolerance"] * self.tolerances["energy"],
-                  itmax=self.ls_options["iter"], init_step=self.ls_options["step"])
+        if self.ls_options["npoints"] > 1:
+            min_brent_batch(self.lm, fdf0=(u0, du0), x0=0.0,
+                            tol=self.ls_options["tolerance"] * self.tolerances["energy"],
+                            itmax=self.ls_options["iter"], init_step=self.ls_options["step"],
+                            npts=self.ls_options["npoints"])
+        else:
+            min_brent(self.lm, fdf0=(u0, du0), x0=0.0,
+                      tol=self.ls_options["tolerance"] * self.tolerances["energy"],
+                      itmax=self.ls_options["iter"], init_step=self.ls_options["step"])
         info("   Number of force calls: %d" % (self.lm.fcount)); self.lm.fcount = 0
 
         # Update positions and forces
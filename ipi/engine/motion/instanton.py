@@ -13,13 +13,13 @@ import numpy as np
 import time
 
 from ipi.engine.motion import Motion
-from ipi.utils.depend import dstrip, dobject
+from ipi.utils.depend import dstrip, dobject, dd, dpipe
 from ipi.utils.softexit import softexit
 from ipi.utils.messages import verbosity, info
 from ipi.utils import units
 from ipi.utils.mintools import nichols, Powell
 from ipi.engine.motion.geop import L_BFGS
-from ipi.utils.instools import banded_hessian, invmul_banded, red2comp, get_hessian, clean_hessian, get_imvector, print_instanton_geo, print_instanton_hess
+from ipi.utils.instools import banded_hessian, invmul_banded, red2comp, get_hessian, clean_hessian, get_imvector, print_instanton_geo, print_instanton_hess, interpolate_path, interpolate_hessian
 
 __all__ = ['InstantonMotion']
 
@@ -48,6 +48,8 @@ class InstantonMotion(Motion):
         which the quantities are written to file.
         prefix: Prefix of the output files.
         delta: Initial stretch amplitude.
+        temperatures: Temperatures of an instanton scan.
+        scan_nbeads: Number of beads for each of the temperatures of an instanton scan.
         hessian_init: Boolean which decides whether the initial hessian is going to be computed.
         hessian: Stored  Hessian matrix
         hessian_update: The way to update the hessian after each movement
@@ -58,6 +60,7 @@ class InstantonMotion(Motion):
         corrections_lbfgs: Number of corrections to be stored for L-BFGS
         ls_options: Options for line search methods.
         hessian_final:  Boolean which decides whether the hessian after the optimization will be computed.
+        hessian_window: Number of rows of the finite difference hessian computed at the same time.
         energy_shift: zero of energy (usually it corresponds to reactant state)
     """
 
@@ -72,6 +75,8 @@ class InstantonMotion(Motion):
                  alt_out=1,
                  prefix="INSTANTON",
                  delta=np.zeros(0, float),
+                 temperatures=np.zeros(0, float),
+                 scan_nbeads=np.zeros(0, int),
                  hessian_init=None,
                  hessian=np.eye(0, 0, 0, float),
                  hessian_update=None,
@@ -83,6 +88,7 @@ class InstantonMotion(Motion):
                  ls_options={"tolerance": 1e-1, "iter": 100},
                  old_direction=np.zeros(0, float),
                  hessian_final = 'False',
+                 hessian_window=1,
                  energy_shift=np.zeros(0, float)):
 
         """Initialises InstantonMotion.
@@ -105,7 +111,10 @@ class InstantonMotion(Motion):
         self.save           = alt_out
         self.prefix         = prefix
         self.delta          = delta
+        self.temperatures   = temperatures
+        self.scan_nbeads    = scan_nbeads
         self.hessian_final  = hessian_final
+        self.hessian_window = hessian_window
         self.energy_shift   = energy_shift
 
         # We set the default optimization algorithm depending on the mode.
@@ -179,6 +188,24 @@ class GradientMapper(object):
         self.dbeads  = dumop.beads.copy()
         self.dcell   = dumop.cell.copy()
         self.dforces = dumop.forces.copy(self.dbeads, self.dcell)
+        self._fdcopies = []
+
+    def fd_copies(self, ncopies):
+        """Returns copies of the forces object, each bound to its own copy of
+        the beads, to compute several displaced configurations at the same time.
+
+        The copies are only created the first time they are needed.
+
+        Args:
+            ncopies: The number of copies that are needed.
+
+        Returns:
+            A list of forces objects.
+        """
+
+        while len(self._fdcopies) < ncopies:
+            self._fdcopies.append(self.dforces.copy(self.dbeads.copy(), self.dcell))
+        return self._fdcopies[:ncopies]
 
     def set_pos(self, x):
         """Set the positions """
@@ -205,13 +232,20 @@ class SpringMapper(object):
 
     def bind(self, dumop):
         self.dbeads = dumop.beads.copy()
-        self.temp   = dumop.temp
-        if dumop.mode == 'rate':
+        self.mode   = dumop.mode
+        self.opt    = dumop.opt
+        self.set_temp(dumop.temp)
+
+    def set_temp(self, temp):
+        """Sets the temperature, which determines the spring constant."""
+
+        self.temp   = temp
+        if self.mode == 'rate':
             self.omega2 = (self.temp * (2*self.dbeads.nbeads) * units.Constants.kb / units.Constants.hbar) ** 2
-        elif dumop.mode == 'splitting':
+        elif self.mode == 'splitting':
             self.omega2 = (self.temp * ( self.dbeads.nbeads) * units.Constants.kb / units.Constants.hbar) ** 2
 
-        if dumop.opt == 'nichols' or dumop.opt == 'NR':
+        if self.opt == 'nichols' or self.opt == 'NR':
             self.h = self.spring_hessian(self.dbeads.natoms, self.dbeads.nbeads, self.dbeads.m3[0], self.omega2)
 
     def save(self, e, g):
@@ -330,9 +364,11 @@ class DummyOptimizer(dobject):
         check whether force size,  Hessian size from  match system size
         """
 
+        self.geop       = geop
         self.beads      = geop.beads
         self.cell       = geop.cell
         self.forces     = geop.forces
+        self.nm         = geop.nm
         self.fixcom     = geop.fixcom
         self.fixatoms   = geop.fixatoms
 
@@ -354,10 +390,20 @@ class DummyOptimizer(dobject):
                 raise ValueError("Old forces size does not match system size")
 
         # Temperature
+        self.ensemble     = geop.ensemble
+        self.temperatures = geop.temperatures
+        if len(self.temperatures) > 0 and not np.isclose(self.temperatures, geop.ensemble.temp).any():
+            geop.ensemble.temp = self.temperatures[0]
         self.temp = geop.ensemble.temp
         if geop.ensemble.temp == -1.0 or geop.ensemble.temp == 1.0:  # This is due to a little inconsistency on the default value
             if self.beads.nbeads != 1:
                 raise ValueError("Temperature must be specified for an Instanton calculation ")
+        self.scan_nbeads  = geop.scan_nbeads
+        if len(self.scan_nbeads) > 0:
+            if len(self.scan_nbeads) != len(self.temperatures):
+                raise ValueError("The instanton scan needs one number of beads for each temperature")
+            if self.scan_nbeads[self.scan_index()] != self.beads.nbeads:
+                raise ValueError("The number of beads of the system does not match the one of the instanton scan at the current temperature")
 
         # Optimization mode
         self.mode       = geop.mode
@@ -376,9 +422,88 @@ class DummyOptimizer(dobject):
         self.prefix          = geop.prefix
         self.delta           = geop.delta
         self.hessian_final   = geop.hessian_final
+        self.hessian_window  = geop.hessian_window
         self.gm.bind(self)
         self.energy_shift    = geop.energy_shift
 
+    def scan_index(self):
+        """Returns the position of the current temperature in the list of
+        temperatures of an instanton scan."""
+
+        return int(np.argmin(np.absolute(np.asarray(self.temperatures) - self.temp)))
+
+    def next_temperature(self):
+        """Moves an instanton scan on to the next temperature.
+
+        The optimization continues from the instanton converged at the current
+        temperature, and the physical hessian is kept, as it does not depend
+        on the temperature. Both are interpolated if the number of beads
+        changes.
+
+        Returns:
+            False if there is no temperature left to scan.
+        """
+
+        if len(self.temperatures) == 0:
+            return False
+        i = self.scan_index()
+        if i + 1 == len(self.temperatures):
+            return False
+
+        self.temp = self.temperatures[i + 1]
+        self.ensemble.temp = self.temp
+        info(" @GEOP: Instanton scan, continuing at %g K" % units.unit_to_user("temperature", "kelvin", self.temp), verbosity.low)
+        if len(self.scan_nbeads) > 0 and self.scan_nbeads[i + 1] != self.beads.nbeads:
+            self.resize(self.scan_nbeads[i + 1])
+        self.im.set_temp(self.temp)
+        self.im(self.beads.q, ret=False)
+        self.exit = False
+        return True
+
+    def resize(self, nbeads):
+        """Interpolates the instanton and the physical hessian to a new number
+        of beads.
+
+        The beads, normal modes, forces and ensemble of the system are bound
+        again with the new number of beads, and so is the optimizer, so that
+        the previous positions, forces and L-BFGS history get the new size.
+        """
+
+        geop = self.geop
+        natoms = self.beads.natoms
+        info(" @GEOP: Instanton scan, interpolating from %d to %d beads" % (self.beads.nbeads, nbeads), verbosity.low)
+
+        q = interpolate_path(self.beads.q, nbeads)
+        if geop.hessian.size == natoms * 3 * self.beads.q.size:
+            geop.hessian = interpolate_hessian(geop.hessian, natoms, nbeads)
+
+        m = dstrip(self.beads.m).copy()
+        names = dstrip(self.beads.names).copy()
+        self.beads.resize(natoms, nbeads)
+        self.beads.m = m
+        self.beads.names = names
+
+        fflist = self.forces.ff
+        self.forces.bind(self.beads, self.cell, self.forces.fcomp, fflist)
+        self.nm.bind(self.ensemble, geop, beads=self.beads, forces=self.forces)
+        self.ensemble.bind(self.beads, self.nm, self.cell, self.forces, fflist)
+        dpipe(dd(self.nm).omegan2, dd(self.forces).omegan2)
+        self.beads.q = q
+
+        # these are resized by bind, and filled again below
+        geop.old_x = np.zeros(0, float)
+        geop.old_u = np.zeros(0, float)
+        geop.old_f = np.zeros(0, float)
+        if self.opt == 'lbfgs':
+            geop.qlist = np.zeros(0, float)
+            geop.glist = np.zeros(0, float)
+            geop.d = np.zeros(0, float)
+        self.bind(geop)
+
+        self.old_x[:] = self.beads.q
+        self.old_u[:] = self.forces.pots
+        self.old_f[:] = self.forces.f
+
     def exitstep(self, fx, fx0, x, exitt, step):
 
         """ Exits the simulation step. Computes time, checks for convergence. """
@@ -401,7 +526,11 @@ class DummyOptimizer(dobject):
                          (np.linalg.norm(self.forces.f.flatten() - self.old_f.flatten()) <= 1e-08)) \
                 and (x <= self.tolerances["position"]):
 
-            print_instanton_geo(self.prefix+'_FINAL', step, self.im.dbeads.nbeads, self.im.dbeads.natoms, self.im.dbeads.names,
+            prefix = self.prefix
+            if len(self.temperatures) > 0:
+                prefix += '_%gK' % units.unit_to_user("temperature", "kelvin", self.temp)
+
+            print_instanton_geo(prefix+'_FINAL', step, self.im.dbeads.nbeads, self.im.dbeads.natoms, self.im.dbeads.names,
                             self.im.dbeads.q, self.old_u, self.cell, self.energy_shift)
 
 
@@ -411,8 +540,8 @@ class DummyOptimizer(dobject):
 
             else:
                 info("We are going to compute the final hessian", verbosity.low)
-                get_hessian(self.hessian, self.gm, self.im.dbeads.q)
-                print_instanton_hess(self.prefix+'_FINAL', step, self.hessian)
+                get_hessian(self.hessian, self.gm, self.im.dbeads.q, asr=self.hessian_asr, window=self.hessian_window)
+                print_instanton_hess(prefix+'_FINAL', step, self.hessian)
 
             exitt = True #If we just exit here, the last step (including the last hessian) will not be in the RESTART file
 
@@ -465,7 +594,7 @@ class HessianOptimizer(DummyOptimizer):
             if self.beads.nbeads == 1:
                 info(" @GEOP: Classical TS search", verbosity.low)
                 if self.hessian_init == 'true':
-                    get_hessian(self.hessian, self.gm, self.beads.q)
+                    get_hessian(self.hessian, self.gm, self.beads.q, asr=self.hessian_asr, window=self.hessian_window)
             else:
                 if ((self.beads.q - self.beads.q[0]) == 0).all():  # If the coordinates in all the imaginary time slices are the same
                     info(" @GEOP: We stretch the initial geometry with an 'amplitud' of %4.2f" % self.delta, verbosity.low)
@@ -482,7 +611,7 @@ class HessianOptimizer(DummyOptimizer):
 
                 if self.hessian_init == 'true':
                     info(" @GEOP: We are computing the initial hessian", verbosity.low)
-                    get_hessian(self.hessian, self.gm, self.beads.q)
+                    get_hessian(self.hessian, self.gm, self.beads.q, asr=self.hessian_asr, window=self.hessian_window)
 
             # Update positions and forces
             self.old_x[:] = self.beads.q
@@ -494,7 +623,7 @@ class HessianOptimizer(DummyOptimizer):
 
         if (self.old_x == np.zeros((self.beads.nbeads, 3*self.beads.natoms), float)).all():
             self.old_x[:] = self.beads.q
-        if self.exit:
+        if self.exit and not self.next_temperature():
             softexit.trigger("Geometry optimization converged. Exiting simulation")
 
         if len(self.fixatoms) > 0:
@@ -504,7 +633,7 @@ class HessianOptimizer(DummyOptimizer):
                 dqb[self.fixatoms * 3 + 2] = 0.0
 
         # Do one step. Update hessian for the new position. Update the position and force inside the mapper.
-        Instanton(self.old_x, self.old_f, self.im.f, self.hessian, self.hessian_update, self.hessian_asr, self.im, self.gm, self.big_step, self.opt, self.mode)
+        Instanton(self.old_x, self.old_f, self.im.f, self.hessian, self.hessian_update, self.hessian_asr, self.im, self.gm, self.big_step, self.opt, self.mode, self.hessian_window)
 
         # Update positions and forces
         self.beads.q = self.gm.dbeads.q
@@ -525,7 +654,7 @@ class HessianOptimizer(DummyOptimizer):
         self.old_u[:] = self.forces.pots
         self.old_f[:] = self.forces.f
 
-def Instanton(x0, f0, f1, h, update, asr, im, gm, big_step, opt, m):
+def Instanton(x0, f0, f1, h, update, asr, im, gm, big_step, opt, m, window=1):
     """Do one step. Update hessian for the new position. Update the position and force inside the mapper.
 
        Input:  x0 = last positions
@@ -538,7 +667,8 @@ def Instanton(x0, f0, f1, h, update, asr, im, gm, big_step, opt, m):
                gm = gradient  mapper
          big_step = limit on step length
               opt = optimization algorithm to use
-              m   = type of calculation: rate or splitting"""
+              m   = type of calculation: rate or splitting
+           window = rows of the hessian computed at the same time"""
 
     info(" @Instanton_step", verbosity.high)
 
@@ -584,7 +714,7 @@ def Instanton(x0, f0, f1, h, update, asr, im, gm, big_step, opt, m):
             dx = d_x[j,:]
             Powell(dx, dg, aux)
     elif update == 'recompute':
-        get_hessian(h, gm, x)
+        get_hessian(h, gm, x, asr=asr, window=window)
 
 class LBFGSOptimizer(DummyOptimizer):
 
@@ -621,6 +751,9 @@ class LBFGSOptimizer(DummyOptimizer):
 
         self.qlist = geop.qlist
         self.glist = geop.glist
+        # number of L-BFGS steps stored in the history, which is not
+        # necessarily full when restarting
+        self.nhist = np.count_nonzero(np.absolute(self.qlist).sum(axis=1))
 
         if geop.scale not in [0, 1, 2]:
             raise ValueError("Scale option is not valid")
@@ -635,6 +768,21 @@ class LBFGSOptimizer(DummyOptimizer):
 
         self.d = geop.d
 
+    def next_temperature(self):
+        """Moves an instanton scan on to the next temperature, restarting the
+        search along the forces with the new spring constant. The L-BFGS
+        history is cleared, as the spring terms of the old temperature are
+        part of it."""
+
+        if not super(LBFGSOptimizer, self).next_temperature():
+            return False
+
+        self.qlist[:] = 0.0
+        self.glist[:] = 0.0
+        self.nhist = 0
+        f = self.forces.f + self.im.f
+        self.d[:] = dstrip(f) / np.sqrt(np.dot(f.flatten(), f.flatten()))
+        return True
 
     def step(self, step=None):
         """ Does one simulation time step."""
@@ -677,7 +825,7 @@ class LBFGSOptimizer(DummyOptimizer):
         if (self.old_x == np.zeros((self.beads.nbeads, 3*self.beads.natoms), float)).all():
             self.old_x[:] = self.beads.q
 
-        if self.exit:
+        if self.exit and not self.next_temperature():
             softexit.trigger("Geometry optimization converged. Exiting simulation")
 
         if len(self.fixatoms) > 0:
@@ -693,7 +841,8 @@ class LBFGSOptimizer(DummyOptimizer):
         # Do one step. Update hessian for the new position. Update the position and force inside the mapper.
         L_BFGS(self.old_x, self.d, self.fm, self.qlist, self.glist,
                fdf0, self.big_step, self.ls_options["tolerance"]*self.tolerances["energy"],
-               self.ls_options["iter"], self.corrections, self.scale, step)
+               self.ls_options["iter"], self.corrections, self.scale, self.nhist)
+        self.nhist += 1
         # ALBERTO2
 
         # Update positions and forces
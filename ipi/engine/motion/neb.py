@@ -15,6 +15,7 @@ from ipi.engine.motion import Motion
 from ipi.utils.depend import *
 from ipi.utils.softexit import softexit
 from ipi.utils.mintools import L_BFGS, min_brent_neb
+from ipi.engine.forces import ForceCopies
 from ipi.utils.messages import verbosity, info
 
 
@@ -22,18 +23,122 @@ __all__ = ['NEBMover']
 
 
 # TODO: Do not shout :-)
-# NOTE: CURRENTLY, NEB ONLY WORKS FOR L-BFGS MINIMIZATION.
+# NOTE: CURRENTLY, NEB ONLY WORKS FOR L-BFGS, FIRE AND QUICK-MIN MINIMIZATION.
 #       IF SD, CG, OR BFGS OPTIONS ARE NOT DESIRED, CONSIDER ELIMINATING
 #       NEBLineMover AND THE RELEVANT BLOCKS IN NEBMover. IF THESE OPTIONS ARE DESIRED,
 #       THE INFRASTRUCTURE IS PRESENT BUT MUST BE DEBUGGED AND MADE CONSISTENT WITH
-#       THAT PRESENT IN NEBBFGSMover (TO REMOVE REMAINING ERRORS IN COMPUTATION).
-#       CLIMBING IMAGE AND VARIABLE SPRING CONSTANTS HAVE NOT YET BEEN IMPLEMENTED, BUT
+#       THAT PRESENT IN neb_forces (TO REMOVE REMAINING ERRORS IN COMPUTATION).
+#       VARIABLE SPRING CONSTANTS HAVE NOT YET BEEN IMPLEMENTED, BUT
 #       THE GENERIC INFRASTRUCTURE IS PRESENT (SEE COMMENTED BLOCKS IN NEBLineMover AND
-#       NEBBFGSMover). REQUIRES REARRANGEMENT AND DEBUGGING.
+#       neb_forces). REQUIRES REARRANGEMENT AND DEBUGGING.
 #       THIS NEB IMPLEMENTATION USES THE 'IMPROVED TANGENTS' OF HENKELMAN AND JONSSON, 2000.
 #       THE 'OLD IMPLEMENTATION' IS PRESERVED IN COMMENTS
 
 
+def neb_forces(bq, bf, be, kappa, climb=False):
+    """Computes the NEB forces from the positions, forces and energies of the
+    images. The end images keep their true forces.
+
+    Args:
+        bq: positions of the images
+        bf: forces on the images, which are overwritten with the NEB forces
+        be: energies of the images
+        kappa: spring constant
+        climb: whether the highest image climbs up to the transition state
+            instead of feeling the springs
+
+    Returns:
+        The NEB forces.
+    """
+
+    # Number of images and atoms
+    nimg = len(bq)
+    nat = len(bq[0]) // 3
+
+    # Array for sping constants
+    kappas = np.zeros(nimg)
+
+    # get tangents, end images are distinct, fixed, pre-relaxed configurations
+    btau = np.zeros((nimg, 3 * nat), float)
+    for ii in range(1, nimg - 1):
+        d1 = bq[ii] - bq[ii - 1]   # tau minus
+        d2 = bq[ii + 1] - bq[ii]   # tau plus
+
+        # Old implementation of NEB tangents
+        # btau[ii] = d1 / np.linalg.norm(d1) + d2 / np.linalg.norm(d2)
+        # btau[ii] *= 1.0 / np.linalg.norm(btau)
+
+        # Energy of images: (ii+1) < (ii) < (ii-1)
+        if (be[ii + 1] < be[ii]) and (be[ii] < be[ii - 1]):
+            btau[ii] = d1
+
+        # Energy of images (ii-1) < (ii) < (ii+1)
+        elif (be[ii - 1] < be[ii]) and (be[ii] < be[ii + 1]):
+            btau[ii] = d2
+
+        # Energy of image (ii) is a minimum or maximum
+        else:
+            maxpot = max(abs(be[ii + 1] - be[ii]), abs(be[ii - 1] - be[ii]))
+            minpot = min(abs(be[ii + 1] - be[ii]), abs(be[ii - 1] - be[ii]))
+
+            # when the neighbours have the same energy, both weightings
+            # give the bisector
+            if be[ii + 1] < be[ii - 1]:
+                btau[ii] = d2 * minpot + d1 * maxpot
+            else:
+                btau[ii] = d2 * maxpot + d1 * minpot
+
+        # the three images have the same energy: falls back to the bisector
+        if not btau[ii].any():
+            btau[ii] = d1 / np.linalg.norm(d1) + d2 / np.linalg.norm(d2)
+
+        btau[ii] *= 1.0 / np.linalg.norm(btau[ii])
+
+    # if mode == "variablesprings":
+# Determine variable spring constants
+# kappa = np.zeros(nimg)
+# ei = np.zeros(nimg)
+# emax = np.amax(be)
+# eref = max(be[0], be[nimg])
+# kappamax = self.spring["kappa_max"]
+# kappamin = self.spring["kappa_min"]
+# deltakappa = kappamax - kappamin
+# for ii in range(1, nimg - 1):
+# ei[ii] = max(be[ii], be[ii - 1])
+# if ei[j] > eref:
+# kappa[ii] = kappamax - deltakappa * ((emax - ei[ii]) / (emax - eref))
+# else:
+# kappa[ii] = kappamin
+#
+#        else:
+#            kappa.fill(self.kappa)
+#
+    # Array of spring constants; all are equal
+    kappas.fill(kappa)
+
+    # Climbing image: the highest image does not feel the springs, and
+    # climbs along the tangent instead
+    imax = np.argmax(be[1:nimg - 1]) + 1 if (climb and nimg > 2) else -1
+
+    # Get perpendicular forces
+    for ii in range(1, nimg - 1):
+        if ii == imax:
+            bf[ii] = bf[ii] - 2 * np.dot(bf[ii], btau[ii]) * btau[ii]
+        else:
+            bf[ii] = bf[ii] - np.dot(bf[ii], btau[ii]) * btau[ii]
+
+    # Adds the spring forces
+    for ii in range(1, nimg - 1):
+        if ii == imax:
+            continue
+
+        # Old implementation
+        # bf[ii] += kappa[ii] * btau[ii] * np.dot(btau[ii], (bq[ii + 1] + bq[ii - 1] - 2 * bq[ii]))
+        bf[ii] += kappas[ii] * (np.linalg.norm(bq[ii + 1] - bq[ii]) - np.linalg.norm(bq[ii] - bq[ii - 1])) * btau[ii]
+
+    return bf
+
+
 class NEBLineMover(object):
 
     """Creation of the one-dimensional function that will be minimized
@@ -188,120 +293,95 @@ class NEBBFGSMover(object):
         x0: initial position
         d: move direction
         xold: position from previous step
-        kappa: spring constants"""
+        kappa: spring constants
+        climb: flag for climbing image NEB"""
 
     def __init__(self):
         self.x0 = None
         self.d = None
         self.xold = None
         self.kappa = None
+        self.climb = False
 
     def bind(self, ens):
         self.dbeads = ens.beads.copy()
         self.dcell = ens.cell.copy()
         self.dforces = ens.forces.copy(self.dbeads, self.dcell)
+        self.fdcopies = ForceCopies(self.dforces, self.dcell)
 
     def __call__(self, x):
 
         # Bead positions
         self.dbeads.q = x
-        bq = dstrip(self.dbeads.q).copy()
+        f = self.fdcopies.find(dstrip(self.dbeads.q))
+        if f is not None:
+            self.dforces.transfer_forces(f)
 
-        # Forces
-        bf = dstrip(self.dforces.f).copy()
-
-        # Bead energies
-        be = dstrip(self.dforces.pots).copy()
+        return self.nebforces(self.dforces)
 
-        # Number of beads
-        nimg = self.dbeads.nbeads
+    def batch(self, xs):
+        """Computes the NEB gradient for several sets of bead positions at the same time."""
 
-        # Number of atoms
-        nat = self.dbeads.natoms
+        return [self.nebforces(f) for f in self.fdcopies.compute(xs)]
 
-        # Array for sping constants
-        kappa = np.zeros(nimg)
+    def nebforces(self, forces):
+        """Computes the modulus of the NEB gradient and the gradient from
+        a forces object and the beads it is bound to."""
 
-        # get tangents, end images are distinct, fixed, pre-relaxed configurations
-        btau = np.zeros((nimg, 3 * nat), float)
-        for ii in range(1, nimg - 1):
-            d1 = bq[ii] - bq[ii - 1]   # tau minus
-            d2 = bq[ii + 1] - bq[ii]   # tau plus
+        bf = neb_forces(dstrip(forces.beads.q), dstrip(forces.f).copy(),
+                        dstrip(forces.pots), self.kappa, self.climb)
 
-            # Old implementation of NEB tangents
-            # btau[ii] = d1 / np.linalg.norm(d1) + d2 / np.linalg.norm(d2)
-            # btau[ii] *= 1.0 / np.linalg.norm(btau)
+        # Return forces and modulus of gradient
+        g = -bf
+        e = np.linalg.norm(g)   # self.dforces.pot # 0.0
+        return e, g
 
-            # Energy of images: (ii+1) < (ii) < (ii-1)
-            if (be[ii + 1] < be[ii]) and (be[ii] < be[ii - 1]):
-                btau[ii] = d1
 
-            # Energy of images (ii-1) < (ii) < (ii+1)
-            elif (be[ii - 1] < be[ii]) and (be[ii] < be[ii + 1]):
-                btau[ii] = d2
+def image_forces(images, bq):
+    """Computes the forces on the images of a band all at the same time.
 
-            # Energy of image (ii) is a minimum or maximum
-            else:
-                maxpot = max(abs(be[ii + 1] - be[ii]), abs(be[ii - 1] - be[ii]))
-                minpot = min(abs(be[ii + 1] - be[ii]), abs(be[ii - 1] - be[ii]))
+    Each image is bound to its own single-bead copy of the forces, so that
+    only the images that have moved since the last call are sent to the
+    forcefield again.
 
-                if be[ii + 1] < be[ii - 1]:
-                    btau[ii] = d2 * minpot + d1 * maxpot
+    Args:
+        images: a ForceCopies object that makes single-bead copies
+        bq: positions of the images
 
-                elif be[ii - 1] < be[ii + 1]:
-                    btau[ii] = d2 * maxpot + d1 * minpot
+    Returns:
+        The forces and the energies of the images.
+    """
 
-                else:
-                    print "Error in NEB tangents: Energy of images are equal"
+    fs = images.compute(bq[:, np.newaxis])
+    bf = np.array([dstrip(f.f)[0] for f in fs])
+    be = np.array([f.pot for f in fs])
+    return bf, be
 
-            btau[ii] *= 1.0 / np.linalg.norm(btau)
 
-        # if mode == "variablesprings":
+class NEBFIREMover(object):
 
+    """Computes the NEB forces for the FIRE and quick-min optimizers.
 
-#        if mode == "ci":
-#
-# Climbing NEB term. Choose highest energy bead after 5 (arbitrary) iterations
-#            if step >= 5:
-#                imax = np.argmax(be)
-#                bf[imax] = bf[imax] - 2 * np.dot(bf[imax], btau[imax]) * btau[imax]
-#
-# Determine variable spring constants
-# kappa = np.zeros(nimg)
-# ei = np.zeros(nimg)
-# emax = np.amax(be)
-# eref = max(be[0], be[nimg])
-# kappamax = self.spring["kappa_max"]
-# kappamin = self.spring["kappa_min"]
-# deltakappa = kappamax - kappamin
-# for ii in range(1, nimg - 1):
-# ei[ii] = max(be[ii], be[ii - 1])
-# if ei[j] > eref:
-# kappa[ii] = kappamax - deltakappa * ((emax - ei[ii]) / (emax - eref))
-# else:
-# kappa[ii] = kappamin
-#
-#        else:
-#            kappa.fill(self.kappa)
-#
-        # Array of spring constants; all are equal
-        kappa.fill(self.kappa)
+    Attributes:
+        kappa: spring constants
+        climb: flag for climbing image NEB
+        images: single-bead copies of the forces, one for each image
+    """
 
-        # Get perpendicular forces
-        for ii in range(1, nimg - 1):
-            bf[ii] = bf[ii] - np.dot(bf[ii], btau[ii]) * btau[ii]
+    def __init__(self):
+        self.kappa = None
+        self.climb = False
+        self.images = None
 
-        # Adds the spring forces
-        for ii in range(1, nimg - 1):
+    def bind(self, ens):
+        self.images = ForceCopies(ens.forces, ens.cell.copy(), 1)
 
-            # Old implementation
-            # bf[ii] += kappa[ii] * btau[ii] * np.dot(btau[ii], (bq[ii + 1] + bq[ii - 1] - 2 * bq[ii]))
-            bf[ii] += kappa[ii] * (np.linalg.norm(bq[ii + 1] - bq[ii]) - np.linalg.norm(bq[ii] - bq[ii - 1])) * btau[ii]
+    def __call__(self, x):
+        """Computes the true forces and the energies of the images that have
+        moved, all at the same time, and returns the NEB forces."""
 
-        # Return forces and modulus of gradient
-        g = -bf
-        e = np.linalg.norm(g)   # self.dforces.pot # 0.0
-        return e, g
+        bf, be = image_forces(self.images, x)
+        return neb_forces(x, bf, be, self.kappa, self.climb)
 
 
 class NEBMover(Motion):
@@ -326,13 +406,23 @@ class NEBMover(Motion):
         corrections_lbfgs: number of corrections to store for L-BFGS
         qlist_lbfgs: list of previous positions (x_n+1 - x_n) for L-BFGS
         glist_lbfgs: list of previous gradients (g_n+1 - g_n) for L-BFGS
-        endpoints: flag for minimizing end images in NEB *** NOT YET IMPLEMENTED ***
+        endpoints: flag for minimizing end images in NEB *** ONLY IMPLEMENTED FOR FIRE ***
         spring:
             varsprings: T/F for variable spring constants
             kappa: single spring constant if varsprings is F
             kappamax: max spring constant if varsprings is T *** NOT YET IMPLEMENTED ***
             kappamin: min spring constant if varsprings is T *** NOT YET IMPLEMENTED ***
-        climb: flag for climbing image NEB *** NOT YET IMPLEMENTED ***
+        climb: flag for climbing image NEB
+        fire: options and state of the FIRE and quick-min optimizers
+            dt: current time step
+            dtmax: maximum time step
+            nmin: number of downhill steps before the time step is increased
+            finc: factor by which the time step is increased
+            fdec: factor by which the time step is decreased
+            alpha0: initial mixing of the velocities with the forces
+            falpha: factor by which the mixing is decreased
+            alpha: current mixing of the velocities with the forces
+            npos: number of downhill steps done so far
     """
 
     def __init__(self, fixcom=False, fixatoms=None,
@@ -341,15 +431,17 @@ class NEBMover(Motion):
                  old_force=np.zeros(0, float),
                  old_direction=np.zeros(0, float),
                  invhessian_bfgs=np.eye(0),
-                 ls_options={"tolerance": 1e-5, "iter": 100.0, "step": 1e-3, "adaptive": 1.0},
+                 ls_options={"tolerance": 1e-5, "iter": 100.0, "step": 1e-3, "adaptive": 1.0, "npoints": 1},
                  tolerances={"energy": 1e-5, "force": 1e-5, "position": 1e-5},
                  corrections_lbfgs=5,
                  qlist_lbfgs=np.zeros(0, float),
                  glist_lbfgs=np.zeros(0, float),
-                 endpoints=True,
+                 endpoints={"optimize": True, "algorithm": "bfgs"},
                  spring={"varsprings": False, "kappa": 1.0, "kappamax": 1.5, "kappamin": 0.5},
                  scale_lbfgs=2,
-                 climb=False):
+                 climb=False,
+                 fire={"dt": 41.341, "dtmax": 413.41, "nmin": 5, "finc": 1.1, "fdec": 0.5,
+                       "alpha0": 0.1, "falpha": 0.99, "alpha": 0.1, "npos": 0}):
         """Initialises NEBMover.
 
         Args:
@@ -374,9 +466,11 @@ class NEBMover(Motion):
         self.spring = spring
         self.climb = climb
         self.scale = scale_lbfgs
+        self.fire = fire
 
         self.neblm = NEBLineMover()
         self.nebbfgsm = NEBBFGSMover()
+        self.nebfire = NEBFIREMover()
 
     def bind(self, ens, beads, nm, cell, bforce, prng):
 
@@ -399,6 +493,10 @@ class NEBMover(Motion):
 
         self.neblm.bind(self)
         self.nebbfgsm.bind(self)
+        self.nebbfgsm.climb = self.climb
+        if self.mode in ["fire", "quickmin"]:
+            self.nebfire.bind(self)
+            self.nebfire.climb = self.climb
 
     def step(self, step=None):
         """Does one simulation time step."""
@@ -408,10 +506,16 @@ class NEBMover(Motion):
         # Fetch spring constants
         self.nebbfgsm.kappa = self.spring["kappa"]
         self.neblm.kappa = self.spring["kappa"]
+        self.nebfire.kappa = self.spring["kappa"]
 
         self.ptime = self.ttime = 0
         self.qtime = -time.time()
 
+        if self.mode in ["fire", "quickmin"]:
+            self.fire_step()
+            self.qtime += time.time()
+            return
+
         if self.mode == "lbfgs":
 
             # L-BFGS Minimization
@@ -443,7 +547,7 @@ class NEBMover(Motion):
             L_BFGS(self.beads.q, self.nebbfgsm.d, self.nebbfgsm, self.qlist, self.glist,
                    fdf0=(u0, du0), big_step=self.big_step, tol=self.ls_options["tolerance"],
                    itmax=self.ls_options["iter"],
-                   m=self.corrections, scale=self.scale, k=step)
+                   m=self.corrections, scale=self.scale, k=step, npts=self.ls_options["npoints"])
 
             info(" @GEOP: Updated position list", verbosity.debug)
             info(" @GEOP: Updated gradient list", verbosity.debug)
@@ -532,3 +636,84 @@ class NEBMover(Motion):
             info(" @GEOP: Not converged, force = %.8f, tol = %f" % (np.amax(np.absolute(self.forces.f)), self.tolerances["force"]), verbosity.debug)
             info(" @GEOP: Not converged, deltaForce = %.8f, tol = 0.00000000" % (np.sqrt(np.dot(self.forces.f.flatten() - self.old_f.flatten(), self.forces.f.flatten() - self.old_f.flatten()))), verbosity.debug)
             info(" @GEOP: Not converged, deltaX = %.8f, tol = %.8f" % (x, self.tolerances["position"]), verbosity.debug)
+
+    def fire_step(self):
+        """Does one step of the FIRE or of the quick-min optimizer.
+
+        The momenta of the beads hold the velocities of the images. The
+        images whose NEB force is below the force tolerance are frozen: they
+        do not move, so their forces are not computed again, until the motion
+        of their neighbours pushes their NEB force above the tolerance again.
+        """
+
+        fire = self.fire
+        m3 = dstrip(self.beads.m3)
+        q = dstrip(self.beads.q).copy()
+        v = dstrip(self.beads.p) / m3
+
+        # NEB forces at the current positions, which have been computed at
+        # the end of the previous step
+        self.nebfire.images.fcount = 0
+        f = self.fire_forces(q)
+        active = np.amax(np.absolute(f), axis=1) > self.tolerances["force"]
+        f[~active] = 0.0
+        v[~active] = 0.0
+
+        if self.mode == "fire":
+            power = np.dot(f.flatten(), v.flatten())
+            if power > 0.0:
+                # turns the velocities towards the forces, and speeds up after
+                # a few downhill steps
+                v = (1.0 - fire["alpha"]) * v + fire["alpha"] * np.linalg.norm(v) * f / np.linalg.norm(f)
+                if fire["npos"] > fire["nmin"]:
+                    fire["dt"] = min(fire["dt"] * fire["finc"], fire["dtmax"])
+                    fire["alpha"] *= fire["falpha"]
+                fire["npos"] += 1
+            elif power < 0.0:
+                # went uphill: stops and slows down
+                v[:] = 0.0
+                fire["dt"] *= fire["fdec"]
+                fire["alpha"] = fire["alpha0"]
+                fire["npos"] = 0
+        else:
+            # quick-min only keeps the velocity along the force, if downhill
+            fnorm = np.linalg.norm(f)
+            if fnorm > 0.0:
+                v = max(np.dot(v.flatten(), f.flatten()) / fnorm, 0.0) * f / fnorm
+
+        v += fire["dt"] * f / m3
+        dq = fire["dt"] * v
+        dqnorm = np.linalg.norm(dq)
+        if dqnorm > self.big_step:
+            info(" @NEB: Scaled step size", verbosity.debug)
+            dq *= self.big_step / dqnorm
+        q += dq
+
+        self.beads.q = q
+        self.beads.p = v * m3
+
+        # computes the images that have moved, and passes their forces on
+        f = self.fire_forces(q)
+        self.nebfire.images.transfer(self.forces)
+        info(" @NEB: Computed %d images, %d were frozen" % (self.nebfire.images.fcount, len(active) - active.sum()), verbosity.medium)
+
+        fmax = np.amax(np.absolute(f))
+        if fmax <= self.tolerances["force"]:
+            softexit.trigger("Geometry optimization converged. Exiting simulation")
+        else:
+            info(" @NEB: Not converged, force = %.8f, tol = %f" % (fmax, self.tolerances["force"]), verbosity.debug)
+
+    def fire_forces(self, q):
+        """Returns the NEB forces for the FIRE and quick-min optimizers,
+        without the components that are not allowed to move."""
+
+        f = self.nebfire(q)
+        if not self.endpoints["optimize"]:
+            f[0] = 0.0
+            f[-1] = 0.0
+        if len(self.fixatoms) > 0:
+            for fb in f:
+                fb[self.fixatoms * 3] = 0.0
+                fb[self.fixatoms * 3 + 1] = 0.0
+                fb[self.fixatoms * 3 + 2] = 0.0
+        return f
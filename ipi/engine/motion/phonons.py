@@ -35,13 +35,15 @@ class DynMatrixMover(Motion):
     """Dynamic matrix calculation routine by finite difference.
     """
 
-    def __init__(self, fixcom=False, fixatoms=None, mode="fd", energy_shift=0.0, pos_shift=0.001, output_shift=0.000, dynmat=np.zeros(0, float), refdynmat=np.zeros(0, float), prefix="", asr="none"):
+    def __init__(self, fixcom=False, fixatoms=None, mode="fd", energy_shift=0.0, pos_shift=0.001, output_shift=0.000, dynmat=np.zeros(0, float), refdynmat=np.zeros(0, float), prefix="", asr="none", window=1):
         """Initialises DynMatrixMover.
         Args:
         fixcom	: An optional boolean which decides whether the centre of mass
                   motion will be constrained or not. Defaults to False.
         dynmatrix : A 3Nx3N array that stores the dynamic matrix.
         refdynmatrix : A 3Nx3N array that stores the refined dynamic matrix.
+        window : The number of rows of the dynamic matrix whose displaced
+                 configurations are evaluated at once.
         """
 
         super(DynMatrixMover, self).__init__(fixcom=fixcom, fixatoms=fixatoms)
@@ -65,6 +67,7 @@ class DynMatrixMover(Motion):
         self.V = None
         self.prefix = prefix
         self.asr = asr
+        self.window = window
 
         if self.prefix == "":
             self.prefix = "PHONONS"
@@ -85,6 +88,56 @@ class DynMatrixMover(Motion):
         self.dcell = self.cell.copy()
         self.dforces = self.forces.copy(self.dbeads, self.dcell)
 
+        # copies of the forces used for the displaced configurations that are
+        # evaluated at the same time, and the rows that are being evaluated
+        self._free = [self.dforces]
+        self._pending = []
+
+    def displaced_forces(self, step):
+        """Returns minus the forces at the configurations displaced along the
+        direction used for a row of the dynamic matrix.
+
+        The displaced configurations of the following rows, up to the window,
+        are queued at the same time, each on its own copy of the forces, so
+        that many clients can work at once while the rows are still computed
+        in order. As only the current row is stored, a restart simply queues
+        the following rows again.
+
+        Args:
+            step: The index of the row.
+
+        Returns:
+            Minus the forces at the positive and at the negative displacement.
+        """
+
+        # the rows that are skipped still wait for their results, so that
+        # their requests are released
+        while len(self._pending) > 0 and self._pending[0][0] < step:
+            for f in self._pending.pop(0)[1]:
+                dstrip(f.f)
+                self._free.append(f)
+
+        first = step if len(self._pending) == 0 else self._pending[-1][0] + 1
+        for k in range(first, min(step + max(self.window, 1), 3 * self.beads.natoms)):
+            dev = self.phcalc.displacement(k)
+            fpm = []
+            for sign in (1.0, -1.0):
+                if len(self._free) > 0:
+                    f = self._free.pop()
+                else:
+                    nbeads = self.beads.copy()
+                    f = self.forces.copy(nbeads, self.dcell)
+                f.beads.q = self.beads.q + sign * dev
+                f.queue()
+                fpm.append(f)
+            self._pending.append((k, fpm))
+
+        fpm = self._pending.pop(0)[1]
+        plus = - dstrip(fpm[0].f).copy().flatten()
+        minus = - dstrip(fpm[1].f).copy().flatten()
+        self._free += fpm
+        return plus, minus
+
     def step(self, step=None):
         """Executes one step of phonon computation. """
         if (step < 3 * self.beads.natoms):
@@ -224,6 +277,10 @@ class DummyPhononCalculator(dobject):
         """Dummy simulation time step which does nothing."""
         pass
 
+    def displacement(self, step):
+        """Dummy displacement, which leaves the configuration unchanged."""
+        return np.zeros(3 * self.dm.beads.natoms, float)
+
     def transform(self):
         """Dummy transformation step which does nothing."""
         pass
@@ -256,18 +313,19 @@ class FDPhononCalculator(DummyPhononCalculator):
         else:
             self.dm.refdynmatrix = self.dm.refdynmatrix.reshape(((self.dm.beads.q.size, self.dm.beads.q.size)))
 
-    def step(self, step=None):
-        """Computes one row of the dynamic matrix."""
+    def displacement(self, step):
+        """Returns the displacement used to compute a row of the dynamic matrix."""
 
         # initializes the finite deviation
         dev = np.zeros(3 * self.dm.beads.natoms, float)
         dev[step] = self.dm.deltax
-        # displaces kth d.o.f by delta.
-        self.dm.dbeads.q = self.dm.beads.q + dev
-        plus = - dstrip(self.dm.dforces.f).copy()
-        # displaces kth d.o.f by -delta.
-        self.dm.dbeads.q = self.dm.beads.q - dev
-        minus = - dstrip(self.dm.dforces.f).copy()
+        return dev
+
+    def step(self, step=None):
+        """Computes one row of the dynamic matrix."""
+
+        # displaces kth d.o.f by delta and by -delta.
+        plus, minus = self.dm.displaced_forces(step)
         # computes a row of force-constant matrix
         dmrow = (plus - minus) / (2 * self.dm.deltax) * self.dm.ism[step] * self.dm.ism
         self.dm.dynmatrix[step] = dmrow
@@ -304,18 +362,19 @@ class NMFDPhononCalculator(FDPhononCalculator):
         for i in xrange(len(self.dm.V)):
             self.dm.V[:, i] *= self.dm.ism
 
+    def displacement(self, step):
+        """Returns the displacement along the kth normal mode."""
+
+        # initializes the finite deviation
+        vknorm = np.sqrt(np.dot(self.dm.V[:, step], self.dm.V[:, step]))
+        return np.real(self.dm.V[:, step] / vknorm) * self.dm.deltax
+
     def step(self, step=None):
         """Computes one row of the dynamic matrix."""
 
-        # initializes the finite deviation
         vknorm = np.sqrt(np.dot(self.dm.V[:, step], self.dm.V[:, step]))
-        dev = np.real(self.dm.V[:, step] / vknorm) * self.dm.deltax
-        # displaces by -delta along kth normal mode.
-        self.dm.dbeads.q = self.dm.beads.q + dev
-        plus = - dstrip(self.dm.dforces.f).copy().flatten()
-        # displaces by -delta along kth normal mode.
-        self.dm.dbeads.q = self.dm.beads.q - dev
-        minus = - dstrip(self.dm.dforces.f).copy().flatten()
+        # displaces by delta and by -delta along kth normal mode.
+        plus, minus = self.dm.displaced_forces(step)
         # computes a row of the refined dynmatrix, in the basis of the eigenvectors of the first dynmatrix
         dmrowk = (plus - minus) / (2 * self.dm.deltax / vknorm)
         self.dm.refdynmatrix[step] = np.dot(self.dm.V.T, dmrowk)
@@ -331,20 +390,28 @@ class ENMFDPhononCalculator(NMFDPhononCalculator):
     """ Energy scaled normal mode finite difference phonon evaluator.
     """
 
-    def step(self, step=None):
-        """Computes one row of the dynamic matrix."""
+    def edelta(self, step):
+        """Returns the energy-scaled displacement along the kth normal mode."""
 
-        # initializes the finite deviation
         vknorm = np.sqrt(np.dot(self.dm.V[:, step], self.dm.V[:, step]))
         edelta = vknorm * np.sqrt(self.dm.deltae * 2.0 / abs(self.dm.w2[step]))
         if edelta > 100 * self.dm.deltax: edelta = 100 * self.dm.deltax
-        dev = np.real(self.dm.V[:, step] / vknorm) * edelta
-        # displaces by -delta along kth normal mode.
-        self.dm.dbeads.q = self.dm.beads.q + dev
-        plus = - dstrip(self.dm.dforces.f).copy().flatten()
-        # displaces by -delta along kth normal mode.
-        self.dm.dbeads.q = self.dm.beads.q - dev
-        minus = - dstrip(self.dm.dforces.f).copy().flatten()
+        return edelta
+
+    def displacement(self, step):
+        """Returns the energy-scaled displacement along the kth normal mode."""
+
+        # initializes the finite deviation
+        vknorm = np.sqrt(np.dot(self.dm.V[:, step], self.dm.V[:, step]))
+        return np.real(self.dm.V[:, step] / vknorm) * self.edelta(step)
+
+    def step(self, step=None):
+        """Computes one row of the dynamic matrix."""
+
+        vknorm = np.sqrt(np.dot(self.dm.V[:, step], self.dm.V[:, step]))
+        edelta = self.edelta(step)
+        # displaces by delta and by -delta along kth normal mode.
+        plus, minus = self.dm.displaced_forces(step)
         # computes a row of the refined dynmatrix, in the basis of the eigenvectors of the first dynmatrix
         dmrowk = (plus - minus) / (2 * edelta / vknorm)
         self.dm.refdynmatrix[step] = np.dot(self.dm.V.T, dmrowk)
@@ -8,15 +8,197 @@
 
 
 import time
+import threading
+import Queue
+
+import numpy as np
 
 from ipi.engine.motion import Motion
 from ipi.utils.softexit import softexit
-from ipi.utils.io import read_file
+from ipi.utils.depend import dstrip
+from ipi.utils.io import read_file_raw
+from ipi.utils.io.backends.io_ipibin import mmap_ipibin
 from ipi.utils.io.inputs.io_xml import xml_parse_file
 from ipi.utils.units import unit_to_internal
 
 
-__all__ = ['Replay']
+__all__ = ['Replay', 'ReplayReader']
+
+
+class ReplayReader(object):
+
+    """Class reading the frames of a trajectory to be replayed.
+
+    Each step of the replay takes one frame per bead. For the text formats,
+    the frames are parsed by a background thread that keeps a bounded queue
+    of converted configurations ready to be used, so that the parsing
+    overlaps with the evaluation of the forces and of the outputs. Files in
+    the binary ipibin format are memory-mapped instead, so that any step can
+    be accessed directly, without reading the frames that come before it.
+
+    Attributes:
+       filename: The name of the trajectory file.
+       mode: The format of the trajectory file.
+       nbeads: The number of frames making up a step.
+       units: The units of length the configurations are scaled by.
+       queue_size: The number of steps that are parsed ahead of time.
+    """
+
+    def __init__(self, filename, mode, nbeads, units="automatic", queue_size=8):
+        """Initialises ReplayReader.
+
+        Args:
+           filename: The name of the trajectory file.
+           mode: The format of the trajectory file.
+           nbeads: The number of frames making up a step.
+           units: The units of length the configurations are scaled by.
+           queue_size: The number of steps that are parsed ahead of time.
+        """
+
+        self.filename = filename
+        self.mode = mode
+        self.nbeads = nbeads
+        self.units = units
+        self.queue_size = queue_size
+        self._next = 0
+        self._last = None
+        self._error = None
+        self._frames = None
+        self._queue = None
+        self._thread = None
+        self._doloop = [False]
+
+    def start(self):
+        """Opens the trajectory, starting the reader thread if needed."""
+
+        if self.mode == "ipibin":
+            self._frames = mmap_ipibin(self.filename)[1]
+            return
+
+        self._queue = Queue.Queue(max(self.queue_size, 1))
+        self._doloop[0] = True
+        self._thread = threading.Thread(target=self._read_loop, name="replay")
+        self._thread.daemon = True
+        self._thread.start()
+        softexit.register_thread(self._thread, self._doloop)
+
+    def stop(self):
+        """Stops the reader thread."""
+
+        self._doloop[0] = False
+        if self._thread is not None and self._thread.isAlive():
+            self._thread.join()
+
+    def _convert(self, comment, cell, data):
+        """Converts a frame to internal units, as the comment line says.
+
+        Args:
+           comment: The comment line of the frame.
+           cell: The cell matrix of the frame.
+           data: The positions of the frame.
+
+        Returns:
+           The cell matrix and the positions in internal units.
+        """
+
+        # late import is needed to break an import cycle
+        from ipi.utils.io.io_units import auto_units
+
+        dimension, units, cell_units = auto_units(comment, mode=self.mode)
+        scale = unit_to_internal("length", self.units, 1.0)
+        return (cell * (unit_to_internal("length", cell_units, 1.0) * scale),
+                data * (unit_to_internal(dimension, units, 1.0) * scale))
+
+    def _read_loop(self):
+        """Loop of the reader thread.
+
+        Reads one step at a time and puts the cell and the positions of all
+        the beads in the queue. An error, including the end of the file, is
+        put in the queue in place of the step and terminates the loop.
+        """
+
+        rfile = open(self.filename, "r")
+        try:
+            while self._doloop[0]:
+                try:
+                    qs = []
+                    for b in range(self.nbeads):
+                        frame = read_file_raw(self.mode, rfile)
+                        cell, q = self._convert(frame["comment"], frame["cell"], frame["data"])
+                        qs.append(q)
+                    item = (cell, np.asarray(qs))
+                except Exception as e:
+                    item = e
+                while self._doloop[0]:
+                    try:
+                        # a timed put, so that the thread notices the exit
+                        self._queue.put(item, True, 0.1)
+                        break
+                    except Queue.Full:
+                        pass
+                if isinstance(item, Exception):
+                    break
+        finally:
+            rfile.close()
+
+    def _get_next(self):
+        """Returns the next step parsed by the reader thread."""
+
+        if self._error is not None:
+            raise self._error
+        while True:
+            try:
+                # a timed get, so that the main thread stays responsive
+                item = self._queue.get(True, 2.0)
+                break
+            except Queue.Empty:
+                if not self._thread.isAlive():
+                    item = EOFError("Replay reader has stopped")
+                    break
+        if isinstance(item, Exception):
+            # the last step that was read can still be asked for
+            self._error = item
+            raise item
+        self._last = item
+        return item
+
+    def get(self, index):
+        """Returns the configuration of a step.
+
+        Args:
+           index: The index of the step. When reading a text file, the steps
+              can only be read in order, and the steps before index that
+              have not been read yet are skipped.
+
+        Returns:
+           The cell matrix, and an array with the positions of all the beads,
+           in internal units.
+
+        Raises:
+           EOFError: If the file does not contain the step.
+        """
+
+        if self._frames is not None:
+            first = index * self.nbeads
+            if first + self.nbeads > len(self._frames):
+                # maps the file again, in case it has grown in the meantime
+                self._frames = mmap_ipibin(self.filename)[1]
+                if first + self.nbeads > len(self._frames):
+                    raise EOFError("End of ipibin file")
+            frames = self._frames[first:first + self.nbeads]
+            cell, q = self._convert(frames[-1]["comment"], frames[-1]["cell"], frames["data"])
+            self._next = index + 1
+            return cell, q
+
+        if index < self._next:
+            if self._next == 0 or index < self._next - 1:
+                raise ValueError("Replay can only read the steps of a text file in order")
+            return self._last
+
+        while self._next <= index:
+            item = self._get_next()
+            self._next += 1
+        return item
 
 
 class Replay(Motion):
@@ -29,6 +211,11 @@ class Replay(Motion):
 
     Attributes:
         intraj: The input trajectory file.
+        reader: The ReplayReader object giving the frames of the trajectory,
+            or None when replaying a checkpoint file.
+        window: The number of steps whose forces are requested at once. The
+            steps after the current one are evaluated on copies of the
+            system, and their results are transferred to the system in turn.
         ptime: The time taken in updating the velocities.
         qtime: The time taken in updating the positions.
         ttime: The time taken in applying the thermostat steps.
@@ -37,7 +224,7 @@ class Replay(Motion):
         None really meaningful.
     """
 
-    def __init__(self, fixcom=False, fixatoms=None, intraj=None):
+    def __init__(self, fixcom=False, fixatoms=None, intraj=None, window=1):
         """Initialises Replay.
 
         Args:
@@ -46,6 +233,7 @@ class Replay(Motion):
            fixcom: An optional boolean which decides whether the centre of mass
               motion will be constrained or not. Defaults to False.
            intraj: The input trajectory file.
+           window: The number of steps whose forces are requested at once.
         """
 
         super(Replay, self).__init__(fixcom=fixcom, fixatoms=fixatoms)
@@ -53,9 +241,35 @@ class Replay(Motion):
             raise ValueError("Must provide an initialized InitFile object to read trajectory from")
         self.intraj = intraj
         if intraj.mode == "manual":
-            raise ValueError("Replay can only read from PDB or XYZ files -- or a single frame from a CHK file")
-        self.rfile = open(self.intraj.value, "r")
+            raise ValueError("Replay can only read from PDB, XYZ or IPIBIN files -- or a single frame from a CHK file")
+        if intraj.mode == "chk" or intraj.mode == "checkpoint":
+            self.rfile = open(self.intraj.value, "r")
+            self.reader = None
+        else:
+            self.reader = ReplayReader(self.intraj.value, self.intraj.mode, 1, self.intraj.units)
         self.rstep = 0
+        self.window = window
+        self._pending = []
+        self._free = []
+        self._eof = None
+
+    def bind(self, ens, beads, nm, cell, bforce, prng):
+        """Binds beads, cell, bforce, and prng to the calculator, and starts
+        reading the trajectory.
+
+        Args:
+            beads: The beads object from whcih the bead positions are taken.
+            nm: A normal modes object used to do the normal modes transformation.
+            cell: The cell object from which the system box is taken.
+            bforce: The forcefield object from which the force and virial are taken.
+            prng: The random number generator object which controls random number
+                generation.
+        """
+
+        super(Replay, self).bind(ens, beads, nm, cell, bforce, prng)
+        if self.reader is not None:
+            self.reader.nbeads = self.beads.nbeads
+            self.reader.start()
 
     def step(self, step=None):
         """Does one replay time step."""
@@ -64,43 +278,116 @@ class Replay(Motion):
         self.ttime = 0.0
         self.qtime = -time.time()
 
+        if self.reader is not None:
+            # replays the frames of the given step, skipping those before it
+            index = self.rstep if step is None else max(step, self.rstep)
+            try:
+                if self.window > 1:
+                    self._step_window(index)
+                else:
+                    h, q = self.reader.get(index)
+                    self.beads.q[:] = q
+                    self.cell.h[:] = h
+            except EOFError:
+                self.release()
+                softexit.trigger(" # Finished reading re-run trajectory")
+            self.rstep = index + 1
+            self.qtime += time.time()
+            return
+
         while True:
             self.rstep += 1
             try:
-                if self.intraj.mode == "xyz":
-                    for b in self.beads:
-                        myframe = read_file("xyz", self.rfile)
-                        myatoms = myframe['atoms']
-                        mycell = myframe['cell']
-                        myatoms.q *= unit_to_internal("length", self.intraj.units, 1.0)
-                        mycell.h *= unit_to_internal("length", self.intraj.units, 1.0)
-                        b.q[:] = myatoms.q
-                    self.cell.h[:] = mycell.h
-                elif self.intraj.mode == "pdb":
-                    for b in self.beads:
-                        myatoms, mycell = read_file("pdb", self.rfile)
-                        myatoms.q *= unit_to_internal("length", self.intraj.units, 1.0)
-                        mycell.h *= unit_to_internal("length", self.intraj.units, 1.0)
-                        b.q[:] = myatoms.q
-                    self.cell.h[:] = mycell.h
-                elif self.intraj.mode == "chk" or self.intraj.mode == "checkpoint":
-
-                    # TODO: Adapt the new `Simulation.load_from_xml`?
-
-                    # reads configuration from a checkpoint file
-                    xmlchk = xml_parse_file(self.rfile)   # Parses the file.
-
-                    from ipi.inputs.simulation import InputSimulation
-                    simchk = InputSimulation()
-                    simchk.parse(xmlchk.fields[0][1])
-                    mycell = simchk.cell.fetch()
-                    mybeads = simchk.beads.fetch()
-                    self.cell.h[:] = mycell.h
-                    self.beads.q[:] = mybeads.q
-                    softexit.trigger(" # Read single checkpoint")
+                # TODO: Adapt the new `Simulation.load_from_xml`?
+
+                # reads configuration from a checkpoint file
+                xmlchk = xml_parse_file(self.rfile)   # Parses the file.
+
+                from ipi.inputs.simulation import InputSimulation
+                simchk = InputSimulation()
+                simchk.parse(xmlchk.fields[0][1])
+                mycell = simchk.cell.fetch()
+                mybeads = simchk.beads.fetch()
+                self.cell.h[:] = mycell.h
+                self.beads.q[:] = mybeads.q
+                softexit.trigger(" # Read single checkpoint")
             except EOFError:
                 softexit.trigger(" # Finished reading re-run trajectory")
             if (step is None) or (self.rstep > step):
                 break
 
         self.qtime += time.time()
+
+    def release(self):
+        """Withdraws the force requests of the steps that have been read
+        ahead and not replayed, so that they do not stay in the queues of
+        the forcefields."""
+
+        while len(self._pending) > 0:
+            self._free.append(self._pending.pop(0)[1])
+            self._free[-1][2].release()
+
+    def _load(self, index):
+        """Reads a step, and queues its force evaluation on a copy of the system.
+
+        Args:
+           index: The index of the step.
+
+        Returns:
+           False if the trajectory ends before the step, True otherwise.
+        """
+
+        if self._eof is not None and index >= self._eof:
+            return False
+        try:
+            h, q = self.reader.get(index)
+        except EOFError:
+            self._eof = index
+            return False
+
+        if len(self._free) > 0:
+            beads, cell, forces = self._free.pop()
+        else:
+            beads = self.beads.copy()
+            cell = self.cell.copy()
+            forces = self.forces.copy(beads, cell)
+        beads.q[:] = q
+        cell.h[:] = h
+        forces.queue()
+        self._pending.append((index, (beads, cell, forces)))
+        return True
+
+    def _step_window(self, index):
+        """Moves the system to a step, keeping the force evaluations of the
+        following steps in flight.
+
+        The forces of the next window steps are queued all together, so that
+        many clients can work at the same time, while the steps are still
+        completed, and their outputs written, in order.
+
+        Args:
+           index: The index of the step.
+
+        Raises:
+           EOFError: If the trajectory ends before the step.
+        """
+
+        # the requests of the steps that are skipped are withdrawn
+        while len(self._pending) > 0 and self._pending[0][0] < index:
+            self._free.append(self._pending.pop(0)[1])
+            self._free[-1][2].release()
+
+        first = index if len(self._pending) == 0 else self._pending[-1][0] + 1
+        for i in range(first, index + self.window):
+            if not self._load(i):
+                break
+        if len(self._pending) == 0 or self._pending[0][0] != index:
+            self.release()
+            raise EOFError("End of re-run trajectory")
+
+        beads, cell, forces = self._pending.pop(0)[1]
+        self.beads.q[:] = dstrip(beads.q)
+        self.cell.h[:] = dstrip(cell.h)
+        dstrip(forces.f)  # waits for the results
+        self.forces.transfer_forces(forces)
+        self._free.append((beads, cell, forces))
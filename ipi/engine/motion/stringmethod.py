@@ -0,0 +1,215 @@
+"""Holds the algorithm to optimize reaction paths with the string method.
+
+The simplified zero-temperature string method of E, Ren and Vanden-Eijnden
+(J. Chem. Phys. 126, 164103, 2007) moves each image along its true force and
+then redistributes the images evenly along the path, so that no springs are
+needed to keep them apart.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+import time
+
+from ipi.engine.motion import Motion
+from ipi.engine.forces import ForceCopies
+from ipi.engine.motion.neb import image_forces
+from ipi.utils.depend import *
+from ipi.utils.softexit import softexit
+from ipi.utils.messages import verbosity, info
+from ipi.utils.units import UnitMap
+
+
+__all__ = ['StringMover']
+
+
+def reparametrize(bq):
+    """Redistributes the images evenly along the arc length of the path,
+    interpolating linearly between the images. The end images do not move.
+
+    Args:
+        bq: positions of the images
+
+    Returns:
+        The new positions of the images.
+    """
+
+    nimg = len(bq)
+    arc = np.zeros(nimg)
+    arc[1:] = np.cumsum(np.sqrt(((bq[1:] - bq[:-1]) ** 2).sum(axis=1)))
+    if arc[-1] == 0.0:
+        return bq.copy()
+
+    target = np.linspace(0.0, arc[-1], nimg)
+    nq = np.zeros(bq.shape)
+    for j in range(bq.shape[1]):
+        nq[:, j] = np.interp(target, arc, bq[:, j])
+    nq[0] = bq[0]
+    nq[-1] = bq[-1]
+    return nq
+
+
+def tangents(bq):
+    """Returns the unit tangents to the path at the images, from central
+    differences for the inner images and one-sided ones at the ends."""
+
+    btau = np.zeros(bq.shape)
+    btau[1:-1] = bq[2:] - bq[:-2]
+    btau[0] = bq[1] - bq[0]
+    btau[-1] = bq[-1] - bq[-2]
+    norm = np.sqrt((btau ** 2).sum(axis=1))
+    norm[norm == 0.0] = 1.0
+    return btau / norm[:, np.newaxis]
+
+
+class StringMover(Motion):
+
+    """Zero-temperature string method.
+
+    The images are the beads of the system. All the images that have moved
+    are computed at the same time, each on its own copy of the forces.
+
+    Attributes:
+        step_size: factor that turns the forces into the displacements of the images
+        biggest_step: largest displacement of an image in a single step
+        tolerances:
+            force: tolerance on the force perpendicular to the path
+            position: tolerance on the displacement of the images
+        endpoints: whether the end images are relaxed to the minima
+        ghts_input: a ghts state file that holds the definition of the
+            collective variables
+        ghts_output: the file the ghts state is written to once the path has
+            converged, with the dividing surface (z, n, M) at the highest image
+        images: single-bead copies of the forces, one for each image
+    """
+
+    def __init__(self, fixcom=False, fixatoms=None,
+                 step_size=1.0,
+                 biggest_step=0.5,
+                 tolerances={"force": 1e-4, "position": 1e-6},
+                 endpoints=True,
+                 ghts_input="",
+                 ghts_output="ghts_string.json"):
+        """Initialises StringMover.
+
+        Args:
+           fixcom: An optional boolean which decides whether the centre of mass
+              motion will be constrained or not. Defaults to False.
+        """
+
+        super(StringMover, self).__init__(fixcom=fixcom, fixatoms=fixatoms)
+
+        self.step_size = step_size
+        self.big_step = biggest_step
+        self.tolerances = tolerances
+        self.endpoints = endpoints
+        self.ghts_input = ghts_input
+        self.ghts_output = ghts_output
+
+        self.images = None
+
+    def bind(self, ens, beads, nm, cell, bforce, prng):
+
+        super(StringMover, self).bind(ens, beads, nm, cell, bforce, prng)
+        if beads.nbeads < 3:
+            raise ValueError("The string method needs at least three images")
+        self.images = ForceCopies(self.forces, self.cell.copy(), 1)
+
+    def forces_on_path(self, q):
+        """Returns the forces and energies of the images, without the
+        components that are not allowed to move."""
+
+        f, e = image_forces(self.images, q)
+        if not self.endpoints:
+            f[0] = 0.0
+            f[-1] = 0.0
+        if len(self.fixatoms) > 0:
+            for fb in f:
+                fb[self.fixatoms * 3] = 0.0
+                fb[self.fixatoms * 3 + 1] = 0.0
+                fb[self.fixatoms * 3 + 2] = 0.0
+        return f, e
+
+    def step(self, step=None):
+        """Does one step of the string method."""
+
+        info("\nMD STEP %d" % step, verbosity.debug)
+
+        self.ptime = self.ttime = 0
+        self.qtime = -time.time()
+
+        # forces at the current positions, which have been computed at the
+        # end of the previous step
+        self.images.fcount = 0
+        q = dstrip(self.beads.q).copy()
+        f, e = self.forces_on_path(q)
+
+        # moves the images along the forces, and puts them back at the same
+        # distance from each other
+        dq = self.step_size * f
+        dqnorm = np.sqrt((dq ** 2).sum(axis=1))
+        toobig = dqnorm > self.big_step
+        dq[toobig] *= (self.big_step / dqnorm[toobig])[:, np.newaxis]
+        nq = reparametrize(q + dq)
+
+        self.beads.q = nq
+        f, e = self.forces_on_path(nq)
+        self.images.transfer(self.forces)
+        info(" @STRING: Computed %d images" % self.images.fcount, verbosity.medium)
+
+        # only the force perpendicular to the path is left after the
+        # reparametrization, apart from the end images. On a coarse path it
+        # does not vanish completely, and the displacement of the images
+        # is then the better measure of convergence
+        btau = tangents(nq)
+        fperp = f.copy()
+        fperp[1:-1] -= (f[1:-1] * btau[1:-1]).sum(axis=1)[:, np.newaxis] * btau[1:-1]
+        fmax = np.amax(np.absolute(fperp))
+        dx = np.amax(np.absolute(nq - q))
+
+        self.qtime += time.time()
+
+        if fmax <= self.tolerances["force"] or dx <= self.tolerances["position"]:
+            if self.ghts_input != "":
+                self.export_ghts(nq, e)
+            softexit.trigger("String method converged. Exiting simulation")
+        else:
+            info(" @STRING: Not converged, force = %.8f, tol = %f" % (fmax, self.tolerances["force"]), verbosity.debug)
+            info(" @STRING: Not converged, deltaX = %.8f, tol = %.8f" % (dx, self.tolerances["position"]), verbosity.debug)
+
+    def export_ghts(self, bq, be):
+        """Writes a ghts state whose dividing surface passes through the
+        highest image, and is normal to the path in the space of the
+        collective variables.
+
+        Args:
+            bq: positions of the images
+            be: energies of the images
+        """
+
+        # the ghts tools need molmod, which is only required for this
+        from ghts import io as ghtsio
+        from ghts.cv import get_cv_set
+        from ghts.cv_geometry import normal
+
+        state = ghtsio.load_state(self.ghts_input)
+        if state is None:
+            raise ValueError("Cannot read the ghts state file " + self.ghts_input)
+
+        masses = dstrip(self.beads.m3)[0]
+        cvs = [get_cv_set(q, state["CV"], masses) for q in bq]
+        imax = np.argmax(be)
+        tau = cvs[min(imax + 1, len(cvs) - 1)].value - cvs[max(imax - 1, 0)].value
+
+        # same units as in the state file of ghts
+        amu = 1.0 / UnitMap["mass"]["dalton"]
+        m = cvs[imax].m
+        state["ghts"]["z"] = cvs[imax].value
+        state["ghts"]["n"] = normal(tau, np.linalg.inv(m)) / np.sqrt(amu)
+        state["ghts"]["M"] = m / amu
+
+        ghtsio.dump_state(state, self.ghts_output)
+        info(" @STRING: Wrote the dividing surface at image %d to %s" % (imax, self.ghts_output), verbosity.low)
@@ -40,6 +40,9 @@ class NormalModes(dobject):
        motion: The motion object that will need normal-mode transformation and propagator
        transform: A nm_trans object that contains the functions that are
           required for the normal mode transformation.
+       _pq, _pqnew: Buffers holding the mass-scaled normal mode momenta and
+          positions before and after the free ring polymer propagation.
+       _ocols: The indices of the columns that belong to open path atoms.
 
     Depend objects:
        mode: A string specifying how the bead masses are chosen.
@@ -146,6 +149,12 @@ class NormalModes(dobject):
         elif self.transform_method == "matrix":
             self.transform = nmtransform.nm_trans(nbeads=self.nbeads, open_paths=self.open_paths)
 
+        # work arrays for the free ring polymer propagation in mass-scaled
+        # coordinates, and the columns that belong to open path atoms
+        self._pq = np.zeros((2, self.nbeads, 3 * self.natoms), float)
+        self._pqnew = np.zeros((2, self.nbeads, 3 * self.natoms), float)
+        self._ocols = (3 * self.open_paths[:, np.newaxis] + np.arange(3)).flatten()
+
         # creates arrays to store normal modes representation of the path.
         # must do a lot of piping to create "ex post" a synchronization between the beads and the nm
         sync_q = synchronizer()
@@ -475,8 +484,9 @@ class NormalModes(dobject):
         Note that the propagator works in mass scaled coordinates, so that the
         propagator matrix can be determined independently from the particular
         atom masses, and so the same propagator will work for all the atoms in
-        the system. All the ring polymers are propagated at the same time by a
-        matrix multiplication.
+        the system. All the ring polymers and all the normal modes are
+        propagated at the same time, contracting the stack of propagator
+        matrices with the (p, q) pairs of each mode.
 
         Also note that the centroid coordinate is propagated in qcstep, so is
         not altered here.
@@ -485,42 +495,23 @@ class NormalModes(dobject):
         if self.nbeads == 1:
             pass
         else:
-            pq = np.zeros((2, self.natoms * 3), float)
             sm = dstrip(self.beads.sm3)
-            prop_pq = dstrip(self.prop_pq)
-            o_prop_pq = dstrip(self.o_prop_pq)
-            pnm = dstrip(self.pnm) / sm
-            qnm = dstrip(self.qnm) * sm
-
-            for k in range(1, self.nbeads):
-                pq[0, :] = pnm[k]
-                pq[1, :] = qnm[k]
-                pq = np.dot(prop_pq[k], pq)
-                qnm[k] = pq[1, :]
-                pnm[k] = pq[0, :]
-
-            # now for open paths we recover the initial conditions (that have not yet been overwritten)
-            # and do open path propagation
-            pq = np.zeros(2)
-            for j in self.open_paths:
-                for a in xrange(3 * j, 3 * (j + 1)):
-                    for k in xrange(1, self.nbeads):
-                        pq[0] = self.pnm[k, a] / sm[k, a]
-                        pq[1] = self.qnm[k, a] * sm[k, a]
-                        pq = np.dot(o_prop_pq[k], pq)
-                        qnm[k, a] = pq[1]
-                        pnm[k, a] = pq[0]
-            self.pnm = pnm * sm
-            self.qnm = qnm / sm
-            # pq = np.zeros((2,self.natoms*3),float)
-            # sm = dstrip(self.beads.sm3)[0]
-            # prop_pq = dstrip(self.prop_pq)
-            # for k in range(1,self.nbeads):
-            #   pq[0,:] = dstrip(self.pnm)[k]/sm
-            #   pq[1,:] = dstrip(self.qnm)[k]*sm
-            #   pq = np.dot(prop_pq[k],pq)
-            #   self.qnm[k] = pq[1,:]/sm
-            #   self.pnm[k] = pq[0,:]*sm
+            pq = self._pq
+            pqnew = self._pqnew
+            np.divide(dstrip(self.pnm), sm, out=pq[0])
+            np.multiply(dstrip(self.qnm), sm, out=pq[1])
+
+            pqnew[:, 0] = pq[:, 0]
+            np.einsum("kij,jkn->ikn", dstrip(self.prop_pq)[1:], pq[:, 1:], out=pqnew[:, 1:])
+            # open paths are propagated with their own normal modes, starting
+            # from the same initial conditions
+            if len(self._ocols) > 0:
+                pqnew[:, 1:, self._ocols] = np.einsum("kij,jkn->ikn", dstrip(self.o_prop_pq)[1:], pq[:, 1:, self._ocols])
+
+            np.multiply(pqnew[0], sm, out=pq[0])
+            np.divide(pqnew[1], sm, out=pq[1])
+            self.pnm = pq[0]
+            self.qnm = pq[1]
 
     def get_kins(self):
         """Gets the MD kinetic energy for all the normal modes.
@@ -11,6 +11,10 @@ and the restart files.
 
 import os
 import time
+import threading
+import traceback
+import Queue
+from cStringIO import StringIO
 
 import numpy as np
 
@@ -20,12 +24,204 @@ from ipi.utils.softexit import softexit
 from ipi.utils.depend import *
 import ipi.utils.io as io
 from ipi.utils.io.inputs.io_xml import *
+from ipi.utils.io.inputs.io_npz import npz_archive
+from ipi.utils.inputvalue import InputArray
 from ipi.utils.io import open_backup
+from ipi.utils.prng import Random
 from ipi.engine.properties import getkey
 from ipi.engine.atoms import *
 from ipi.engine.cell import *
 
-__all__ = ['PropertyOutput', 'TrajectoryOutput', 'CheckpointOutput']
+__all__ = ['OutputWriter', 'PropertyOutput', 'TrajectoryOutput', 'CheckpointOutput']
+
+
+class OutputWriter(object):
+
+    """Class writing the output streams from a background thread.
+
+    The outputs format the data to be printed on the thread that runs the
+    simulation, and hand the resulting text to the writer, so that the
+    simulation does not wait for the file system. The writer coalesces all
+    the text that is pending for each stream, and flushes the streams to disk
+    when a given time or amount of data has elapsed since the last flush.
+    If the writer falls behind, queuing more text blocks until there is
+    room in the queue.
+
+    Attributes:
+       fsync_time: The time in seconds after which the written data is
+          flushed to disk. A negative value disables the time criterion.
+       fsync_bytes: The number of bytes after which the written data is
+          flushed to disk. A negative value disables the size criterion.
+       queue_size: The maximum number of writes waiting to be done.
+    """
+
+    def __init__(self, fsync_time=1.0, fsync_bytes=1048576, queue_size=1000):
+        """Initializes OutputWriter.
+
+        Args:
+           fsync_time: The time in seconds between flushes to disk.
+           fsync_bytes: The number of bytes written between flushes to disk.
+           queue_size: The maximum number of writes waiting to be done.
+        """
+
+        self.fsync_time = fsync_time
+        self.fsync_bytes = fsync_bytes
+        self.queue_size = queue_size
+        self._queue = None
+        self._thread = None
+        self._doloop = [False]
+
+    def start(self):
+        """Starts the writer thread.
+
+        The thread is registered with softexit, so that on exit the pending
+        writes are completed before the streams are closed.
+        """
+
+        self._queue = Queue.Queue(max(self.queue_size, 0))
+        self._doloop[0] = True
+        self._thread = threading.Thread(target=self._write_loop, name="output")
+        self._thread.daemon = True
+        self._thread.start()
+        softexit.register_thread(self._thread, self._doloop)
+
+    def running(self):
+        """Returns True if the writer thread is active."""
+
+        return self._thread is not None and self._thread.isAlive()
+
+    def _put(self, item):
+        """Adds an item to the queue, waiting if the queue is full."""
+
+        while True:
+            try:
+                # a timed put, so that a full queue does not make the
+                # main thread deaf to signals
+                self._queue.put(item, True, 2.0)
+                return
+            except Queue.Full:
+                if not self.running():
+                    raise IOError("Output writer has stopped with pending output")
+
+    def write(self, stream, text):
+        """Queues some text to be written to a stream.
+
+        Args:
+           stream: The stream to write to.
+           text: A string with the text to be written.
+        """
+
+        self._put((stream, text))
+
+    def close(self, stream):
+        """Closes a stream after the pending text has been written to it.
+
+        Args:
+           stream: The stream to be closed.
+        """
+
+        if self.running():
+            self._put((stream, None))
+        else:
+            stream.close()
+
+    def drain(self):
+        """Waits until all the queued text is written and flushed to disk."""
+
+        if not self.running():
+            return
+        self._put((None, None))
+        while self._queue.unfinished_tasks > 0 and self.running():
+            time.sleep(1e-3)
+
+    def stop(self):
+        """Completes the pending writes and stops the writer thread."""
+
+        if not self.running():
+            return
+        self._doloop[0] = False
+        self._thread.join()
+
+    def _write_loop(self):
+        """Loop of the writer thread."""
+
+        dirty = []
+        nbytes = 0
+        tsync = time.time()
+        while self._doloop[0] or not self._queue.empty():
+            items = []
+            try:
+                items.append(self._queue.get(True, 0.1))
+                while True:
+                    items.append(self._queue.get_nowait())
+            except Queue.Empty:
+                pass
+
+            # coalesces the text for each stream, keeping the order of the
+            # writes to any one stream
+            sync = False
+            pending = {}
+            order = []
+            for stream, text in items:
+                if stream is None:
+                    sync = True
+                elif text is None:
+                    nbytes += self._flush_text(stream, pending)
+                    self._sync([stream])
+                    if stream in dirty:
+                        dirty.remove(stream)
+                    self._close(stream)
+                else:
+                    if not stream in pending:
+                        pending[stream] = []
+                        order.append(stream)
+                    pending[stream].append(text)
+            for stream in order:
+                if stream in pending:
+                    nbytes += self._flush_text(stream, pending)
+                    if not stream in dirty:
+                        dirty.append(stream)
+
+            if len(dirty) > 0 and (sync or
+                                   (self.fsync_bytes >= 0 and nbytes >= self.fsync_bytes) or
+                                   (self.fsync_time >= 0 and time.time() - tsync >= self.fsync_time)):
+                self._sync(dirty)
+                dirty = []
+                nbytes = 0
+                tsync = time.time()
+
+            for i in items:
+                self._queue.task_done()
+
+        self._sync(dirty)
+
+    def _flush_text(self, stream, pending):
+        """Writes the text pending for a stream, and returns its length."""
+
+        text = "".join(pending.pop(stream, []))
+        try:
+            stream.write(text)
+        except (IOError, ValueError):
+            warning("Exception while writing to output stream " + str(stream) + ":\n" + traceback.format_exc(), verbosity.low)
+        return len(text)
+
+    def _sync(self, streams):
+        """Flushes the streams to disk."""
+
+        for stream in streams:
+            try:
+                stream.flush()
+                os.fsync(stream.fileno())  # we REALLY want to print out! pretty please OS let us do it.
+            except (IOError, OSError, ValueError):
+                warning("Exception while flushing output stream " + str(stream), verbosity.low)
+
+    def _close(self, stream):
+        """Closes a stream."""
+
+        try:
+            stream.close()
+        except IOError:
+            warning("Exception while closing output stream " + str(stream), verbosity.low)
 
 
 class PropertyOutput(dobject):
@@ -44,6 +240,10 @@ class PropertyOutput(dobject):
        nout: Number of steps since data was last flushed.
        out: The output stream on which to output the properties.
        system: The system object to get the data to be output from.
+       writer: An OutputWriter used to write to the stream in the background,
+          or None to write directly.
+       accessors: The properties of outlist, as parsed by
+          Properties.compile() when the output is bound.
     """
 
     def __init__(self, filename="out", stride=1, flush=1, outlist=None):
@@ -68,15 +268,20 @@ class PropertyOutput(dobject):
         self.flush = flush
         self.nout = 0
         self.out = None
+        self.writer = None
+        self.accessors = []
 
-    def bind(self, system):
+    def bind(self, system, writer=None):
         """Binds output proxy to System object.
 
         Args:
            system: A System object to be bound.
+           writer: An optional OutputWriter that writes the output from a
+              background thread.
         """
 
         self.system = system
+        self.writer = writer
 
         # Checks as soon as possible if some asked-for properties are
         # missing or mispelled
@@ -85,6 +290,7 @@ class PropertyOutput(dobject):
             if not key in self.system.properties.property_dict.keys():
                 print "Computable properties list: ", self.system.properties.property_dict.keys()
                 raise KeyError(key + " is not a recognized property")
+        self.accessors = [self.system.properties.compile(what) for what in self.outlist]
 
         self.open_stream()
         softexit.register_function(self.softexit)
@@ -130,39 +336,46 @@ class PropertyOutput(dobject):
     def close_stream(self):
         """Closes the output stream."""
 
-        self.out.close()
+        if self.writer is None:
+            self.out.close()
+        else:
+            self.writer.close(self.out)
+
+    def due(self):
+        """Returns True if the properties must be written at this step."""
+
+        return (self.system.simul.step + 1) % self.stride == 0
 
     def write(self):
         """Outputs the required properties of the system.
 
         Note that properties are outputted using the same format as for the
         output to the xml checkpoint files, as specified in io_xml.
-
-        Raises:
-           KeyError: Raised if one of the properties specified in the output list
-              are not contained in the property_dict member of properties.
         """
 
         if softexit.triggered: return  # don't write if we are about to exit!
 
-        if not (self.system.simul.step + 1) % self.stride == 0:
+        if not self.due():
             return
-        self.out.write("  ")
-        for what in self.outlist:
-            try:
-                quantity, dimension, unit = self.system.properties[what]
-                if dimension != "" and unit != "":
-                    quantity = unit_to_user(dimension, unit, quantity)
-            except KeyError:
-                raise KeyError(what + " is not a recognized property")
+        line = ["  "]
+        properties = self.system.properties
+        for memokey, unit, dimension, factor in self.accessors:
+            quantity = properties.evaluate(memokey)
+            if factor is not None:
+                quantity = quantity / factor
             if not hasattr(quantity, "__len__"):
-                self.out.write(write_type(float, quantity) + "   ")
+                line.append(write_type(float, quantity) + "   ")
             else:
                 for el in quantity:
-                    self.out.write(write_type(float, el) + " ")
+                    line.append(write_type(float, el) + " ")
+        line.append("\n")
 
-        self.out.write("\n")
+        if self.writer is not None:
+            # the writer decides by itself when to flush
+            self.writer.write(self.out, "".join(line))
+            return
 
+        self.out.write("".join(line))
         self.nout += 1
         if self.flush > 0 and self.nout >= self.flush:
             self.out.flush()
@@ -190,6 +403,8 @@ class TrajectoryOutput(dobject):
        ibead: Index of the replica to print the trajectory of.
        cell_units: The units that the cell parameters are given in.
        system: The System object to get the data to be output from.
+       writer: An OutputWriter used to write to the streams in the background,
+          or None to write directly.
     """
 
     def __init__(self, filename="out", stride=1, flush=1, what="", format="xyz", cell_units="atomic_unit", ibead=-1):
@@ -219,15 +434,27 @@ class TrajectoryOutput(dobject):
         self.cell_units = cell_units
         self.out = None
         self.nout = 0
+        self.writer = None
+        self._offsets = {}
+        self._fatom = None
+        self._fcell = None
 
-    def bind(self, system):
+    def bind(self, system, writer=None):
         """Binds output proxy to System object.
 
         Args:
            system: A System object to be bound.
+           writer: An optional OutputWriter that writes the output from a
+              background thread.
         """
 
         self.system = system
+        self.writer = writer
+
+        # the frames are copied to these objects before being printed
+        self._fatom = Atoms(self.system.beads.natoms)
+        self._fatom.names[:] = self.system.beads.names
+        self._fcell = Cell()
 
         # Checks as soon as possible if some asked-for trajs are missing or mispelled
         key = getkey(self.what)
@@ -287,23 +514,41 @@ class TrajectoryOutput(dobject):
     def close_stream(self):
         """Closes the output stream."""
 
+        if self.writer is None:
+            close = lambda o: o.close()
+        else:
+            close = self.writer.close
         try:
             if hasattr(self.out, "__getitem__"):
                 for o in self.out:
-                    o.close()
+                    if o is not None:
+                        close(o)
             else:
-                self.out.close()
+                close(self.out)
         except AttributeError:
                     # This gets called on softexit. We want to carry on to shut down as cleanly as possible
             warning("Exception while closing output stream " + str(self.out), verbosity.low)
 
+    def due(self):
+        """Returns True if the trajectories must be written at this step."""
+
+        return (self.system.simul.step + 1) % self.stride == 0
+
     def write(self):
         """Writes out the required trajectories."""
 
         if softexit.triggered: return  # don't write if we are about to exit!
-        if not (self.system.simul.step + 1) % self.stride == 0:
+        if not self.due():
             return
 
+        # the number of beads can change, e.g. in an instanton scan, and then
+        # the streams are opened again for the new beads
+        if hasattr(self.out, "__getitem__") and len(self.out) != self.system.beads.nbeads:
+            self.close_stream()
+            if self.writer is not None:
+                self.writer.drain()
+            self.open_stream()
+
         doflush = False
         self.nout += 1
         if self.flush > 0 and self.nout >= self.flush:
@@ -317,14 +562,42 @@ class TrajectoryOutput(dobject):
             if self.ibead < 0:
                 for b in range(len(self.out)):
                     if self.out[b] is not None:
-                        self.write_traj(data, self.what, self.out[b], b, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
+                        self.write_frame(data, self.what, self.out[b], b, dimension=dimension, units=units, flush=doflush)
             elif self.ibead < len(self.out):
-                self.write_traj(data, self.what, self.out[self.ibead], self.ibead, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
+                self.write_frame(data, self.what, self.out[self.ibead], self.ibead, dimension=dimension, units=units, flush=doflush)
             else:
                 raise ValueError("Selected bead index " + str(self.ibead) + " does not exist for trajectory " + self.what)
         else:
-            self.write_traj(data, getkey(self.what), self.out, b=0, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
-        
+            self.write_frame(data, getkey(self.what), self.out, b=0, dimension=dimension, units=units, flush=doflush)
+
+    def write_frame(self, data, what, stream, b=0, dimension="", units="automatic", flush=True):
+        """Prints out a frame of a trajectory, either directly or through the writer.
+
+        When a writer is used, the frame is printed to a buffer that is then
+        handed to the writer, which also decides when the stream is flushed.
+        The buffer reports the position that the frame will have in the
+        stream, as binary formats rely on it.
+
+        Args:
+           data: The trajectory data to be printed.
+           what: A string specifying what to print.
+           stream: A reference to the stream on which data will be printed.
+           b: The bead index. Defaults to 0.
+           flush: A boolean which specifies whether to flush the output buffer
+              after the frame has been written.
+        """
+
+        if self.writer is None:
+            self.write_traj(data, what, stream, b, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=flush)
+        else:
+            if not stream in self._offsets:
+                self._offsets[stream] = stream.tell()
+            buff = FrameBuffer(self._offsets[stream])
+            self.write_traj(data, what, buff, b, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=False)
+            text = buff.getvalue()
+            self._offsets[stream] += len(text)
+            self.writer.write(stream, text)
+
 
     def write_traj(self, data, what, stream, b=0, format="xyz", dimension="", units="automatic", cell_units="automatic", flush=True):
         """Prints out a frame of a trajectory for the specified quantity and bead.
@@ -348,17 +621,16 @@ class TrajectoryOutput(dobject):
                 stream.flush()
                 os.fsync(stream)
             return
-        elif getkey(what) in ["positions", "velocities", "forces", "forces_sc", "momenta"]:
-            fatom = Atoms(self.system.beads.natoms)
-            fatom.names[:] = self.system.beads.names
+        # the names can change during the run, e.g. with alchemical exchanges
+        fatom = self._fatom
+        fatom.names[:] = dstrip(self.system.beads.names)
+        if getkey(what) in ["positions", "velocities", "forces", "forces_sc", "momenta"]:
             fatom.q[:] = data[b]
         else:
-            fatom = Atoms(self.system.beads.natoms)
-            fatom.names[:] = self.system.beads.names
             fatom.q[:] = data
 
-        fcell = Cell()
-        fcell.h = self.system.cell.h
+        fcell = self._fcell
+        fcell.h[:] = dstrip(self.system.cell.h)
 
         if units == "": units = "automatic"
         if cell_units == "": cell_units = "automatic"
@@ -368,6 +640,41 @@ class TrajectoryOutput(dobject):
             os.fsync(stream)
 
 
+class FrameBuffer(object):
+
+    """A string buffer for a trajectory frame that will be appended to a
+    stream, which reports positions as if it was the stream itself.
+
+    Attributes:
+       offset: The position in the stream at which the frame will be written.
+    """
+
+    def __init__(self, offset=0):
+        """Initializes the buffer.
+
+        Args:
+           offset: The position in the stream at which the frame will be written.
+        """
+
+        self.offset = offset
+        self._buff = StringIO()
+
+    def write(self, text):
+        """Writes some text to the buffer."""
+
+        self._buff.write(text)
+
+    def tell(self):
+        """Returns the position the stream will have after writing the buffer."""
+
+        return self.offset + self._buff.tell()
+
+    def getvalue(self):
+        """Returns the content of the buffer."""
+
+        return self._buff.getvalue()
+
+
 class CheckpointOutput(dobject):
 
     """Class dealing with outputting checkpoints.
@@ -382,11 +689,15 @@ class CheckpointOutput(dobject):
        overwrite: If True, the checkpoint file is overwritten at each output.
           If False, will output to 'filename_step'. Note that no check is done
           on whether 'filename_step' exists already.
+       binary: If True, the large arrays are written to a npz container next
+          to the checkpoint file, rather than as text.
        simul: The simulation object to get the data to be output from.
        status: An input simulation object used to write out the checkpoint file.
+       snapshot: A depend_snapshot holding the state of the simulation as of
+          the last call to store(), or None if the state is stored in status.
     """
 
-    def __init__(self, filename="restart", stride=1000, overwrite=True, step=0):
+    def __init__(self, filename="restart", stride=1000, overwrite=True, step=0, binary=False):
         """Initializes a checkpoint output proxy.
 
         Args:
@@ -397,14 +708,19 @@ class CheckpointOutput(dobject):
               If False, will output to 'filename_step'. Note that no check is done
               on whether 'filename_step' exists already.
            step: The number of checkpoint files that have been created so far.
+           binary: If True, the large arrays are written to a npz container.
         """
 
         self.filename = filename
         self.step = step
         self.stride = stride
         self.overwrite = overwrite
+        self.binary = binary
+        self._binfile = None
         self._storing = False
         self._continued = False
+        self.snapshot = None
+        self._prng_state = None
 
     def bind(self, simul):
         """Binds output proxy to simulation object.
@@ -418,6 +734,47 @@ class CheckpointOutput(dobject):
         self.status = isimulation.InputSimulation()
         self.status.store(simul)
 
+    def _can_snapshot(self):
+        """Checks whether the state of the simulation is held entirely in
+        depend objects and in the random number generator.
+
+        This is the case for dynamics, except with GLE thermostats, while for
+        instance optimizers, replica exchange and the grid metadynamics bias
+        keep part of their state in ordinary attributes.
+        """
+
+        from ipi.engine.motion import Motion, Dynamics, MultiMotion
+        from ipi.engine.smotion import Smotion, MetaDyn
+        from ipi.engine.thermostats import ThermoGLE, ThermoNMGLE, MultiThermo
+        from ipi.engine.forcefields import FFGridMetaD
+
+        # the grid and the deposition counter are plain attributes, so
+        # that the hills of the current step would not be rolled back
+        for ff in self.simul.fflist.values():
+            if isinstance(ff, FFGridMetaD):
+                return False
+
+        motions = [s.motion for s in self.simul.syslist]
+        thermos = []
+        while len(motions) > 0:
+            m = motions.pop()
+            if type(m) is MultiMotion:
+                motions += m.mlist
+            elif isinstance(m, Dynamics):
+                thermos += [m.thermostat, m.barostat.thermostat]
+            elif not type(m) is Motion:
+                return False
+
+        while len(thermos) > 0:
+            t = thermos.pop()
+            if isinstance(t, MultiThermo):
+                thermos += t.tlist
+            elif isinstance(t, (ThermoGLE, ThermoNMGLE)):
+                return False
+
+        sm = self.simul.smotion
+        return sm is None or type(sm) is Smotion or type(sm) is MetaDyn
+
     def store(self):
         """Stores the current simulation status.
 
@@ -425,12 +782,42 @@ class CheckpointOutput(dobject):
         we can output a checkpoint file corresponding to the beginning of the
         current step, which is the last time that both the velocities and
         positions would have been consistent.
+
+        When possible, only the independent quantities of the simulation are
+        copied into a snapshot, and the input objects are filled only when a
+        checkpoint is written. Otherwise the whole input tree is stored.
         """
 
         self._storing = True
-        self.status.store(self.simul)
+        if self.snapshot is None and self._can_snapshot():
+            self.snapshot = depend_snapshot(self.simul.syslist, self.simul.smotion, dd(self.simul).step)
+        if self.snapshot is None:
+            self.status.store(self.simul)
+        else:
+            self.snapshot.store()
+            self._prng_state = self.simul.prng.state
         self._storing = False
 
+    def restore(self):
+        """Stores the status of the simulation as of the last call to store().
+
+        If a snapshot was taken, the input objects are filled with the
+        values in the snapshot, which are read in place of the current ones,
+        so that the simulation is left as it is. This is only meant to be used
+        when the simulation is about to stop, and can run while other threads
+        are still halfway through a step.
+        """
+
+        if self.snapshot is not None:
+            with self.snapshot.view():
+                self.status.store(self.simul)
+            self.status.prng.store(Random(seed=self.simul.prng.seed, state=self._prng_state))
+
+    def due(self):
+        """Returns True if a checkpoint must be written at this step."""
+
+        return (self.simul.step + 1) % self.stride == 0
+
     def write(self, store=True):
         """Writes out the required trajectories.
 
@@ -452,7 +839,7 @@ class CheckpointOutput(dobject):
             info("@ CHECKPOINT: Write called while storing. Force re-storing", verbosity.low)
             self.store()
 
-        if not (self.simul.step + 1) % self.stride == 0:
+        if not self.due():
             return
 
         # function to use to open files
@@ -468,11 +855,61 @@ class CheckpointOutput(dobject):
         # Advance the step counter before saving, so next time the correct index will be loaded.
         if store:
             self.step += 1
-            self.store()
+            self.status.store(self.simul)
             self.status.step.store(self.simul.step+1)
+        else:
+            self.restore()
 
-        with open_function(filename, "w") as check_file:
-            check_file.write(self.status.write(name="simulation"))
+        if self.binary:
+            self.write_binary(filename, open_function)
+        else:
+            with open_function(filename, "w") as check_file:
+                check_file.write(self.status.write(name="simulation"))
 
         # Do not use backed up file open on subsequent writes.
         self._continued = True
+
+    def write_binary(self, filename, open_function):
+        """Writes out the stored status, with the large arrays in a npz container.
+
+        The container gets a new name at each write, and the checkpoint file
+        is replaced atomically once the container is complete, so that the
+        checkpoint file always refers to a complete container. The container
+        of the previous checkpoint is then removed, if it was overwritten.
+
+        Args:
+           filename: The name of the checkpoint file.
+           open_function: The function used to open the checkpoint file.
+        """
+
+        binfile = filename + "_" + str(self.simul.step + 1) + ".npz"
+        i = 0
+        while os.path.exists(binfile):
+            binfile = filename + "_" + str(self.simul.step + 1) + "_" + str(i) + ".npz"
+            i += 1
+
+        archive = npz_archive(binfile)
+        InputArray.set_archive(archive)
+        try:
+            text = self.status.write(name="simulation")
+        finally:
+            InputArray.set_archive(None)
+        archive.write()
+
+        if open_function is open_backup:
+            with open_function(filename, "w") as check_file:
+                check_file.write(text)
+        else:
+            tmpname = filename + ".tmp"
+            with open(tmpname, "w") as check_file:
+                check_file.write(text)
+                check_file.flush()
+                os.fsync(check_file.fileno())
+            os.rename(tmpname, filename)
+
+        if self.overwrite and self._binfile is not None:
+            try:
+                os.remove(self._binfile)
+            except OSError:
+                warning("Could not remove the old checkpoint container " + self._binfile, verbosity.low)
+        self._binfile = binfile
@@ -191,6 +191,9 @@ class Properties(dobject):
           replica of the system.
        property_dict: A dictionary containing all the properties that can be
           output.
+       profile: A dictionary giving, for each property string (stripped of
+          the units), the number of evaluations, the number of requests that
+          were served from the memo and the total evaluation time.
     """
 
     _DEFAULT_FINDIFF = 1e-4
@@ -503,7 +506,9 @@ class Properties(dobject):
                        Takes one argument, 'fd_delta', which gives the value of the finite difference parameter used -
                        which defaults to """ + str(-self._DEFAULT_FINDIFF) + """. If the value of 'fd_delta' is negative,
                        then its magnitude will be reduced automatically by the code if the finite difference error
-                       becomes too large.""",
+                       becomes too large. The potentials for the positive and negative displacements are computed
+                       concurrently. A second argument, 'fd_levels', gives the number of successively halved
+                       displacements that are computed together when 'fd_delta' is negative, and defaults to 1.""",
                              'func': self.get_yama_estimators,
                              "size": 2},
 
@@ -516,7 +521,9 @@ class Properties(dobject):
                        Takes one argument, 'fd_delta', which gives the value of the finite difference parameter used -
                        which defaults to """ + str(-self._DEFAULT_FINDIFF) + """. If the value of 'fd_delta' is negative,
                        then its magnitude will be reduced automatically by the code if the finite difference error
-                       becomes too large.""",
+                       becomes too large. The potentials for the positive and negative displacements are computed
+                       concurrently. A second argument, 'fd_levels', gives the number of successively halved
+                       displacements that are computed together when 'fd_delta' is negative, and defaults to 1.""",
                                 'func': self.get_scyama_estimators,
                                 "size": 2},
 
@@ -635,6 +642,12 @@ class Properties(dobject):
                           <exp(-beta*sc)>, and 4-5) Suzuki-Chin and Takahashi-Imada 4th-order reweighing term"""}
         }
 
+        # parsed property strings, and values computed at the current step
+        self._compiled = {}
+        self._memo = {}
+        self._memostep = None
+        self.profile = {}
+
     def bind(self, system):
         """Binds the necessary objects from the system to calculate the
         required properties.
@@ -656,6 +669,7 @@ class Properties(dobject):
         self.dbeads = system.beads.copy()
         self.dcell = system.cell.copy()
         self.dforces = system.forces.copy(self.dbeads, self.dcell)
+        self._fdcopies = [(self.dbeads, self.dforces)]
         self.fqref = None
         self._threadlock = system._propertylock # lock to avoid concurrent access and messing up with dbeads 
         
@@ -687,19 +701,98 @@ class Properties(dobject):
            the property specified by the keyword key.
         """
 
-        (key, unit, arglist, kwarglist) = getall(key)
-        pkey = self.property_dict[key]
+        try:
+            memokey, unit, dimension = self._compiled[key][:3]
+        except KeyError:
+            memokey, unit, dimension = self.compile(key)[:3]
 
-        # pkey["func"](*arglist,**kwarglist) gives the value of the property
-        # in atomic units. unit_to_user() returns the value in the user
-        # specified units.
-        with self._threadlock:
-            value = pkey["func"](*arglist, **kwarglist)
+        return self.evaluate(memokey), dimension, unit
+
+    def compile(self, key):
+        """Parses a property string, and stores the result so that the
+        string is only parsed once.
+
+        Args:
+           key: A string giving a property, as in __getitem__.
+
+        Returns:
+           A tuple giving the key used to memoize the value of the property,
+           the units, the dimension and the factor to convert the value from
+           internal units to the units that are requested, which is None if
+           no conversion is needed. Properties that only differ in their
+           units share the same memo key.
+        """
+
+        if key in self._compiled:
+            return self._compiled[key]
+
+        (name, unit, arglist, kwarglist) = getall(key)
+        pkey = self.property_dict[name]
         if "dimension" in pkey:
             dimension = pkey["dimension"]
         else:
             dimension = ""
-        return value, dimension, unit
+        if dimension != "" and unit != "":
+            factor = unit_to_internal(dimension, unit, 1.0)
+        else:
+            factor = None
+
+        memokey = (name, arglist, tuple(sorted(kwarglist.items())))
+        self._compiled[key] = (memokey, unit, dimension, factor)
+        return self._compiled[key]
+
+    def evaluate(self, memokey):
+        """Returns the value of a property at the current step.
+
+        The value is computed at most once per step: later requests during
+        the same step, e.g. from different outputs, return the same value.
+
+        Args:
+           memokey: The memo key of the property, as returned by compile().
+
+        Returns:
+           The value of the property in internal units.
+        """
+
+        (name, arglist, kwarglist) = memokey
+        with self._threadlock:
+            if self._memostep != self.simul.step:
+                self._memo.clear()
+                self._memostep = self.simul.step
+            if memokey in self._memo:
+                self.profile[memokey][1] += 1
+                return self._memo[memokey]
+
+            # pkey["func"](*arglist,**kwarglist) gives the value of the property
+            # in atomic units.
+            start = time.time()
+            value = self.property_dict[name]["func"](*arglist, **dict(kwarglist))
+            self._memo[memokey] = value
+
+            if not memokey in self.profile:
+                self.profile[memokey] = [0, 0, 0.0]
+            self.profile[memokey][0] += 1
+            self.profile[memokey][2] += time.time() - start
+        return value
+
+    def profile_summary(self):
+        """Returns the evaluation statistics of the properties, starting
+        from the one that took longest to compute.
+
+        Returns:
+           A list of tuples giving the property (without units), the number
+           of evaluations, the number of requests served from the memo and
+           the total evaluation time in seconds.
+        """
+
+        summary = []
+        for (name, arglist, kwarglist), (ncalls, nhits, elapsed) in self.profile.items():
+            args = list(arglist) + ["%s=%s" % kw for kw in kwarglist]
+            if len(args) > 0:
+                name += "(" + ";".join(args) + ")"
+            summary.append((name, ncalls, nhits, elapsed))
+        summary.sort(key=lambda x: -x[3])
+        return summary
 
     def tensor2vec(self, tensor):
         """Takes a 3*3 symmetric tensor and returns it as a 1D array,
@@ -1336,7 +1429,90 @@ class Properties(dobject):
 
         return nx_tot / float(ncount)
 
-    def get_yama_estimators(self, fd_delta=- _DEFAULT_FINDIFF):
+    def get_fd_copies(self, ncopies):
+        """Returns dummy beads and forces objects to compute the potential
+        of several displaced configurations at the same time.
+
+        The first copy is given by dbeads and dforces, the others are only
+        created the first time they are needed.
+
+        Args:
+           ncopies: The number of copies that are needed.
+
+        Returns:
+           A list of (beads, forces) tuples.
+        """
+
+        while len(self._fdcopies) < ncopies:
+            dbeads = self.beads.copy()
+            self._fdcopies.append((dbeads, self.forces.copy(dbeads, self.dcell)))
+        return self._fdcopies[:ncopies]
+
+    def get_scaled_pots(self, dbetas, suzuki_chin=False):
+        """Computes the potential of the configurations with the bead
+        displacements from the centroid scaled by sqrt(1 + dbeta) and
+        sqrt(1 - dbeta), for several values of dbeta.
+
+        All the configurations are queued before any of the results is
+        collected, so that they are dispatched concurrently to the clients.
+
+        Args:
+           dbetas: A list with the relative changes of temperature.
+           suzuki_chin: If True, includes the Suzuki-Chin correction to the
+              potential.
+
+        Returns:
+           A list with the (vplus, vminus) potentials per bead, for each of
+           the values of dbeta.
+        """
+
+        scales = []
+        for dbeta in dbetas:
+            scales += [np.sqrt(1.0 + dbeta), np.sqrt(1.0 - dbeta)]
+
+        qc = dstrip(self.beads.qc)
+        q = dstrip(self.beads.q)
+        copies = self.get_fd_copies(len(scales))
+        for scale, (dbeads, dforces) in zip(scales, copies):
+            dbeads.q[:] = qc * (1.0 - scale) + scale * q
+            if suzuki_chin:
+                dforces.omegan2 = self.forces.omegan2
+                dforces.alpha = self.forces.alpha
+            dforces.queue()
+
+        pots = []
+        for dbeads, dforces in copies:
+            if suzuki_chin:
+                pots.append((dforces.pot + dforces.potsc) / self.beads.nbeads)
+            else:
+                pots.append(dforces.pot / self.beads.nbeads)
+        return zip(pots[0::2], pots[1::2])
+
+    def iter_scaled_pots(self, dbeta, nlevels=1, suzuki_chin=False):
+        """Yields the scaled-coordinates potentials for dbeta, dbeta/2,
+        dbeta/4 and so on.
+
+        The potentials for nlevels successive values of dbeta are computed
+        at the same time, so that when the finite difference must be reduced
+        the following values are often available already.
+
+        Args:
+           dbeta: The largest relative change of temperature.
+           nlevels: The number of values of dbeta computed together.
+           suzuki_chin: If True, includes the Suzuki-Chin correction to the
+              potential.
+
+        Returns:
+           A generator of (dbeta, vplus, vminus) tuples.
+        """
+
+        while True:
+            dbetas = [dbeta * 0.5**k for k in range(nlevels)]
+            for dbeta, (vplus, vminus) in zip(dbetas, self.get_scaled_pots(dbetas, suzuki_chin)):
+                yield dbeta, vplus, vminus
+            dbeta *= 0.5
+
+    def get_yama_estimators(self, fd_delta=- _DEFAULT_FINDIFF, fd_levels="1"):
         """Calculates the quantum scaled coordinate kinetic energy estimator.
 
         Uses a finite difference method to calculate the estimators
@@ -1351,31 +1527,23 @@ class Properties(dobject):
            fd_delta: the relative finite difference in temperature to apply in
            computing finite-difference quantities. If it is negative, will be
            scaled down automatically to avoid discontinuities in the potential.
+           fd_levels: the number of finite differences that are computed
+           together when fd_delta is negative, in case it must be scaled down.
         """
 
-        dbeta = abs(float(fd_delta))
+        # the arguments are passed as strings by the property parser
+        fd_delta = float(fd_delta)
+        dbeta = abs(fd_delta)
         beta = 1.0 / (Constants.kb * self.ensemble.temp)
+        nlevels = max(1, int(fd_levels)) if fd_delta < 0 else 1
 
-        qc = dstrip(self.beads.qc)
-        q = dstrip(self.beads.q)
         v0 = self.forces.pot / self.beads.nbeads
-        while True:
-            splus = np.sqrt(1.0 + dbeta)
-            sminus = np.sqrt(1.0 - dbeta)
-
-            for b in range(self.beads.nbeads):
-                self.dbeads[b].q = qc * (1.0 - splus) + splus * q[b, :]
-            vplus = self.dforces.pot / self.beads.nbeads
-
-            for b in range(self.beads.nbeads):
-                self.dbeads[b].q = qc * (1.0 - sminus) + sminus * q[b, :]
-            vminus = self.dforces.pot / self.beads.nbeads
+        for dbeta, vplus, vminus in self.iter_scaled_pots(dbeta, nlevels):
 
             # print "DISPLACEMENT CHECK YAMA db: %e, d+: %e, d-: %e, dd: %e" %(dbeta, (vplus-v0)*dbeta, (v0-vminus)*dbeta, abs((vplus+vminus-2*v0)/(vplus-vminus)))
 
             if (fd_delta < 0 and abs((vplus + vminus - 2 * v0) / (vplus - vminus)) > self._DEFAULT_FDERROR and dbeta > self._DEFAULT_MINFID):
                 if dbeta > self._DEFAULT_MINFID:
-                    dbeta *= 0.5
                     info("Reducing displacement in scaled coordinates estimator", verbosity.low)
                     continue
                 else:
@@ -1394,7 +1562,7 @@ class Properties(dobject):
 
         return np.asarray([eps, eps_prime])
 
-    def get_scyama_estimators(self, fd_delta=- _DEFAULT_FINDIFF):
+    def get_scyama_estimators(self, fd_delta=- _DEFAULT_FINDIFF, fd_levels="1"):
         """Calculates the quantum scaled coordinate suzuki-chin kinetic energy estimator for the Suzuki-Chin propagator.
 
         Uses a finite difference method to calculate the estimators
@@ -1409,33 +1577,21 @@ class Properties(dobject):
            fd_delta: the relative finite difference in temperature to apply in
            computing finite-difference quantities. If it is negative, will be
            scaled down automatically to avoid discontinuities in the potential.
+           fd_levels: the number of finite differences that are computed
+           together when fd_delta is negative, in case it must be scaled down.
         """
 
-        dbeta = abs(float(fd_delta))
+        # the arguments are passed as strings by the property parser
+        fd_delta = float(fd_delta)
+        dbeta = abs(fd_delta)
         beta = 1.0 / (Constants.kb * self.ensemble.temp)
-        self.dforces.omegan2 = self.forces.omegan2
-        self.dforces.alpha = self.forces.alpha
-
-        qc = dstrip(self.beads.qc)
-        q = dstrip(self.beads.q)
+        nlevels = max(1, int(fd_levels)) if fd_delta < 0 else 1
 
         v0 = (self.forces.pot + self.forces.potsc) / self.beads.nbeads
 
-        while True:
-            splus = np.sqrt(1.0 + dbeta)
-            sminus = np.sqrt(1.0 - dbeta)
-
-            for b in range(self.beads.nbeads):
-                self.dbeads[b].q = qc * (1.0 - splus) + splus * q[b, :]
-            vplus = (self.dforces.pot + self.dforces.potsc) / self.beads.nbeads
-
-            for b in range(self.beads.nbeads):
-                self.dbeads[b].q = qc * (1.0 - sminus) + sminus * q[b, :]
-            vminus = (self.dforces.pot + self.dforces.potsc) / self.beads.nbeads
-
+        for dbeta, vplus, vminus in self.iter_scaled_pots(dbeta, nlevels, suzuki_chin=True):
             if (fd_delta < 0 and abs((vplus + vminus - 2 * v0) / (vplus - vminus)) > self._DEFAULT_FDERROR):
                 if dbeta > self._DEFAULT_MINFID:
-                    dbeta *= 0.5
                     info("Reducing displacement in scaled coordinates estimator", verbosity.low)
                     continue
                 else:
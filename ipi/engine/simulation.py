@@ -14,9 +14,10 @@ choosing which properties to initialise, and which properties to output.
 import os
 import threading
 import time
+import traceback
 from copy import deepcopy
 
-from ipi.utils.depend import depend_value, dobject, dd
+from ipi.utils.depend import depend_value, dobject, dd, dfreeze
 from ipi.utils.io.inputs.io_xml import xml_parse_file
 from ipi.utils.messages import verbosity, info, warning, banner
 from ipi.utils.softexit import softexit
@@ -24,7 +25,123 @@ import ipi.engine.outputs as eoutputs
 import ipi.inputs.simulation as isimulation
 
 
-__all__ = ['Simulation']
+__all__ = ['Simulation', 'StepWorkers']
+
+
+class StepWorkers(object):
+
+    """Steps several systems in parallel using persistent threads.
+
+    The first system is stepped by the calling thread, and each of the
+    others by a thread that is created once and then waits to be released
+    at every step. A call to step() returns when all the systems have
+    completed the step, so that the threads act as a barrier.
+
+    Attributes:
+        syslist: The list of the systems to be stepped.
+        twait: A list with the time (in seconds) each system has spent at the
+            barrier waiting for the others to complete their step.
+        nsteps: The number of steps since the timings were last reset.
+    """
+
+    def __init__(self, syslist):
+        """Initialises StepWorkers and starts the threads.
+
+        Args:
+            syslist: The list of the systems to be stepped.
+        """
+
+        self.syslist = syslist
+        self.twait = [0.0] * len(syslist)
+        self.nsteps = 0
+        self._tdone = [0.0] * len(syslist)
+        self._cond = threading.Condition()
+        self._running = True
+        self._gen = 0
+        self._step = None
+        self._pending = 0
+        self._threads = []
+        for i in range(1, len(syslist)):
+            st = threading.Thread(target=self._work, args=(i,), name=syslist[i].prefix)
+            st.daemon = True
+            st.start()
+            self._threads.append(st)
+
+    def _work(self, i):
+        """Loop of the thread that steps the i-th system."""
+
+        gen = 0
+        motion = self.syslist[i].motion
+        while True:
+            with self._cond:
+                while self._running and self._gen == gen:
+                    self._cond.wait()
+                if not self._running:
+                    # a step that has been released but will not be done
+                    # must still be accounted for, or step() would wait forever
+                    if self._gen != gen:
+                        self._pending -= 1
+                        self._cond.notify_all()
+                    return
+                gen = self._gen
+                step = self._step
+
+            try:
+                motion.step(step=step)
+            except SystemExit:
+                # a soft exit has been triggered from within the step
+                pass
+            except Exception:
+                warning("Exception while stepping system " + self.syslist[i].prefix + ":\n" + traceback.format_exc(), verbosity.low)
+            finally:
+                with self._cond:
+                    self._tdone[i] = time.time()
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._cond.notify_all()
+
+    def step(self, step):
+        """Does one step of all the systems, and waits for all of them to complete.
+
+        Args:
+            step: The current simulation step.
+        """
+
+        with self._cond:
+            self._step = step
+            self._pending = len(self._threads)
+            self._gen += 1
+            self._cond.notify_all()
+
+        self.syslist[0].motion.step(step=step)
+        self._tdone[0] = time.time()
+
+        # polls rather than waiting on the condition, which would make the
+        # main thread deaf to signals. the sleeps are kept short, as the
+        # other systems are usually about to complete their step. does not
+        # wait for the others if the run is being stopped
+        delay = 1e-5
+        while self._pending > 0 and self._running and not softexit.triggered:
+            time.sleep(delay)
+            delay = min(2.0 * delay, 1e-3)
+
+        tbarrier = time.time()
+        for i in range(len(self.syslist)):
+            self.twait[i] += tbarrier - self._tdone[i]
+        self.nsteps += 1
+
+    def reset_timings(self):
+        """Zeroes the barrier timing counters."""
+
+        self.twait = [0.0] * len(self.syslist)
+        self.nsteps = 0
+
+    def stop(self):
+        """Releases the threads and lets them terminate."""
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
 
 
 class Simulation(dobject):
@@ -44,6 +161,8 @@ class Simulation(dobject):
         outtemplate: A template output object to be used to generate the outputs
             list. This will be used for each of the systems.
         outputs: A list of output objects that should be printed during the run
+        writer: An OutputWriter that writes the properties and trajectories
+            in the background, or None if they are written directly.
         paratemp: A helper object for parallel tempering simulations
         chk: A checkpoint object which is kept up-to-date in case of emergency exit
         rollback: If set to true, the state of the simulation at the start
@@ -106,7 +225,7 @@ class Simulation(dobject):
 
         return simulation
 
-    def __init__(self, mode, syslist, fflist, outputs, prng, smotion=None, step=0, tsteps=1000, ttime=0, threads=False):
+    def __init__(self, mode, syslist, fflist, outputs, prng, smotion=None, step=0, tsteps=1000, ttime=0, threads=False, freeze_depend=False, writer=None):
         """Initialises Simulation class.
 
         Args:
@@ -122,12 +241,18 @@ class Simulation(dobject):
                 to 1000.
             ttime: The simulation running time. Used on restart, to keep a
                 cumulative total.
+            threads: Whether the systems should be stepped in parallel threads.
+            freeze_depend: Whether the network of dependencies should be
+                frozen once all the objects have been bound.
+            writer: An optional OutputWriter used to write the outputs from
+                a background thread.
         """
 
         info(" # Initializing simulation object ", verbosity.low)
         self.prng = prng
         self.mode = mode
         self.threading = threads
+        self.freeze_depend = freeze_depend
         dself = dd(self)
 
         self.syslist = syslist
@@ -144,6 +269,7 @@ class Simulation(dobject):
             self.fflist[f.name] = f
 
         self.outtemplate = outputs
+        self.writer = writer
 
         dself.step = depend_value(name="step", value=step)
         self.tsteps = tsteps
@@ -180,16 +306,22 @@ class Simulation(dobject):
                     no = deepcopy(o)
                     if s.prefix != "":
                         no.filename = s.prefix + "_" + no.filename
-                    no.bind(s)
+                    no.bind(s, self.writer)
                     self.outputs.append(no)
                     isys += 1
 
-        self.chk = eoutputs.CheckpointOutput("RESTART", 1, True, 0)
+        # the soft-exit restart is binary if any of the checkpoints is
+        binary = any([o.binary for o in self.outputs if type(o) is eoutputs.CheckpointOutput])
+        self.chk = eoutputs.CheckpointOutput("RESTART", 1, True, 0, binary=binary)
         self.chk.bind(self)
 
         if not self.smotion is None:
             self.smotion.bind(self.syslist, self.prng)
 
+        if self.freeze_depend:
+            # all the objects are bound, so the tainting can use precomputed closures
+            dfreeze(self)
+
     def softexit(self):
         """Deals with a soft exit request.
 
@@ -199,6 +331,8 @@ class Simulation(dobject):
 
         if self.step < self.tsteps:
             self.step += 1
+        if self.chk is None:
+            return  # this process does not hold a restartable state
         if not self.rollback:
             info("SOFTEXIT: Saving the latest status at the end of the step")
             self.chk.store()
@@ -213,6 +347,11 @@ class Simulation(dobject):
         in the communication between the driver and the PIMD code.
         """
 
+        # the systems may be run by worker processes, and then this one
+        # only coordinates them
+        if self.smotion is not None and self.smotion.spawn(self):
+            return
+
         # registers the softexit routine
         softexit.register_function(self.softexit)
         softexit.start(self.ttime)
@@ -220,6 +359,14 @@ class Simulation(dobject):
         for k, f in self.fflist.iteritems():
             f.run()
 
+        if self.writer is not None:
+            self.writer.start()
+
+        # persistent threads to step the systems in parallel
+        if self.threading:
+            stepper = StepWorkers(self.syslist)
+            softexit.register_function(stepper.stop)
+
         # prints inital configuration -- only if we are not restarting
         if self.step == 0:
             self.step = -1
@@ -260,22 +407,12 @@ class Simulation(dobject):
             if softexit.triggered:
                 break
 
-            self.chk.store()
+            if self.chk is not None:
+                self.chk.store()
 
             if self.threading:
-                stepthreads = []
-                # steps through all the systems
-                for s in self.syslist:
-                    # creates separate threads for the different systems
-                    st = threading.Thread(target=s.motion.step, name=s.prefix, kwargs={"step": self.step})
-                    st.daemon = True
-                    st.start()
-                    stepthreads.append(st)
-
-                for st in stepthreads:
-                    while st.isAlive():
-                        # This is necessary as join() without timeout prevents main from receiving signals.
-                        st.join(2.0)
+                # steps through all the systems in parallel
+                stepper.step(self.step)
             else:
                 for s in self.syslist:
                     s.motion.step(step=self.step)
@@ -293,9 +430,11 @@ class Simulation(dobject):
                 # Don't write if we are about to exit.
                 break
 
+            # only the outputs whose stride is due compute anything
+            dueoutputs = [o for o in self.outputs if o.due()]
             if self.threading:
                 stepthreads = []
-                for o in self.outputs:
+                for o in dueoutputs:
                     st = threading.Thread(target=o.write, name=o.filename)
                     st.daemon = True
                     st.start()
@@ -306,7 +445,7 @@ class Simulation(dobject):
                         # This is necessary as join() without timeout prevents main from receiving signals.
                         st.join(2.0)
             else:
-                for o in self.outputs:
+                for o in dueoutputs:
                     o.write()
 
             steptime += time.time()
@@ -315,6 +454,10 @@ class Simulation(dobject):
 
             if (verbosity.high or (verbosity.medium and self.step % 100 == 0) or (verbosity.low and self.step % 1000 == 0)):
                 info(" # Average timings at MD step % 7d. t/step: %10.5e" % (self.step, ttot / cstep))
+                if self.threading and len(self.syslist) > 1:
+                    info(" # Average wait at the step barrier per system: " +
+                         " ".join(["%10.5e" % (t / stepper.nsteps) for t in stepper.twait]))
+                    stepper.reset_timings()
                 cstep = 0
                 ttot = 0.0
                 # info(" # MD diagnostics: V: %10.5e    Kcv: %10.5e   Ecns: %10.5e" %
@@ -328,4 +471,17 @@ class Simulation(dobject):
                 info(" # Wall clock time expired! Bye bye!", verbosity.low)
                 break
 
+        if self.threading:
+            stepper.stop()
+
+        if verbosity.high:
+            for s in self.syslist:
+                info(" # Property evaluations %s(calls, memo hits, total time):" % (s.prefix and "of system " + s.prefix + " "))
+                for name, ncalls, nhits, elapsed in s.properties.profile_summary():
+                    info(" #   %-40s %8d %8d %12.5e" % (name, ncalls, nhits, elapsed))
+
+        # makes sure that all the outputs have reached the disk
+        if self.writer is not None:
+            self.writer.drain()
+
         self.rollback = False
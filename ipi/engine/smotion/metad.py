@@ -22,7 +22,8 @@ __all__ = ['MetaDyn']
 
 
 class MetaDyn(Smotion):
-    """Metadynamics routine based on a FFPlumed forcefield.
+    """Metadynamics routine based on a forcefield that exposes mtd_update,
+    such as FFPlumed or FFGridMetaD.
 
     Attributes:
 
@@ -45,7 +46,6 @@ class MetaDyn(Smotion):
         """Updates metad bias."""
 
         for s in self.syslist:
-            oldf = dstrip(s.forces.f).copy()
             for k, f in s.ensemble.bias.ff.iteritems():
                 if not k == self.metaff:
                     continue  # only does metad for the indicated forcefield
@@ -53,7 +53,8 @@ class MetaDyn(Smotion):
                     raise ValueError("The forcefield associated with metadynamics does not have a mtd_update interface")
                 fmtd = f.mtd_update(pos=s.beads.qc, cell=s.cell.h)
                 if fmtd:  # if metadyn has updated, then we must recompute forces.
-                    # hacky but cannot think of a better way: we must manually taint *just* that component
+                    # hacky but cannot think of a better way: we must manually taint *just* that component,
+                    # so the physical forces are not computed again
                     for fc in s.ensemble.bias.mforces:
                         if fc.ffield == k:
                             for fb in fc._forces:
@@ -1,6 +1,12 @@
 """Holds the algorithms to perform replica exchange.
 
 Algorithms implemented by Robert Meissner and Riccardo Petraglia, 2016
+
+The replicas can also be distributed over several worker processes, which
+are forked once the simulation has been set up. Each worker runs a block of
+consecutive systems with its own copy of the forcefields, and a coordinator
+in the parent process decides the exchanges from the energies and the
+temperatures that the workers send at every step.
 """
 
 # This file is part of i-PI.
@@ -8,19 +14,56 @@ Algorithms implemented by Robert Meissner and Riccardo Petraglia, 2016
 # See the "licenses" directory for full license information.
 
 
+import sys
+import signal
+import threading
+import multiprocessing
+
 import numpy as np
 import time
 
 from ipi.engine.smotion import Smotion
 from ipi.engine.ensembles import ensemble_swap
+from ipi.engine.outputs import CheckpointOutput
 from ipi.utils.depend import *
 from ipi.utils.softexit import softexit
 from ipi.utils.messages import verbosity, info
+from ipi.utils.units import Constants
 
 
 __all__ = ['ReplicaExchange']
 
 
+def exchange_probabilities(temp, lpens, upot, wspring, nbeads, rescalekin, pi, pj):
+    """Returns the probabilities of exchanging the temperatures of the
+    replicas pi and pj.
+
+    The log-probability of a replica is -(U + K + W)/(kb T nbeads), where U
+    holds the potential terms, which do not depend on the temperature,
+    K the kinetic terms, which are scaled as T by the rescaling of the
+    momenta, and W the ring-polymer springs, which are scaled as T^2.
+
+    Args:
+        temp: temperatures of all the replicas
+        lpens: log-probabilities of all the replicas in their ensembles
+        upot: potential terms of all the replicas
+        wspring: ring-polymer spring terms of all the replicas
+        nbeads: number of beads of the replicas
+        rescalekin: whether the momenta are rescaled upon exchange
+        pi, pj: the replicas of the pairs to be exchanged
+    """
+
+    kin = -lpens * Constants.kb * temp * nbeads - upot - wspring
+
+    def swapped(a, b):
+        # log-probability of the replica a in the ensemble of the replica b
+        tr = temp[b] / temp[a]
+        ka = kin[a] * tr if rescalekin else kin[a]
+        return -(upot[a] + ka + wspring[a] * tr ** 2) / (Constants.kb * temp[b] * nbeads)
+
+    return np.exp(np.minimum(swapped(pi, pj) + swapped(pj, pi) - lpens[pi] - lpens[pj], 0.0))
+
+
 # TODO: Do not shout :-)
 #       (1) Exchange of Hamiltonians is missing
 
@@ -33,9 +76,11 @@ class ReplicaExchange(Smotion):
             temperature: activate temperature replica exchange
             hamiltonian: activate hamiltonian replica exchange
             bias: activate hamiltonian replica exchange ***not yet implemented
+        workers: number of processes the systems are distributed over
+        conn: in a worker process, the connection to the coordinator
     """
 
-    def __init__(self, stride=1.0, repindex=None, krescale=True, swapfile="PARATEMP"):
+    def __init__(self, stride=1.0, repindex=None, krescale=True, swapfile="PARATEMP", workers=1):
         """Initialises REMD.
 
         Args:
@@ -55,7 +100,13 @@ class ReplicaExchange(Smotion):
         else:
             self.repindex = np.asarray(repindex, int).copy()
 
+        self.workers = workers
+
         self.mode = 'remd'
+        self.parity = 0
+        self.sf = None
+        self.conn = None
+        self._sendlock = threading.Lock()
 
     def bind(self, syslist, prng):
 
@@ -67,75 +118,360 @@ class ReplicaExchange(Smotion):
             if len(self.syslist) != len(self.repindex):
                 raise ValueError("Size of replica index does not match number of systems replicas")
 
+        # the exchanges are buffered in the open swap file
+        softexit.register_function(self.softexit)
+
+    def pairs(self):
+        """Returns the systems of the neighbouring pairs of ensembles that
+        are tried in this step.
+
+        The ensembles are ordered as in the input, and the pairs start at an
+        even or at an odd ensemble on alternate steps. Each pair is tried
+        with probability 1/stride.
+        """
+
+        nrep = len(self.repindex)
+
+        # the system that currently holds each of the ensembles
+        holder = np.argsort(self.repindex)
+        first = np.arange(self.parity, nrep - 1, 2)
+        self.parity = 1 - self.parity
+        first = first[self.prng.rng.random_sample(len(first)) < 1.0 / self.stride]
+        return holder[first], holder[first + 1]
+
     def step(self, step=None):
-        """Tries to exchange replica."""
+        """Tries to exchange replicas between neighbouring ensembles."""
 
         if self.stride <= 0.0: return
 
+        if self.conn is not None:
+            self.step_worker(step)
+            return
+
         info("\nTrying to exchange replicas on STEP %d" % step, verbosity.debug)
 
-        fxc = False
+        pi, pj = self.pairs()
+        if len(pi) == 0: return
+
         sl = self.syslist
-        for i in range(len(sl)):
-            for j in range(i):
-                if (1.0 / self.stride < self.prng.u): continue  # tries a swap with probability 1/stride
+        fast = self.temperature_only()
+        if fast:
+            temp, lpens, upot, wspring = self.energies()
+            pxc = exchange_probabilities(temp, lpens, upot, wspring, sl[0].beads.nbeads, self.rescalekin, pi, pj)
+            accept = self.prng.rng.random_sample(len(pi)) < pxc
+        else:
+            accept = np.asarray([self.try_swap(i, j) for i, j in zip(pi, pj)], bool)
+
+        for i, j, acc in zip(pi, pj, accept):
+            if acc and fast:
                 ti = sl[i].ensemble.temp
                 tj = sl[j].ensemble.temp
-                eci = sl[i].ensemble.econs
-                ecj = sl[j].ensemble.econs
-                pensi = sl[i].ensemble.lpens
-                pensj = sl[j].ensemble.lpens
-
-                ensemble_swap(sl[i].ensemble, sl[j].ensemble)  # tries to swap the ensembles!
-
-                # it is generally a good idea to rescale the kinetic energies,
-                # which means that the exchange is done only relative to the potential energy part.
-                if self.rescalekin:
-                    # also rescales the velocities -- should do the same with cell velocities
-                    sl[i].beads.p *= np.sqrt(tj / ti)
-                    sl[j].beads.p *= np.sqrt(ti / tj)
-                    try:  # if motion has a barostat, and barostat has a momentum, does the swap
-                        # also note that the barostat has a hidden T dependence inside the mass, so
-                        # as a matter of fact <p^2> \propto T^2
-                        sl[i].motion.barostat.p *= (tj / ti)
-                        sl[j].motion.barostat.p *= (ti / tj)
-                    except AttributeError:
-                        pass
-
-                newpensi = sl[i].ensemble.lpens
-                newpensj = sl[j].ensemble.lpens
-
-                pxc = np.exp((newpensi + newpensj) - (pensi + pensj))
-
-                if (pxc > self.prng.u):  # really does the exchange
-                    info(" @ PT:  SWAPPING replicas % 5d and % 5d." % (i, j), verbosity.low)
-                    # we just have to carry on with the swapped ensembles, but we also keep track of the changes in econs
-                    sl[i].ensemble.eens += eci - sl[i].ensemble.econs
-                    sl[j].ensemble.eens += ecj - sl[j].ensemble.econs
-                    self.repindex[i], self.repindex[j] = self.repindex[j], self.repindex[i]  # keeps track of the swap
-
-                    fxc = True  # signal that an exchange has been made!
-                else:  # undoes the swap
-                    ensemble_swap(sl[i].ensemble, sl[j].ensemble)
-
-                    if self.rescalekin:
-                        sl[i].beads.p *= np.sqrt(ti / tj)
-                        sl[j].beads.p *= np.sqrt(tj / ti)
-                        try:
-                            sl[i].motion.barostat.p *= (ti / tj)
-                            sl[j].motion.barostat.p *= (tj / ti)
-                        except AttributeError:
-                            pass
-                    info(" @ PT:  SWAP REJECTED BETWEEN replicas % 5d and % 5d." % (i, j), verbosity.low)
-
-                   #tempi = copy(self.syslist[i].ensemble.temp)
-
-                   #self.syslist[i].ensemble.temp = copy(self.syslist[j].ensemble.temp)
-                   # velocities have to be adjusted according to the new temperature
-
-        if fxc:  # writes out the new status
-            with open(self.swapfile, "a") as sf:
-                sf.write("% 10d" % (step))
-                for i in self.repindex:
-                    sf.write(" % 5d" % (i))
-                sf.write("\n")
+                self.retemper(sl[i], tj)
+                self.retemper(sl[j], ti)
+        self.record(step, pi, pj, accept)
+
+    def record(self, step, pi, pj, accept):
+        """Keeps track of the exchanges, and writes out the new status."""
+
+        for i, j, acc in zip(pi, pj, accept):
+            if acc:
+                info(" @ PT:  SWAPPING replicas % 5d and % 5d." % (i, j), verbosity.low)
+                self.repindex[i], self.repindex[j] = self.repindex[j], self.repindex[i]  # keeps track of the swap
+            else:
+                info(" @ PT:  SWAP REJECTED BETWEEN replicas % 5d and % 5d." % (i, j), verbosity.low)
+
+        if accept.any():
+            if self.sf is None:
+                self.sf = open(self.swapfile, "a")
+            self.sf.write("% 10d" % (step) + "".join([" % 5d" % (i) for i in self.repindex]) + "\n")
+
+    def temperature_only(self):
+        """Returns True if the ensembles differ only by their temperature, and
+        the potential energy terms do not depend on it, so that the exchange
+        probabilities can be computed without swapping the ensembles."""
+
+        e0 = self.syslist[0].ensemble
+        for s in self.syslist:
+            ens = s.ensemble
+            if ens.pext != e0.pext or ens.beads.nbeads != e0.beads.nbeads:
+                return False
+            if not np.array_equal(dstrip(ens.stressext), dstrip(e0.stressext)):
+                return False
+            # the dynamical masses of the normal modes depend on the
+            # temperature, except in RPMD, and so does the kinetic energy
+            if ens.beads.nbeads > 1 and s.nm.mode != "rpmd":
+                return False
+            if not (np.array_equal(ens.bweights, e0.bweights) and np.array_equal(ens.hweights, e0.hweights)):
+                return False
+            # the Suzuki-Chin correction depends on the temperature
+            if any(p is dd(ens.forces).potsc for p in ens._xlpot):
+                return False
+            # the mass of the barostat does too
+            if not self.rescalekin and len(ens._xlkin) > 0:
+                return False
+        return True
+
+    def energies(self):
+        """Returns the temperatures, the log-probabilities, the potential
+        terms and the ring-polymer spring terms of the systems."""
+
+        ens = [s.ensemble for s in self.syslist]
+        temp = np.asarray([e.temp for e in ens])
+        lpens = np.asarray([e.lpens for e in ens])
+        upot = np.asarray([e.forces.pot + e.bias.pot + sum([p.get() for p in e._xlpot]) for e in ens])
+        wspring = np.asarray([e.beads.vpath * e.nm.omegan2 for e in ens])
+        return temp, lpens, upot, wspring
+
+    def retemper(self, s, temp):
+        """Moves the system s to the temperature temp, rescaling its momenta
+        if required, and keeps track of the change of the conserved
+        quantity."""
+
+        ti = s.ensemble.temp
+        eci = s.ensemble.econs
+        s.ensemble.temp = temp
+
+        # it is generally a good idea to rescale the kinetic energies,
+        # which means that the exchange is done only relative to the potential energy part.
+        if self.rescalekin:
+            self.rescale(s, temp / ti)
+
+        # we just have to carry on with the new ensemble, but we also keep track of the changes in econs
+        s.ensemble.eens += eci - s.ensemble.econs
+
+    def rescale(self, s, ratio):
+        """Scales the momenta of the system s by sqrt(ratio)."""
+
+        # also rescales the velocities -- should do the same with cell velocities
+        s.beads.p *= np.sqrt(ratio)
+        try:  # if motion has a barostat, and barostat has a momentum, does the swap
+            # also note that the barostat has a hidden T dependence inside the mass, so
+            # as a matter of fact <p^2> \propto T^2
+            s.motion.barostat.p *= ratio
+        except AttributeError:
+            pass
+
+    def try_swap(self, i, j):
+        """Tries to exchange the ensembles of the systems i and j by
+        swapping them and computing the new energies, for the ensembles
+        whose exchange probability cannot be computed in advance.
+
+        Returns:
+            True if the exchange has been accepted.
+        """
+
+        sl = self.syslist
+        eci = sl[i].ensemble.econs
+        ecj = sl[j].ensemble.econs
+        pensi = sl[i].ensemble.lpens
+        pensj = sl[j].ensemble.lpens
+
+        self.swap_ensembles(i, j)  # tries to swap the ensembles!
+
+        newpensi = sl[i].ensemble.lpens
+        newpensj = sl[j].ensemble.lpens
+
+        pxc = np.exp((newpensi + newpensj) - (pensi + pensj))
+
+        if (pxc > self.prng.u):  # really does the exchange
+            sl[i].ensemble.eens += eci - sl[i].ensemble.econs
+            sl[j].ensemble.eens += ecj - sl[j].ensemble.econs
+            return True
+
+        # undoes the swap
+        self.swap_ensembles(i, j)
+        return False
+
+    def swap_ensembles(self, i, j):
+        """Swaps the ensembles of the systems i and j, and rescales their
+        momenta if required. Calling it twice restores the systems."""
+
+        sl = self.syslist
+        ti = sl[i].ensemble.temp
+        tj = sl[j].ensemble.temp
+        ensemble_swap(sl[i].ensemble, sl[j].ensemble)
+        if self.rescalekin:
+            self.rescale(sl[i], tj / ti)
+            self.rescale(sl[j], ti / tj)
+
+    def spawn(self, simul):
+        """Runs the systems in worker processes, and coordinates the
+        exchanges between them from this process.
+
+        Each worker runs a block of consecutive systems. The forcefield
+        sockets of worker k listen at the address with "_k" appended in
+        unix mode, and at the port plus k in inet mode. No checkpoint can
+        be written, as none of the processes holds the whole state of the
+        run, so such runs cannot be restarted.
+
+        Returns:
+            False if the systems are to be run by this process.
+        """
+
+        if self.workers <= 1 or self.conn is not None:
+            return False
+
+        nrep = len(self.syslist)
+        if self.workers > nrep:
+            raise ValueError("There are more replica exchange workers than systems")
+        if not self.temperature_only():
+            raise ValueError("Replicas can only be distributed over processes if their ensembles differ only by their temperature")
+        # each worker only holds some of the systems, and the coordinator
+        # the exchange state, so no process could write a checkpoint that
+        # restarts the whole run
+        if any([type(o) is CheckpointOutput for o in simul.outputs]):
+            raise ValueError("Checkpoints cannot be written when the replicas are distributed over processes. Remove the checkpoint outputs, or run with a single replica exchange worker.")
+
+        blocks = np.array_split(np.arange(nrep), self.workers)
+        # independent random streams for the workers, which all start from
+        # the same generator. the coordinator keeps the original one
+        seeds = self.prng.rng.randint(1, 2 ** 31 - 1, size=self.workers)
+
+        # the outputs must be flushed, or the forked processes would write
+        # out the same buffered text again
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for o in simul.outputs:
+            out = getattr(o, "out", None)
+            for f in (out if isinstance(out, list) else [out]):
+                if f is not None:
+                    f.flush()
+
+        conns = []
+        procs = []
+        for k in range(self.workers):
+            mine, theirs = multiprocessing.Pipe()
+            p = multiprocessing.Process(target=self.run_worker, name="remd%d" % k,
+                                        args=(simul, k, blocks[k], seeds[k], theirs))
+            p.start()
+            theirs.close()
+            conns.append(mine)
+            procs.append(p)
+
+        # the workers receive the interrupts from the terminal on their own,
+        # and the termination requests are passed on to them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda sig, frame: [p.terminate() for p in procs])
+
+        info(" @ PT:  Running %d replicas in %d worker processes" % (nrep, self.workers), verbosity.low)
+        self.coordinate(conns, blocks)
+
+        for p in procs:
+            p.join()
+        if self.sf is not None:
+            self.sf.close()
+            self.sf = None
+        failed = [p.name for p in procs if p.exitcode != 0]
+        if len(failed) > 0:
+            raise RuntimeError("Replica exchange workers " + ", ".join(failed) + " did not exit cleanly")
+        return True
+
+    def run_worker(self, simul, k, block, seed, conn):
+        """Runs the systems in block in a worker process.
+
+        Args:
+            simul: the simulation, as set up in the parent process
+            k: the index of the worker
+            block: the indices of the systems of the worker
+            seed: the seed of the random numbers of the worker
+            conn: the connection to the coordinator
+        """
+
+        simul.prng.rng.seed(seed)
+
+        systems = [simul.syslist[i] for i in block]
+        simul.syslist = systems
+        simul.outputs = [o for o in simul.outputs if o.system in systems]
+        # the state of a worker alone cannot restart the run
+        simul.chk = None
+
+        for ff in simul.fflist.values():
+            interface = getattr(ff, "socket", None)
+            if interface is not None:
+                if interface.mode == "unix":
+                    interface.address = "%s_%d" % (interface.address, k)
+                else:
+                    interface.port += k
+
+        self.syslist = systems
+        self.conn = conn
+        try:
+            simul.run()
+            softexit.trigger(" @ SIMULATION: Exiting cleanly.")
+        except SystemExit:
+            # the soft exit is the normal way out, and tells the
+            # coordinator that the worker has not failed
+            sys.exit(0)
+
+    def step_worker(self, step):
+        """Sends the energies of the systems of this worker to the
+        coordinator, and moves them to the temperatures it assigns."""
+
+        if softexit.triggered: return
+
+        with self._sendlock:
+            self.conn.send(("energies", step, np.asarray(self.energies())))
+        msg = self.conn.recv()
+        if msg[0] == "stop":
+            softexit.trigger(" @ PT: Another replica exchange worker has stopped")
+
+        newtemp, self.repindex = msg[1], msg[2]
+        for s, t in zip(self.syslist, newtemp):
+            if t != s.ensemble.temp:
+                self.retemper(s, t)
+
+    def coordinate(self, conns, blocks):
+        """Decides the exchanges between the replicas of the workers, until
+        one of them stops.
+
+        Args:
+            conns: the connections to the workers
+            blocks: the indices of the systems of each worker
+        """
+
+        nbeads = self.syslist[0].beads.nbeads
+        while True:
+            msgs = []
+            for c in conns:
+                try:
+                    msgs.append(c.recv())
+                except EOFError:
+                    msgs.append(("exit",))
+            if any([m[0] == "exit" for m in msgs]):
+                break
+
+            step = msgs[0][1]
+            temp, lpens, upot, wspring = np.hstack([m[2] for m in msgs])
+
+            pi, pj = self.pairs()
+            pxc = exchange_probabilities(temp, lpens, upot, wspring, nbeads, self.rescalekin, pi, pj)
+            accept = self.prng.rng.random_sample(len(pi)) < pxc
+            newtemp = temp.copy()
+            newtemp[pi[accept]] = temp[pj[accept]]
+            newtemp[pj[accept]] = temp[pi[accept]]
+            self.record(step, pi, pj, accept)
+
+            for c, b in zip(conns, blocks):
+                c.send(("temps", newtemp[b], self.repindex))
+
+        # a worker that has stopped while another one was waiting for the
+        # exchanges stops all of them
+        for c in conns:
+            try:
+                c.send(("stop",))
+            except IOError:
+                pass
+
+    def softexit(self):
+        """Makes sure that the exchanges have reached the disk, and tells the
+        coordinator that this worker has stopped."""
+
+        if self.sf is not None:
+            self.sf.close()
+            self.sf = None
+        if self.conn is not None:
+            with self._sendlock:
+                try:
+                    self.conn.send(("exit",))
+                except IOError:
+                    pass
@@ -58,3 +58,13 @@ class Smotion(dobject):
         """Dummy simulation time step which does nothing."""
 
         pass
+
+    def spawn(self, simul):
+        """Runs the systems of the simulation in other processes, and returns
+        True once they are done. The default is to run them in this process.
+
+        Args:
+            simul: The simulation, bound but not yet started.
+        """
+
+        return False
@@ -201,12 +201,17 @@ class ThermoPILE_L(Thermostat):
 
     """Represents a PILE thermostat with a local centroid thermostat.
 
+    The Langevin equations for all the ring polymer normal modes are
+    integrated at once, using arrays of per-mode drift and noise coefficients,
+    so that a single step touches the normal mode momenta only once.
+
     Attributes:
-       _thermos: The list of the different thermostats for all the ring polymer
-          normal modes.
        nm: A normal modes object to attach the thermostat to.
        prng: Random number generator used in the stochastic integration
           algorithms.
+       _k0: The index of the first normal mode that is thermostatted with a
+          white noise Langevin equation. This is 0 if the centroid is also
+          thermostatted locally, and 1 otherwise.
 
     Depend objects:
        tau: Centroid thermostat damping time scale. Larger values give a
@@ -216,6 +221,10 @@ class ThermoPILE_L(Thermostat):
           temperature.
        pilescale: A float used to reduce the intensity of the PILE thermostat if
           required.
+       T: An array with the coefficient of the diffusive contribution of the
+          thermostat for each normal mode. Depends on tau, tauk and the time step.
+       S: An array with the coefficient of the stochastic contribution of the
+          thermostat for each normal mode. Depends on T and the temperature.
     """
 
     def __init__(self, temp=1.0, dt=1.0, tau=1.0, ethermo=0.0, scale=1.0):
@@ -278,61 +287,27 @@ class ThermoPILE_L(Thermostat):
         else:
             self.prng = prng
 
-        prev_ethermo = self.ethermo
-
-        # creates a set of thermostats to be applied to individual normal modes
-        self._thermos = [ThermoLangevin(temp=1, dt=1, tau=1) for b in range(nm.nbeads)]
-        # optionally does not bind the centroid, so we can re-use all of this
+        self.nm = nm
+        # optionally leaves the centroid alone, so we can re-use all of this
         # in the PILE_G case
-        if not bindcentroid:
-            self._thermos[0] = None
+        self._k0 = 0 if bindcentroid else 1
 
-        self.nm = nm
+        # binds directly to the whole set of normal mode momenta
+        dself.p = dd(nm).pnm
+        dself.m = dd(nm).dynm3
+        if fixdof is None:
+            self.ndof = self.p.size
+        else:
+            self.ndof = float(self.p.size - fixdof)
+        dself.sm = depend_array(name="sm", value=np.zeros(self.m.shape),
+                                func=self.get_sm, dependencies=[dself.m])
 
         dself.tauk = depend_array(name="tauk", value=np.zeros(nm.nbeads - 1, float),
                                   func=self.get_tauk, dependencies=[dself.pilescale, dd(nm).dynomegak])
-
-        # must pipe all the dependencies in such a way that values for the nm thermostats
-        # are automatically updated based on the "master" thermostat
-        def make_taugetter(k):
-            return lambda: self.tauk[k - 1]
-        it = 0
-        nm.pnm.hold()
-        for t in self._thermos:
-            if t is None:
-                it += 1
-                continue
-            if it > 0:
-                fixdof = None  # only the centroid thermostat may have constraints
-
-            # bind thermostat t to the it-th bead
-
-            t.bind(pm=(nm.pnm[it, :], nm.dynm3[it, :]), prng=self.prng, fixdof=fixdof)
-            # pipes temp and dt
-            dpipe(dself.temp, dd(t).temp)
-            dpipe(dself.dt, dd(t).dt)
-
-            # for tau it is slightly more complex
-            if it == 0:
-                dpipe(dself.tau, dd(t).tau)
-            else:
-                # Here we manually connect _thermos[i].tau to tauk[i].
-                # Simple and clear.
-                dd(t).tau.add_dependency(dself.tauk)
-                dd(t).tau._func = make_taugetter(it)
-            dself.ethermo.add_dependency(dd(t).ethermo)
-            dself.ethermo.hold()  # will manually update ethermo when needed!
-            it += 1
-
-        # since the ethermo will be "delegated" to the normal modes thermostats,
-        # one has to split
-        # any previously-stored value between the sub-thermostats
-        if bindcentroid:
-            for t in self._thermos:
-                t.ethermo = prev_ethermo / nm.nbeads
-            dself.ethermo._func = self.get_ethermo;
-            # if we are not binding the centroid just yet, this bit of the piping
-            # is delegated to the function which is actually calling this
+        dself.T = depend_array(name="T", value=np.zeros(nm.nbeads, float),
+                               func=self.get_T, dependencies=[dself.tau, dself.tauk, dself.dt])
+        dself.S = depend_array(name="S", value=np.zeros(nm.nbeads, float),
+                               func=self.get_S, dependencies=[dself.temp, dself.T])
 
     def get_tauk(self):
         """Computes the thermostat damping time scale for the non-centroid
@@ -343,27 +318,43 @@ class ThermoPILE_L(Thermostat):
         """
 
         # Also include an optional scaling factor to reduce the intensity of NM thermostats
-        return np.array([1.0 / (2 * self.pilescale * self.nm.dynomegak[k]) for k in range(1, len(self._thermos))])
+        return 1.0 / (2 * self.pilescale * dstrip(self.nm.dynomegak)[1:])
 
-    def get_ethermo(self):
-        """Computes the total energy transferred to the heat bath for all the
-        thermostats.
-        """
+    def get_T(self):
+        """Calculates the coefficient of the overall drift of the velocities
+        for each normal mode."""
 
-        et = 0.0;
-        for t in self._thermos:
-            et += t.ethermo
-        return et
+        tau = np.zeros(self.nm.nbeads, float)
+        tau[0] = self.tau
+        tau[1:] = dstrip(self.tauk)
+        return np.exp(-0.5 * self.dt / tau)
+
+    def get_S(self):
+        """Calculates the coefficient of the white noise for each normal mode."""
+
+        return np.sqrt(Constants.kb * self.temp * (1 - dstrip(self.T)**2))
 
     def step(self):
         """Updates the bound momentum vector with a PILE thermostat."""
 
-        self.nm.pnm.hold()
-        # super-cool! just loop over the thermostats! it's as easy as that!
-        for t in self._thermos:
-            t.step()
-        self.nm.pnm.resume()
-        dd(self).ethermo.resume()
+        k0 = self._k0
+        p = dstrip(self.p).copy()
+        sm = dstrip(self.sm)
+
+        p /= sm
+
+        # the modes are stored contiguously, so the random numbers are
+        # drawn in the same order as a mode-by-mode integration would
+        pk = p[k0:]
+        et = np.dot(pk.ravel(), pk.ravel()) * 0.5
+        pk *= dstrip(self.T)[k0:, np.newaxis]
+        pk += dstrip(self.S)[k0:, np.newaxis] * self.prng.gvec(pk.shape)
+        et -= np.dot(pk.ravel(), pk.ravel()) * 0.5
+
+        p *= sm
+
+        self.p = p
+        self.ethermo += et
 
 
 class ThermoSVR(Thermostat):
@@ -442,6 +433,10 @@ class ThermoPILE_G(ThermoPILE_L):
 
     Simply replaces the Langevin thermostat for the centroid normal mode with
     a global velocity rescaling thermostat.
+
+    Attributes:
+       _thermo_c: The stochastic velocity rescaling thermostat attached to the
+          centroid normal mode.
     """
 
     def __init__(self, temp=1.0, dt=1.0, tau=1.0, ethermo=0.0, scale=1.0):
@@ -483,25 +478,30 @@ class ThermoPILE_G(ThermoPILE_L):
 
         """
 
-        # first binds as a local PILE, then substitutes the thermostat on the centroid
-        prev_ethermo = self.ethermo
+        # first binds as a local PILE without the centroid, then adds the
+        # global thermostat on the centroid
         super(ThermoPILE_G, self).bind(nm=nm, prng=prng, bindcentroid=False, fixdof=fixdof)
         dself = dd(self)
 
         # centroid thermostat
-        self._thermos[0] = ThermoSVR(temp=1, dt=1, tau=1)
+        self._thermo_c = ThermoSVR(temp=1, dt=1, tau=1)
 
-        t = self._thermos[0]
+        t = self._thermo_c
         t.bind(pm=(nm.pnm[0, :], nm.dynm3[0, :]), prng=self.prng, fixdof=fixdof)
         dpipe(dself.temp, dd(t).temp)
         dpipe(dself.dt, dd(t).dt)
         dpipe(dself.tau, dd(t).tau)
-        dself.ethermo.add_dependency(dd(t).ethermo)
 
-        # splits any previous ethermo between the thermostats, and finishes to bind ethermo to the sum function
-        for t in self._thermos:
-            t.ethermo = prev_ethermo / nm.nbeads
-        dself.ethermo._func = self.get_ethermo;
+    def step(self):
+        """Updates the bound momentum vector with a PILE thermostat."""
+
+        # the centroid goes first, and its heat is collected in the total
+        t = self._thermo_c
+        t.step()
+        self.ethermo += t.ethermo
+        t.ethermo = 0.0
+
+        super(ThermoPILE_G, self).step()
 
 
 class ThermoGLE(Thermostat):
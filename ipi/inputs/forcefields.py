@@ -8,14 +8,14 @@
 from copy import copy
 import numpy as np
 
-from ipi.engine.forcefields import ForceField, FFSocket, FFLennardJones, FFPES2014, FFDebye, FFPlumed, FFYaff
+from ipi.engine.forcefields import ForceField, FFSocket, FFLennardJones, FFPES2014, FFDebye, FFPlumed, FFYaff, FFGridMetaD
 from ipi.interfaces.sockets import InterfaceSocket
 import ipi.engine.initializer
 from ipi.inputs.initializer import *
 from ipi.utils.inputvalue import *
 
 
-__all__ = ["InputFFSocket", 'InputFFLennardJones', 'InputFFPES2014', 'InputFFDebye', 'InputFFPlumed', 'InputFFYaff']
+__all__ = ["InputFFSocket", 'InputFFLennardJones', 'InputFFPES2014', 'InputFFDebye', 'InputFFPlumed', 'InputFFYaff', 'InputFFGridMetaD']
 
 
 class InputForceField(Input):
@@ -344,3 +344,51 @@ class InputFFYaff(InputForceField):
         super(InputFFYaff, self).fetch()
 
         return FFYaff(yaffpara=self.yaffpara.fetch(), yaffsys=self.yaffsys.fetch(), yafflog=self.yafflog.fetch(), rcut=self.rcut.fetch(), alpha_scale=self.alpha_scale.fetch(), gcut_scale=self.gcut_scale.fetch(), skin=self.skin.fetch(), smooth_ei=self.smooth_ei.fetch(), reci_ei=self.reci_ei.fetch(), name=self.name.fetch(), latency=self.latency.fetch(), dopbc=self.pbc.fetch())
+
+
+class InputFFGridMetaD(InputForceField):
+
+    fields = {
+        "ghts_input": (InputValue, {"dtype": str, "default": "ghts.json", "help": "The ghts state file with the definition of the collective variables."}),
+        "coordinate": (InputValue, {"dtype": str, "default": "cv", "options": ["cv", "sigma"],
+                                    "help": "The coordinates that are biased: 'cv' for the collective variables of the ghts state file, 'sigma' for the distance from the ghts dividing surface of the state file, in the units of the ghts output."}),
+        "grid_min": (InputArray, {"dtype": float, "default": input_default(factory=np.zeros, args=(0,)), "help": "The lowest value of the grid along each dimension."}),
+        "grid_max": (InputArray, {"dtype": float, "default": input_default(factory=np.zeros, args=(0,)), "help": "The highest value of the grid along each dimension."}),
+        "grid_bins": (InputArray, {"dtype": int, "default": input_default(factory=np.zeros, args=(0,), kwargs={"dtype": int}), "help": "The number of nodes of the grid along each dimension."}),
+        "height": (InputValue, {"dtype": float, "default": 0.0, "dimension": "energy", "help": "The height of the Gaussians."}),
+        "width": (InputArray, {"dtype": float, "default": input_default(factory=np.zeros, args=(0,)), "help": "The widths of the Gaussians along each dimension."}),
+        "pace": (InputValue, {"dtype": int, "default": 1, "help": "The number of steps between the deposition of two Gaussians."}),
+        "grid": (InputArray, {"dtype": float, "default": input_default(factory=np.zeros, args=(0,)), "dimension": "energy", "help": "The bias at the nodes of the grid."}),
+        "mtdstep": (InputValue, {"dtype": int, "default": 0, "help": "The current step counter for the deposition of the Gaussians."}),
+    }
+
+    fields.update(InputForceField.fields)
+
+    attribs = {}
+    attribs.update(InputForceField.attribs)
+
+    default_help = """Metadynamics bias on the collective variables of ghts, kept on a grid. The Gaussians are deposited by a 'metad' smotion that refers to this forcefield."""
+    default_label = "FFGRIDMETAD"
+
+    def store(self, ff):
+        super(InputFFGridMetaD, self).store(ff)
+        self.ghts_input.store(ff.ghts_input)
+        self.coordinate.store(ff.coordinate)
+        self.grid_min.store(ff.grid_min)
+        self.grid_max.store(ff.grid_max)
+        self.grid_bins.store(ff.grid_bins)
+        self.height.store(ff.height)
+        self.width.store(ff.width)
+        self.pace.store(ff.pace)
+        self.grid.store(ff.grid)
+        self.mtdstep.store(ff.mtdstep)
+
+    def fetch(self):
+        super(InputFFGridMetaD, self).fetch()
+
+        width = self.width.fetch()
+        return FFGridMetaD(name=self.name.fetch(), latency=self.latency.fetch(), dopbc=self.pbc.fetch(),
+                           ghts_input=self.ghts_input.fetch(), coordinate=self.coordinate.fetch(),
+                           grid_min=self.grid_min.fetch(), grid_max=self.grid_max.fetch(), grid_bins=self.grid_bins.fetch(),
+                           height=self.height.fetch(), width=(width if len(width) > 0 else None),
+                           pace=self.pace.fetch(), grid=self.grid.fetch(), mtdstep=self.mtdstep.fetch())
@@ -127,8 +127,8 @@ class InputInitFile(InputInitBase):
 
     attribs = deepcopy(InputInitBase.attribs)
     attribs["mode"][1]["default"] = "chk"
-    attribs["mode"][1]["options"] = ["xyz", "pdb", "chk"]
-    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'chk' stands for initialization from a checkpoint file."
+    attribs["mode"][1]["options"] = ["xyz", "pdb", "ipibin", "chk"]
+    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'ipibin' stands for the binary trajectory format of i-PI. 'chk' stands for initialization from a checkpoint file."
 
     attribs["bead"] = (InputAttribute, {"dtype": int, "default": -1, "help": "The index of the bead for which the value will be set. If a negative value is specified, then all beads are assumed."})
     attribs["cell_units"] = (InputAttribute, {"dtype": str, "default": "automatic", "help": "The units for the cell dimensions."})
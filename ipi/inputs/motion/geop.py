@@ -47,16 +47,17 @@ class InputGeop(InputDictionary):
                                          "options": ['sd', 'cg', 'bfgs', 'bfgstrm', 'lbfgs']})}
 
     # options of the method (mostly tolerances)
-    fields = {"ls_options": (InputDictionary, {"dtype": [float, int, float, float],
+    fields = {"ls_options": (InputDictionary, {"dtype": [float, int, float, float, int],
                                                "help": """"Options for line search methods. Includes:
                               tolerance: stopping tolerance for the search (as a fraction of the overall energy tolerance),
                               iter: the maximum number of iterations,
                               step: initial step for bracketing,
-                              adaptive: whether to update initial step.
+                              adaptive: whether to update initial step,
+                              npoints: the number of trial steps evaluated at the same time.
                               """,
-                                               "options": ["tolerance", "iter", "step", "adaptive"],
-                                               "default": [1, 100, 1e-3, 1.0],
-                                               "dimension": ["undefined", "undefined", "length", "undefined"]}),
+                                               "options": ["tolerance", "iter", "step", "adaptive", "npoints"],
+                                               "default": [1, 100, 1e-3, 1.0, 1],
+                                               "dimension": ["undefined", "undefined", "length", "undefined", "undefined"]}),
               "tolerances": (InputDictionary, {"dtype": float,
                                                "options": ["energy", "force", "position"],
                                                "default": [1e-7, 1e-4, 1e-3],
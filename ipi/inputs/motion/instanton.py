@@ -86,6 +86,13 @@ class InputInst(InputDictionary):
               "delta": (InputValue, {"dtype": float,
                                      "default": 0.1,
                                      "help": "Initial stretch amplitude."}),
+              "temperatures": (InputArray, {"dtype": float,
+                                            "default": input_default(factory=np.zeros, args=(0,)),
+                                            "dimension": "temperature",
+                                            "help": "Temperatures of an instanton scan. Once the instanton is converged at one temperature, the optimization continues at the next one, starting from the converged geometry and hessian."}),
+              "scan_nbeads": (InputArray, {"dtype": int,
+                                           "default": input_default(factory=np.zeros, args=(0, int)),
+                                           "help": "Number of beads for each of the temperatures of an instanton scan. When it changes, the converged instanton and the hessian are interpolated to the new number of beads. If it is not given, all the temperatures use the number of beads of the system."}),
               # Hessian
               "hessian_init": (InputValue, {"dtype": str,
                                             "default": 'false',
@@ -102,6 +109,9 @@ class InputInst(InputDictionary):
                                            "default": "none",
                                            "options": ["none", "poly", "crystal"],
                                            "help": "Removes the zero frequency vibrational modes depending on the symmerty of the system."}),
+              "hessian_window": (InputValue, {"dtype": int,
+                                              "default": 1,
+                                              "help": "Number of rows of the finite difference hessian that are computed at the same time."}),
               # L-BFGS
               "qlist_lbfgs": (InputArray, {"dtype": float,
                                            "default": input_default(factory=np.zeros, args=(0,)),
@@ -163,7 +173,10 @@ class InputInst(InputDictionary):
         self.alt_out.store(geop.save)
         self.prefix.store(geop.prefix)
         self.delta.store(geop.delta)
+        self.temperatures.store(geop.temperatures)
+        self.scan_nbeads.store(geop.scan_nbeads)
         self.hessian_final.store(geop.hessian_final)
+        self.hessian_window.store(geop.hessian_window)
         self.old_pot.store(geop.old_u)
         self.old_force.store(geop.old_f)
         self.energy_shift.store(geop.energy_shift)
@@ -24,13 +24,14 @@ Classes:
 import numpy as np
 from copy import copy
 import ipi.engine.initializer
-from ipi.engine.motion import Motion, Dynamics, Replay, GeopMotion, NEBMover, DynMatrixMover, MultiMotion, AlchemyMC, InstantonMotion
+from ipi.engine.motion import Motion, Dynamics, Replay, GeopMotion, NEBMover, StringMover, DynMatrixMover, MultiMotion, AlchemyMC, InstantonMotion
 from ipi.utils.inputvalue import *
 from ipi.inputs.thermostats import *
 from ipi.inputs.initializer import *
 from .geop import InputGeop
 from .instanton import InputInst
 from .neb import InputNEB
+from .stringmethod import InputString
 from .dynamics import InputDynamics
 from .phonons import InputDynMatrix
 from .alchemy import InputAlchemy
@@ -57,7 +58,7 @@ class InputMotionBase(Input):
 
     attribs = {"mode": (InputAttribute, {"dtype": str,
                                          "help": "How atoms should be moved at each step in the simulatio. 'replay' means that a simulation is restarted from a previous simulation.",
-                                         "options": ['vibrations', 'minimize', 'replay', 'neb', 'dynamics', 'alchemy', 'instanton', 'dummy']})}
+                                         "options": ['vibrations', 'minimize', 'replay', 'neb', 'string', 'dynamics', 'alchemy', 'instanton', 'dummy']})}
 
     fields = {"fixcom": (InputValue, {"dtype": bool,
                                       "default": True,
@@ -69,10 +70,15 @@ class InputMotionBase(Input):
                                         "help": "Option for geometry optimization"}),
               "neb_optimizer": (InputNEB, {"default": {},
                                            "help": "Option for geometry optimization"}),
+              "string_optimizer": (InputString, {"default": {},
+                                                 "help": "Option for the string method"}),
               "dynamics": (InputDynamics, {"default": {},
                                            "help": "Option for (path integral) molecular dynamics"}),
               "file": (InputInitFile, {"default": input_default(factory=ipi.engine.initializer.InitFile, kwargs={"mode": "xyz"}),
                                        "help": "This describes the location to read a trajectory file from."}),
+              "replay_window": (InputValue, {"dtype": int,
+                                             "default": 1,
+                                             "help": "The number of frames of a replayed trajectory whose forces are requested at once. Values larger than one keep many clients busy, at the cost of a copy of the system per frame."}),
               "vibrations": (InputDynMatrix, {"default": {},
                                               "help": "Option for phonon computation"}),
               "alchemy": (InputAlchemy, {"default": {},
@@ -107,6 +113,10 @@ class InputMotionBase(Input):
             self.mode.store("neb")
             self.neb_optimizer.store(sc)
             tsc = 1
+        elif type(sc) is StringMover:
+            self.mode.store("string")
+            self.string_optimizer.store(sc)
+            tsc = 1
         elif type(sc) is Dynamics:
             self.mode.store("dynamics")
             self.dynamics.store(sc)
@@ -128,6 +138,7 @@ class InputMotionBase(Input):
 
         if tsc == 0:
             self.file.store(sc.intraj)
+            self.replay_window.store(sc.window)
         elif tsc > 0:
             self.fixcom.store(sc.fixcom)
             self.fixatoms.store(sc.fixatoms)
@@ -143,11 +154,13 @@ class InputMotionBase(Input):
         super(InputMotionBase, self).fetch()
 
         if self.mode.fetch() == "replay":
-            sc = Replay(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), intraj=self.file.fetch())
+            sc = Replay(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), intraj=self.file.fetch(), window=self.replay_window.fetch())
         elif self.mode.fetch() == "minimize":
             sc = GeopMotion(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), **self.optimizer.fetch())
         elif self.mode.fetch() == "neb":
             sc = NEBMover(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), **self.neb_optimizer.fetch())
+        elif self.mode.fetch() == "string":
+            sc = StringMover(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), **self.string_optimizer.fetch())
         elif self.mode.fetch() == "dynamics":
             sc = Dynamics(fixcom=self.fixcom.fetch(), fixatoms=self.fixatoms.fetch(), **self.dynamics.fetch())
         elif self.mode.fetch() == "vibrations":
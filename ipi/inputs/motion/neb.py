@@ -46,20 +46,21 @@ class InputNEB(InputDictionary):
 
     attribs = {"mode": (InputAttribute, {"dtype": str, "default": "lbfgs",
                                          "help": "The geometry optimization algorithm to be used",
-                                         "options": ['sd', 'cg', 'bfgs', 'lbfgs']})}
+                                         "options": ['sd', 'cg', 'bfgs', 'lbfgs', 'fire', 'quickmin']})}
 
-    fields = {"ls_options": (InputDictionary, {"dtype": [float, int, float, float],
+    fields = {"ls_options": (InputDictionary, {"dtype": [float, int, float, float, int],
                                                "help": """Options for line search methods. Includes:
                               tolerance: stopping tolerance for the search,
                               grad_tolerance: stopping tolerance on gradient for
                               BFGS line search,
                               iter: the maximum number of iterations,
                               step: initial step for bracketing,
-                              adaptive: whether to update initial step.
+                              adaptive: whether to update initial step,
+                              npoints: the number of trial steps of the L-BFGS line search evaluated at the same time.
                               """,
-                                               "options": ["tolerance", "iter", "step", "adaptive"],
-                                               "default": [1e-6, 100, 1e-3, 1.0],
-                                               "dimension": ["energy", "undefined", "length", "undefined"]}),
+                                               "options": ["tolerance", "iter", "step", "adaptive", "npoints"],
+                                               "default": [1e-6, 100, 1e-3, 1.0, 1],
+                                               "dimension": ["energy", "undefined", "length", "undefined", "undefined"]}),
               "tolerances": (InputDictionary, {"dtype": float,
                                                "options": ["energy", "force", "position"],
                                                "default": [1e-8, 1e-8, 1e-8],
@@ -102,7 +103,23 @@ class InputNEB(InputDictionary):
                                            "help": "Uniform or variable spring constants along the elastic band"}),
               "climb": (InputValue, {"dtype": bool,
                                      "default": False,
-                                     "help": "Use climbing image NEB"})
+                                     "help": "Use climbing image NEB"}),
+              "fire": (InputDictionary, {"dtype": [float, float, int, float, float, float, float, float, int],
+                                         "options": ["dt", "dtmax", "nmin", "finc", "fdec", "alpha0", "falpha", "alpha", "npos"],
+                                         "default": [41.341, 413.41, 5, 1.1, 0.5, 0.1, 0.99, 0.1, 0],
+                                         "dimension": ["time", "time", "undefined", "undefined", "undefined", "undefined", "undefined", "undefined", "undefined"],
+                                         "help": """Options for the FIRE and quick-min optimizers. Includes:
+                              dt: time step (quick-min keeps it fixed),
+                              dtmax: maximum time step,
+                              nmin: number of downhill steps before the time step is increased,
+                              finc: factor by which the time step is increased,
+                              fdec: factor by which the time step is decreased after an uphill step,
+                              alpha0: initial mixing of the velocities with the forces,
+                              falpha: factor by which the mixing is decreased,
+                              alpha: current mixing of the velocities with the forces,
+                              npos: number of downhill steps done so far.
+                              The velocities of the images are kept in the momenta of the beads.
+                              """})
               }
 
     dynamic = {}
@@ -125,6 +142,7 @@ class InputNEB(InputDictionary):
         self.spring.store(neb.spring)
         self.climb.store(neb.climb)
         self.scale_lbfgs.store(neb.scale)
+        self.fire.store(neb.fire)
 
     def fetch(self):
         rv = super(InputNEB, self).fetch()
@@ -60,6 +60,9 @@ class InputDynMatrix(InputDictionary):
                 "asr": (InputValue, {"dtype": str, "default": "none", "options": ["none", "poly", "lin", "crystal"],
                                      "help": "Removes the zero frequency vibrational modes depending on the symmerty of the system."
                                      }),
+                "window": (InputValue, {"dtype": int, "default": 1,
+                                        "help": "The number of rows of the dynamical matrix whose displaced configurations are sent to the force providers at once. Larger values keep more clients busy, at the cost of a copy of the system per displacement."
+                                        }),
                 "dynmat": (InputArray, {"dtype": float,
                                         "default": np.zeros(0, float),
                                         "help": "Portion of the dynamical matrix known up to now."}),
@@ -81,6 +84,7 @@ class InputDynMatrix(InputDictionary):
         self.output_shift.store(phonons.deltaw)
         self.prefix.store(phonons.prefix)
         self.asr.store(phonons.asr)
+        self.window.store(phonons.window)
         self.dynmat.store(phonons.dynmatrix)
         self.refdynmat.store(phonons.refdynmatrix)
 
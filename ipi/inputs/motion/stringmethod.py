@@ -0,0 +1,64 @@
+"""Deals with creating the string method object from a file, and writing the
+checkpoints.
+
+Classes:
+   InputString: Deals with creating the StringMover object from a file, and
+      writing the checkpoints.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+from ipi.utils.inputvalue import *
+
+
+__all__ = ['InputString']
+
+
+class InputString(InputDictionary):
+
+    """Options for the optimization of reaction paths with the zero-temperature
+    string method.
+
+    The images are the beads of the system. They move along their forces and
+    are then redistributed evenly along the arc length of the path.
+    """
+
+    fields = {"step_size": (InputValue, {"dtype": float,
+                                         "default": 1.0,
+                                         "help": "The factor that turns the force on an image into its displacement in one step."}),
+              "biggest_step": (InputValue, {"dtype": float,
+                                            "default": 0.5,
+                                            "dimension": "length",
+                                            "help": "The largest displacement of an image in one step."}),
+              "tolerances": (InputDictionary, {"dtype": float,
+                                               "options": ["force", "position"],
+                                               "default": [1e-4, 1e-6],
+                                               "dimension": ["force", "length"],
+                                               "help": "Convergence thresholds on the force perpendicular to the path and on the displacement of the images."}),
+              "endpoints": (InputValue, {"dtype": bool,
+                                         "default": True,
+                                         "help": "Whether the end images are relaxed to the minima."}),
+              "ghts_input": (InputValue, {"dtype": str,
+                                          "default": "",
+                                          "help": "A ghts state file with the definition of the collective variables. If it is given, the converged path is used to place the dividing surface of ghts."}),
+              "ghts_output": (InputValue, {"dtype": str,
+                                           "default": "ghts_string.json",
+                                           "help": "The file the ghts state is written to, with the dividing surface (z, n, M) through the highest image and normal to the path in the space of the collective variables."})
+              }
+
+    dynamic = {}
+
+    default_help = "Contains the required parameters for optimizing reaction paths with the string method"
+    default_label = "STRING"
+
+    def store(self, string):
+        if string == {}: return
+        self.step_size.store(string.step_size)
+        self.biggest_step.store(string.big_step)
+        self.tolerances.store(string.tolerances)
+        self.endpoints.store(string.endpoints)
+        self.ghts_input.store(string.ghts_input)
+        self.ghts_output.store(string.ghts_output)
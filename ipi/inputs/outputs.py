@@ -104,8 +104,8 @@ class InputTrajectory(InputValue):
     attribs["stride"] = (InputAttribute, {"dtype": int, "default": 1,
                                           "help": "The number of steps between successive writes."})
     attribs["format"] = (InputAttribute, {"dtype": str, "default": "xyz",
-                                          "help": "The output file format.",
-                                          "options": ['xyz', 'pdb']})
+                                          "help": "The output file format. 'ipibin' is an appendable binary format with fixed-size frames, that can be memory-mapped when the trajectory is analysed.",
+                                          "options": ['xyz', 'pdb', 'ipibin']})
     attribs["cell_units"] = (InputAttribute, {"dtype": str, "default": "",
                                               "help": "The units for the cell dimensions."})
     attribs["bead"] = (InputAttribute, {"dtype": int, "default": -1,
@@ -159,6 +159,8 @@ class InputCheckpoint(InputValue):
           data to file.
        overwrite: whether checkpoints should be overwritten, or multiple
           files output.
+       binary: whether the large arrays should be written to a binary npz
+          container next to the checkpoint file.
     """
 
     default_help = """This class defines how a checkpoint file should be output. Optionally, between the checkpoint tags, you can specify one integer giving the current step of the simulation. By default this integer will be zero."""
@@ -171,6 +173,8 @@ class InputCheckpoint(InputValue):
                                           "help": "The number of steps between successive writes."})
     attribs["overwrite"] = (InputAttribute, {"dtype": bool, "default": True,
                                              "help": "This specifies whether or not each consecutive checkpoint file will overwrite the old one."})
+    attribs["binary"] = (InputAttribute, {"dtype": bool, "default": False,
+                                          "help": "If true, the arrays with many elements (such as positions and momenta) are written to an uncompressed npz container named after the checkpoint file and the step, rather than as text. The checkpoint file refers to the container, which is memory-mapped when restarting, and must be kept with it."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initializes InputCheckpoint.
@@ -184,7 +188,7 @@ class InputCheckpoint(InputValue):
         """Returns a CheckpointOutput object."""
 
         step = super(InputCheckpoint, self).fetch()
-        return eoutputs.CheckpointOutput(self.filename.fetch(), self.stride.fetch(), self.overwrite.fetch(), step=step)
+        return eoutputs.CheckpointOutput(self.filename.fetch(), self.stride.fetch(), self.overwrite.fetch(), step=step, binary=self.binary.fetch())
 
     def parse(self, xml=None, text=""):
         """Overwrites the standard parse function so that we can specify this tag
@@ -212,6 +216,7 @@ class InputCheckpoint(InputValue):
         self.stride.store(chk.stride)
         self.filename.store(chk.filename)
         self.overwrite.store(chk.overwrite)
+        self.binary.store(chk.binary)
 
     def check(self):
         """Checks for optional parameters."""
@@ -233,6 +238,13 @@ class InputOutputs(Input):
     Attributes:
        prefix: A string that will be appended to all output files from this
           simulation.
+       background: Whether properties and trajectories are written to file
+          by a background thread.
+       fsync_time: The time between flushes to disk of the background writer.
+       fsync_bytes: The amount of data written between flushes to disk by
+          the background writer.
+       queue_size: The maximum number of writes waiting to be done by the
+          background writer.
 
     Dynamic fields:
        trajectory: Specifies a trajectory to be output
@@ -242,7 +254,19 @@ class InputOutputs(Input):
 
     attribs = {"prefix": (InputAttribute, {"dtype": str,
                                            "default": "i-pi",
-                                           "help": "A string that will be prepended to each output file name. The file name is given by 'prefix'.'filename' + format_specifier. The format specifier may also include a number if multiple similar files are output."})
+                                           "help": "A string that will be prepended to each output file name. The file name is given by 'prefix'.'filename' + format_specifier. The format specifier may also include a number if multiple similar files are output."}),
+               "background": (InputAttribute, {"dtype": bool,
+                                               "default": False,
+                                               "help": "If true, properties and trajectories are formatted by the simulation and handed to a separate thread that writes them to file. The flush attributes of the outputs are then ignored, and the files are flushed to disk according to fsync_time and fsync_bytes."}),
+               "fsync_time": (InputAttribute, {"dtype": float,
+                                               "default": 1.0,
+                                               "help": "The number of seconds after which the data written by the background thread is flushed to disk. A negative value disables this criterion."}),
+               "fsync_bytes": (InputAttribute, {"dtype": int,
+                                                "default": 1048576,
+                                                "help": "The number of bytes written by the background thread after which the data is flushed to disk. A negative value disables this criterion."}),
+               "queue_size": (InputAttribute, {"dtype": int,
+                                               "default": 1000,
+                                               "help": "The maximum number of writes that can wait for the background thread. When the queue is full, the simulation waits for the writes to be done."})
                }
 
     dynamic = {"properties": (InputProperties, {"help": "Each of the properties tags specify how to create a file in which one or more properties are written, one line per frame. "}),
@@ -286,7 +310,17 @@ class InputOutputs(Input):
 
         return outlist
 
-    def store(self, plist):
+    def fetch_writer(self):
+        """Returns the OutputWriter that should write the outputs in the
+        background, or None if they should be written directly."""
+
+        if not self.background.fetch():
+            return None
+        return eoutputs.OutputWriter(fsync_time=self.fsync_time.fetch(),
+                                     fsync_bytes=self.fsync_bytes.fetch(),
+                                     queue_size=self.queue_size.fetch())
+
+    def store(self, plist, writer=None):
         """ Stores a list of the output objects, creating a sequence of
         dynamic containers.
 
@@ -294,11 +328,19 @@ class InputOutputs(Input):
            plist: A list of tuples, with each tuple being of the form
               ('type', 'object') where 'type' is the type of forcefield and
               'object' is a particular object of that type.
+           writer: The OutputWriter used to write the outputs in the
+              background, if any.
         """
 
         super(InputOutputs, self).store()
         self.extra = []
 
+        self.background.store(writer is not None)
+        if writer is not None:
+            self.fsync_time.store(writer.fsync_time)
+            self.fsync_bytes.store(writer.fsync_bytes)
+            self.queue_size.store(writer.queue_size)
+
         self.prefix.store("")  # do not store prefix, as on load it is added to the innermost output filenames
         for el in plist:
             if (isinstance(el, eoutputs.PropertyOutput)):
@@ -86,6 +86,10 @@ class InputSimulation(Input):
                                               "default": True,
                                               "help": "Whether multiple-systems execution should be parallel. Makes execution non-reproducible due to the random number generator being used from concurrent threads."
                                               }),
+               "freeze_depend": (InputAttribute, {"dtype": bool,
+                                                  "default": False,
+                                                  "help": "Whether the network of dependencies between the simulation quantities should be frozen once the simulation has been initialized, so that changes are propagated faster. Reverts automatically to the standard mechanism if the network is modified afterwards."
+                                                  }),
                "mode": (InputAttribute, {"dtype": str,
                                          "default": "md",
                                          "help": "What kind of simulation should be run.",
@@ -100,7 +104,8 @@ class InputSimulation(Input):
               "ffpes2014": (iforcefields.InputFFPES2014, {"help": iforcefields.InputFFPES2014.default_help}),
               "ffdebye": (iforcefields.InputFFDebye, {"help": iforcefields.InputFFDebye.default_help}),
               "ffplumed": (iforcefields.InputFFPlumed, {"help": iforcefields.InputFFPlumed.default_help}),
-              "ffyaff": (iforcefields.InputFFYaff, {"help": iforcefields.InputFFYaff.default_help})
+              "ffyaff": (iforcefields.InputFFYaff, {"help": iforcefields.InputFFYaff.default_help}),
+              "ffgridmetad": (iforcefields.InputFFGridMetaD, {"help": iforcefields.InputFFGridMetaD.default_help})
     }
 
     default_help = "This is the top level class that deals with the running of the simulation, including holding the simulation specific properties such as the time step and outputting the data."
@@ -115,13 +120,14 @@ class InputSimulation(Input):
 
         super(InputSimulation, self).store()
 
-        self.output.store(simul.outtemplate)
+        self.output.store(simul.outtemplate, simul.writer)
         self.prng.store(simul.prng)
         self.step.store(simul.step)
         self.total_steps.store(simul.tsteps)
         self.total_time.store(simul.ttime)
         self.smotion.store(simul.smotion)
         self.threading.store(simul.threading)
+        self.freeze_depend.store(simul.freeze_depend)
 
         # this we pick from the messages class. kind of a "global" but it seems to
         # be the best way to pass around the (global) information on the level of output.
@@ -170,6 +176,10 @@ class InputSimulation(Input):
                     _iobj = iforcefields.InputFFYaff()
                     _iobj.store(_obj)
                     self.extra[_ii] = ("ffyaff", _iobj)
+                elif isinstance(_obj, eforcefields.FFGridMetaD):
+                    _iobj = iforcefields.InputFFGridMetaD()
+                    _iobj.store(_obj)
+                    self.extra[_ii] = ("ffgridmetad", _iobj)
                 elif isinstance(_obj, System):
                     _iobj = InputSystem()
                     _iobj.store(_obj)
@@ -206,7 +216,7 @@ class InputSimulation(Input):
             elif k == "ffsocket" or k == "fflj" or k == "ffpes2014" or k == "ffdebye" or k == "ffplumed":
                 print "fetching", k
                 fflist.append(v.fetch())
-            elif k == "ffyaff":
+            elif k == "ffyaff" or k == "ffgridmetad":
                 fflist.append(v.fetch())
 
         # this creates a simulation object which gathers all the little bits
@@ -216,11 +226,13 @@ class InputSimulation(Input):
             syslist=syslist,
             fflist=fflist,
             outputs=self.output.fetch(),
+            writer=self.output.fetch_writer(),
             prng=self.prng.fetch(),
             smotion=self.smotion.fetch(),
             step=self.step.fetch(),
             tsteps=self.total_steps.fetch(),
             ttime=self.total_time.fetch(),
-            threads=self.threading.fetch())
+            threads=self.threading.fetch(),
+            freeze_depend=self.freeze_depend.fetch())
 
         return rsim
@@ -40,7 +40,7 @@ class InputReplicaExchange(InputDictionary):
     fields = {
         "stride": (InputValue, {"dtype": float,
                                 "default": 1.0,
-                                "help": "Every how often to try exchanges (on average)."
+                                "help": "Every how often to try exchanges (on average). Exchanges are tried between the neighbouring ensembles, alternating between the pairs that start at an even and at an odd ensemble."
                                 }),
            "krescale": (InputValue, {"dtype": bool,
                                      "default": True,
@@ -49,6 +49,9 @@ class InputReplicaExchange(InputDictionary):
                                      "default": "PARATEMP",
                                      "help": "File to keep track of replica exchanges"
                                      }),
+            "workers": (InputValue, {"dtype": int,
+                                     "default": 1,
+                                     "help": "The number of processes the systems are distributed over. With more than one, each process runs a block of consecutive systems, and the exchanges are decided by the main process. The forcefield sockets of process k listen at the address followed by '_k' in unix mode, or at the port plus k in inet mode. Only possible if the ensembles differ only by their temperature. No checkpoints can be written, so such runs cannot be restarted."}),
             "repindex": (InputArray, {"dtype": int,
                                       "default": input_default(factory=np.zeros, args=(0,)),
                                       "help": "List of current indices of the replicas compared to the starting indices"})
@@ -64,6 +67,7 @@ class InputReplicaExchange(InputDictionary):
         self.repindex.store(remd.repindex)
         self.krescale.store(remd.rescalekin)
         self.swapfile.store(remd.swapfile)
+        self.workers.store(remd.workers)
 
     def fetch(self):
         rv = super(InputReplicaExchange, self).fetch()
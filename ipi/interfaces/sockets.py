@@ -634,9 +634,10 @@ class InterfaceSocket(object):
                     if len(r["result"][1]) != len(r["pos"][r["active"]]):
                         raise InvalidSize
                     # If only a piece of the system is active, resize forces and reassign
-                    rftemp = r["result"][1]
-                    r["result"][1] = np.zeros(len(r["pos"]), dtype=np.float64)
-                    r["result"][1][r["active"]] = rftemp
+                    if not isinstance(r["active"], slice):
+                        rftemp = r["result"][1]
+                        r["result"][1] = np.zeros(len(r["pos"]), dtype=np.float64)
+                        r["result"][1][r["active"]] = rftemp
                 except Disconnected:
                     c.status = Status.Disconnected
                     continue
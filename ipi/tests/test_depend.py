@@ -5,6 +5,8 @@
 # See the "licenses" directory for full license information.
 
 
+import threading
+
 import numpy as np
 
 import ipi.engine.atoms
@@ -63,3 +65,124 @@ def test_readonly():
     """Depend: read-only flag"""
     atoms = ipi.engine.atoms.Atoms(2)
     atoms.q = np.zeros(2 * 3)
+
+
+def make_network():
+    """Builds a small network with synchronized arrays, slices and values."""
+
+    sync = dp.synchronizer()
+    q = dp.depend_array(name="q", value=np.zeros((2, 3), float),
+                        func={"qnm": (lambda: dp.dstrip(qnm) * 2.0)}, synchro=sync)
+    qnm = dp.depend_array(name="qnm", value=np.zeros((2, 3), float),
+                          func={"q": (lambda: dp.dstrip(q) * 0.5)}, synchro=sync)
+    q0 = q[0]
+    f = dp.depend_value(name="f", func=(lambda: q0[1] + 1.0), dependencies=[q0])
+    g = dp.depend_value(name="g", func=(lambda: f.get() * qnm[1, 2]), dependencies=[f, qnm])
+    return q, qnm, f, g
+
+
+def test_frozen():
+    """Depend: frozen network behaves as the recursive one"""
+
+    nets = [make_network(), make_network()]
+    dp.dfreeze(nets[1])
+    try:
+        ops = [lambda q, qnm, f, g: q.__setitem__((0, 1), 3.0),
+               lambda q, qnm, f, g: g.get(),
+               lambda q, qnm, f, g: qnm.__setitem__((1, 2), 2.0),
+               lambda q, qnm, f, g: f.get(),
+               lambda q, qnm, f, g: q[1, 2],
+               lambda q, qnm, f, g: g.get()]
+        for op in ops:
+            for net in nets:
+                op(*net)
+            flags = [[d.tainted() for d in net] for net in nets]
+            assert flags[0] == flags[1]
+        assert nets[0][3].get() == nets[1][3].get()
+        assert (nets[0][0] == nets[1][0]).all()
+
+        # adding a dependant thaws the network
+        q, qnm, f, g = nets[1]
+        h = dp.depend_value(name="h", func=(lambda: f.get() + 1.0), dependencies=[f])
+        h.get()
+        q[0, 1] = 5.0
+        assert h.tainted()
+        assert h.get() == 7.0
+    finally:
+        dp.dthaw()
+
+
+def test_frozen_identity():
+    """Depend: frozen entries only apply to the flag they were built for"""
+
+    q, qnm, f, g = make_network()
+    dp.dfreeze([q, qnm, f, g])
+    try:
+        # an entry left behind by a flag whose id has been reused
+        stale = np.zeros(1, bool)
+        other = np.zeros(1, bool)
+        t = dp.depend_value(name="t", value=1.0)
+        dp._frozen[id(t._tainted)] = (stale, [other], [], [other], [])
+        t.set(2.0)
+        assert not other[0]
+        del dp._frozen[id(t._tainted)]
+
+        # the flags of the frozen network are kept alive with their entries
+        assert all([id(e[0]) == k for k, e in dp._frozen.items()])
+    finally:
+        dp.dthaw()
+
+
+def test_snapshot():
+    """Depend: snapshots restore the independent quantities"""
+
+    q, qnm, f, g = make_network()
+    t = dp.depend_value(name="t", value=1.0)
+    q[0, 1] = 3.0
+    snap = dp.depend_snapshot([q, t])
+    assert len(snap.synchros) == 1 and snap.values == [t]
+    snap.store()
+    gref = g.get()
+
+    qnm[1, 2] = 5.0
+    t.set(2.0)
+    assert g.get() != gref
+    snap.restore()
+    assert t.get() == 1.0
+    assert g.tainted()
+    assert g.get() == gref
+    assert q[0, 1] == 3.0 and qnm[1, 2] == 0.0
+
+
+def test_snapshot_view():
+    """Depend: snapshots are read in place of the objects without changing them"""
+
+    q, qnm, f, g = make_network()
+    obj = dp.dobject()
+    dself = dp.dd(obj)
+    dself.q = q
+    dself.qnm = qnm
+    dself.q0 = q[0]
+    dself.t = dp.depend_value(name="t", value=1.0)
+    obj.qnm = np.ones((2, 3))
+    snap = dp.depend_snapshot([obj])
+    snap.store()
+
+    obj.q = np.arange(6.0).reshape((2, 3))
+    obj.t = 2.0
+    seen = []
+    with snap.view():
+        # the synchronized array that was not set last is also in the snapshot
+        assert (obj.q == 2.0).all() and (obj.qnm == 1.0).all()
+        assert (obj.q0 == 2.0).all()
+        assert obj.t == 1.0
+        assert not obj.q.flags.writeable
+
+        # other threads see the current values
+        th = threading.Thread(target=lambda: seen.append((obj.q.copy(), obj.t)))
+        th.start()
+        th.join()
+
+    assert (seen[0][0] == np.arange(6.0).reshape((2, 3))).all() and seen[0][1] == 2.0
+    assert (obj.q == np.arange(6.0).reshape((2, 3))).all() and obj.t == 2.0
+    assert q._synchro.manual == "q"
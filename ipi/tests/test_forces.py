@@ -0,0 +1,121 @@
+"""Tests the copy of the forces between forces objects, as used by the
+optimizers, the nudged elastic band, the instantons and the replay."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.simulation import Simulation
+from ipi.utils.depend import dd, dstrip
+
+
+simulation_xml = """
+<simulation verbosity='quiet' threading='False'>
+   <output prefix='forces'></output>
+   <total_steps> 1 </total_steps>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   <system>
+      <initialize nbeads='3'>
+         <file mode='xyz' units='atomic_unit'> init.xyz </file>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> 20 </temperature>
+      </ensemble>
+      <motion mode='dynamics'>
+         <dynamics mode='nve'>
+            <timestep units='femtosecond'> 1.0 </timestep>
+         </dynamics>
+      </motion>
+   </system>
+</simulation>
+"""
+
+
+def tainted(forces):
+    """Returns the tainted flags of the values of the beads of a forces
+    object."""
+
+    return [dd(fb).ufvx.tainted() for fb in forces.mforces[0]._forces]
+
+
+def check_transfer(system, ff):
+    """Checks transfer_forces and transfer_bead_forces."""
+
+    forces = system.forces
+    rs = np.random.RandomState(12345)
+    q = dstrip(system.beads.q) + rs.normal(0.0, 0.3, system.beads.q.shape)
+
+    source = forces.copy(system.beads.copy(), system.cell.copy())
+    source.beads.q = q
+    fref = dstrip(source.f).copy()
+
+    target = forces.copy(system.beads.copy(), system.cell.copy())
+    target.beads.q = q
+    assert all(tainted(target))
+    target.transfer_forces(source)
+    # the copied values are up to date, so that reading them sends no
+    # request to the forcefield
+    assert not any(tainted(target))
+    assert_allclose(dstrip(target.f), fref)
+    assert len(ff.requests) == 0
+
+    # the beads whose source value has not been computed are skipped
+    other = forces.copy(system.beads.copy(), system.cell.copy())
+    other.beads.q = q * 1.01
+    other.mforces[0]._forces[0].queue()
+    dstrip(other.mforces[0]._forces[0].f)
+    target.transfer_forces(other)
+    assert not any(tainted(target))
+    fother = dstrip(target.f)
+    assert_allclose(fother[1:], fref[1:])
+    assert not np.allclose(fother[0], fref[0])
+
+    # moving the beads afterwards asks for the forces again
+    target.beads.q = q
+    assert all(tainted(target))
+
+    # the forces of single-bead copies go to one bead at a time
+    bead = forces.copy(system.beads.copy(1), system.cell.copy())
+    bead.beads.q = q[2:3]
+    dstrip(bead.f)
+    target.transfer_bead_forces(bead, 2)
+    assert tainted(target) == [True, True, False]
+    assert_allclose(dstrip(target.mforces[0]._forces[2].f), fref[2])
+
+
+def test_transfer():
+    """Checks that the forces copied to another forces object are marked as
+    computed, and that the values that were not computed are not copied."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        with open("init.xyz", "w") as f:
+            f.write("3\n# CELL(abcABC):  100.0  100.0  100.0  90.0  90.0  90.0\n")
+            for x in [[0.0, 0.0, 0.0], [7.0, 0.0, 0.0], [0.0, 7.5, 0.0]]:
+                f.write("Ar %f %f %f\n" % tuple(x))
+        with open("input.xml", "w") as f:
+            f.write(simulation_xml)
+        simul = Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+        for ff in simul.fflist.values():
+            ff.run()
+        check_transfer(simul.syslist[0], simul.fflist["lj"])
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,141 @@
+"""Tests the change of the number of beads in an instanton temperature scan."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.simulation import Simulation
+from ipi.inputs.simulation import InputSimulation
+from ipi.utils.depend import dstrip
+from ipi.utils.instools import interpolate_path, interpolate_hessian
+from ipi.utils import units
+
+
+simulation_xml = """
+<simulation mode='static' verbosity='quiet' threading='False'>
+   <output prefix='inst'>
+      <trajectory filename='pos' stride='1' format='xyz'> positions </trajectory>
+   </output>
+   <total_steps> 10 </total_steps>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   <system>
+      <initialize nbeads='3'>
+         <file mode='xyz' units='atomic_unit'> init.xyz </file>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> 20 </temperature>
+      </ensemble>
+      <normal_modes>
+         <open_paths> [ 0, 1, 2 ] </open_paths>
+      </normal_modes>
+      <motion mode='instanton'>
+         <instanton mode='rate'>
+            <temperatures units='kelvin'> [20, 10] </temperatures>
+            <scan_nbeads> [3, 5] </scan_nbeads>
+            <opt> nichols </opt>
+            <hessian_init> true </hessian_init>
+         </instanton>
+      </motion>
+   </system>
+</simulation>
+"""
+
+
+def check_resize(simul):
+    """Moves the scan to the next temperature, and checks that the system and
+    the optimizer are rebuilt with the interpolated instanton."""
+
+    system = simul.syslist[0]
+    motion = system.motion
+    rs = np.random.RandomState(12345)
+    q = dstrip(system.beads.q).copy()
+    m = dstrip(system.beads.m).copy()
+    h = rs.normal(size=(9, 27))
+    motion.hessian[:] = h
+
+    assert motion.optimizer.next_temperature()
+    assert_allclose(system.ensemble.temp, units.unit_to_internal("temperature", "kelvin", 10.0))
+
+    beads = system.beads
+    assert beads.nbeads == 5
+    assert_allclose(dstrip(beads.q), interpolate_path(q, 5))
+    assert_allclose(dstrip(beads.m), m)
+    assert system.nm.qnm.shape == (5, 9)
+    assert_allclose(system.nm.transform.nm2b(dstrip(system.nm.qnm)), dstrip(beads.q), atol=1e-12)
+
+    # the forces of the system are those of the new beads
+    fref = system.forces.copy(beads.copy(), system.cell.copy())
+    assert_allclose(dstrip(system.forces.f), dstrip(fref.f))
+    assert_allclose(dstrip(system.forces.pots), dstrip(fref.pots))
+    assert_allclose(system.properties["potential"][0], fref.pot / 5)
+
+    # the optimizer goes on from the interpolated instanton and hessian
+    opt = motion.optimizer
+    assert_allclose(motion.hessian, interpolate_hessian(h, 3, 5))
+    assert opt.hessian is motion.hessian
+    assert opt.old_x is motion.old_x
+    assert_allclose(opt.old_x, dstrip(beads.q))
+    assert_allclose(opt.old_f, dstrip(fref.f))
+    assert opt.gm.dbeads.nbeads == 5
+    assert opt.im.dbeads.nbeads == 5
+    assert opt.im.h.shape == (45, 45)
+
+    assert not opt.next_temperature()
+
+    # the per-bead trajectories are written for all the new beads
+    simul.step = 1
+    for o in simul.outputs:
+        o.write()
+    for b in range(5):
+        assert os.path.getsize("inst.pos_%d.xyz" % b) > 0
+
+
+def test_scan_nbeads():
+    """Tests the interpolation of the instanton to the number of beads of the
+    next temperature, and that the checkpoint keeps the new number of beads."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        with open("init.xyz", "w") as f:
+            for d in [-0.3, 0.0, 0.3]:
+                f.write("3\n# CELL(abcABC):  100.0  100.0  100.0  90.0  90.0  90.0\n")
+                for x in [[d, 0.0, 0.0], [7.0, d, 0.0], [0.0, 7.5, d]]:
+                    f.write("Ar %f %f %f\n" % tuple(x))
+        with open("input.xml", "w") as f:
+            f.write(simulation_xml)
+        simul = Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+        for ff in simul.fflist.values():
+            ff.run()
+        check_resize(simul)
+
+        isimul = InputSimulation()
+        isimul.store(simul)
+        with open("RESTART", "w") as f:
+            f.write(isimul.write("simulation"))
+        q = dstrip(simul.syslist[0].beads.q).copy()
+        for ff in simul.fflist.values():
+            ff.stop()
+        simul = Simulation.load_from_xml("RESTART", custom_verbosity="quiet")
+        assert simul.syslist[0].beads.nbeads == 5
+        assert_allclose(dstrip(simul.syslist[0].beads.q), q)
+        assert simul.syslist[0].motion.hessian.shape == (9, 45)
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,119 @@
+"""Tests the finite difference hessian and the interpolation of the
+instanton tools."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from common import local
+from ipi.utils.instools import get_hessian, open_hessian_chk, interpolate_path, interpolate_hessian
+
+
+class DummyBeads(object):
+
+    def __init__(self, natoms, nbeads):
+        self.natoms = natoms
+        self.q = np.zeros((nbeads, 3 * natoms))
+
+
+class DummyForces(object):
+
+    """Forces of a set of atoms bound by quartic springs between all pairs,
+    which counts how many configurations it has computed."""
+
+    count = 0
+
+    def __init__(self, beads):
+        self.beads = beads
+
+    def queue(self):
+        pass
+
+    @property
+    def f(self):
+        DummyForces.count += 1
+        q = self.beads.q.reshape((self.beads.q.shape[0], -1, 3))
+        d = q[:, :, np.newaxis, :] - q[:, np.newaxis, :, :]
+        return -(d ** 3).sum(axis=2).reshape(self.beads.q.shape)
+
+
+class DummyMapper(object):
+
+    def __init__(self, natoms, nbeads):
+        self.dbeads = DummyBeads(natoms, nbeads)
+        self.dforces = DummyForces(self.dbeads)
+
+    def set_pos(self, x):
+        self.dbeads.q = x
+
+    def fd_copies(self, ncopies):
+        return [DummyForces(DummyBeads(self.dbeads.natoms, 1)) for i in range(ncopies)]
+
+
+natoms, nbeads = 4, 2
+x0 = np.random.RandomState(12345).uniform(-1.0, 1.0, (nbeads, 3 * natoms))
+
+
+def compute(**kwargs):
+    gm = DummyMapper(natoms, nbeads)
+    h = np.zeros((3 * natoms, 3 * natoms * nbeads))
+    DummyForces.count = 0
+    get_hessian(h, gm, x0, chkfile=local("hessian.tmp"), **kwargs)
+    return h
+
+
+def test_hessian_window():
+    """Tests that the hessian does not depend on the rows computed at once."""
+
+    h = compute()
+    assert_equal(h, compute(window=5))
+    assert_allclose(h[:, :3 * natoms], h[:, :3 * natoms].T, atol=1e-5)
+    assert not os.path.exists(local("hessian.tmp"))
+
+
+def test_hessian_asr():
+    """Tests the rows obtained from the translational invariance."""
+
+    h = compute()
+    assert DummyForces.count == 2 * 3 * natoms + 1
+    assert_allclose(compute(asr="poly"), h, atol=1e-5)
+    assert DummyForces.count == 2 * 3 * (natoms - 1) + 1
+
+
+def test_hessian_restart():
+    """Tests that the rows of a checkpoint file are not computed again,
+    and that a truncated row is ignored."""
+
+    h = compute()
+    hchk = np.zeros(h.shape)
+    f, done = open_hessian_chk(local("hessian.tmp"), hchk, x0, 0.0005)
+    assert done == []
+    for j in [0, 2, 3]:
+        f.write(np.int64(j).tostring() + h[j].tostring())
+    f.write(np.int64(4).tostring() + h[4, :5].tostring())
+    f.close()
+
+    assert_equal(compute(), h)
+    assert DummyForces.count == 2 * (3 * natoms - 3) + 1
+
+
+def test_interpolate():
+    """Tests that each element of the reduced hessian is interpolated along
+    the path as the positions are, and that a constant path is kept."""
+
+    rs = np.random.RandomState(12345)
+    ii = 3 * natoms
+    h = rs.normal(size=(ii, ii * 3))
+    hnew = interpolate_hessian(h, natoms, 5)
+    assert hnew.shape == (ii, ii * 5)
+    for a, b in [(0, 0), (1, 7), (11, 4)]:
+        assert_allclose(hnew[a, b::ii], interpolate_path(h[a, b::ii][:, np.newaxis], 5)[:, 0])
+
+    assert_allclose(interpolate_path(np.ones((3, ii)), 7), np.ones((7, ii)))
+    assert_allclose(interpolate_path(x0, nbeads), x0)
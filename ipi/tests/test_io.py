@@ -163,3 +163,115 @@ def test_print_xyz2():
 
     assert filecmp.cmp(local("test.pos_0.xyz"), local("test.pos_1.xyz"))
     os.unlink(local("test.pos_1.xyz"))
+
+
+def test_print_ipibin():
+    """Tests that ipibin files are printed, read and mapped correctly."""
+
+    from ipi.utils.io.backends.io_ipibin import mmap_ipibin
+
+    frames = []
+    with open(local("test.pos_0.xyz"), "r") as f:
+        with open(local("test.pos_1.ipibin"), "w") as out:
+            for num, ret in enumerate(iter_file("xyz", f)):
+                frames.append(ret)
+                print_file("ipibin", ret["atoms"], ret["cell"], filedesc=out)
+
+    with open(local("test.pos_1.ipibin"), "r") as f:
+        for num, ret in enumerate(iter_file("ipibin", f)):
+            assert_equal(frames[num]["atoms"].q, ret["atoms"].q)
+            assert_equal(frames[num]["atoms"].names, ret["atoms"].names)
+            assert_equal(frames[num]["cell"].h, ret["cell"].h)
+    assert num == len(frames) - 1
+
+    names, data = mmap_ipibin(local("test.pos_1.ipibin"))
+    assert len(data) == len(frames)
+    assert_equal(data["data"][-1], frames[-1]["atoms"].q)
+    del data
+    os.unlink(local("test.pos_1.ipibin"))
+
+
+def test_npz():
+    """Tests that arrays are read back from npz containers."""
+
+    import shutil
+    import tempfile
+    from ipi.utils.io.inputs.io_npz import npz_write, npz_read
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(tmpdir, "test.npz")
+        arrays = {"arr_0": np.random.rand(5, 7), "arr_1": np.arange(10), "arr_2": np.zeros(0)}
+        npz_write(fn, arrays)
+        for k, v in arrays.items():
+            assert_equal(npz_read(fn, k), v)
+            assert_equal(npz_read(fn, k, mmap=False), v)
+
+        # modifying the mapped array must not change the container
+        a = npz_read(fn, "arr_0")
+        a *= 2.0
+        assert_equal(npz_read(fn, "arr_0"), arrays["arr_0"])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_npz_archive_threads():
+    """Tests that the arrays written by different threads at the same time
+    go to the archive of their own thread."""
+
+    import threading
+    from ipi.utils.inputvalue import InputArray
+    from ipi.utils.io.inputs.io_npz import npz_archive
+
+    arrays = [InputArray(dtype=float), InputArray(dtype=float)]
+    arrays[0].store(np.zeros(2000))
+    arrays[1].store(np.ones(3000))
+    archives = [npz_archive("first.npz"), npz_archive("second.npz")]
+    ready = [threading.Event(), threading.Event()]
+    texts = [None, None]
+
+    def write(i):
+        InputArray.set_archive(archives[i])
+        ready[i].set()
+        # both archives are set before either thread writes
+        ready[1 - i].wait()
+        try:
+            texts[i] = arrays[i].write(name="q")
+        finally:
+            InputArray.set_archive(None)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(2)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    for i, name in enumerate(["first.npz", "second.npz"]):
+        assert name + ":arr_0" in texts[i]
+        assert archives[i].arrays.keys() == ["arr_0"]
+        assert archives[i].arrays["arr_0"] is arrays[i].value
+    # the main thread still writes to the xml file
+    assert "npz" not in arrays[0].write(name="q")
+
+
+def test_replay_reader():
+    """Tests that the replay reader returns the frames of a trajectory."""
+
+    from ipi.engine.motion.replay import ReplayReader
+
+    with open(local("test.pos_0.xyz"), "r") as f:
+        frames = [ret["atoms"].q.copy() for ret in iter_file("xyz", f)]
+
+    reader = ReplayReader(local("test.pos_0.xyz"), "xyz", 1, queue_size=1)
+    reader.start()
+    cell, q = reader.get(1)
+    assert_equal(q[0], frames[1])
+    # asking again for the last step
+    cell, q = reader.get(1)
+    assert_equal(q[0], frames[1])
+    try:
+        reader.get(len(frames))
+        assert False
+    except EOFError:
+        pass
+    reader.stop()
@@ -0,0 +1,60 @@
+"""Tests the interpolation of the metadynamics grids."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.utils.mathtools import grid_add_gaussian, grid_spline
+
+
+lo = np.array([-2.0, -1.0])
+dx = np.array([0.05, 0.04])
+center = np.array([0.3, -0.2])
+width = np.array([0.4, 0.3])
+
+
+def gaussian(x):
+    return np.exp(-0.5 * (((x - center) / width) ** 2).sum())
+
+
+def test_gaussian_grid():
+    """Tests that the spline of the grid gives a Gaussian and its gradient."""
+
+    grid = np.zeros((81, 51))
+    grid_add_gaussian(grid, lo, dx, center, 2.0, width)
+    for x in np.random.RandomState(12345).uniform([-0.5, -0.8], [1.0, 0.4], (20, 2)):
+        v, dv = grid_spline(grid, lo, dx, x)
+        assert_allclose(v, 2.0 * gaussian(x), atol=1e-3)
+        assert_allclose(dv, -2.0 * gaussian(x) * (x - center) / width ** 2, atol=5e-2)
+
+
+def test_spline_nodes():
+    """Tests that the spline goes through the nodes, and is constant
+    outside of the grid."""
+
+    grid = np.random.RandomState(12345).uniform(size=(6, 5))
+    assert_allclose(grid_spline(grid, lo, dx, lo + dx * [2, 3])[0], grid[2, 3])
+    v, dv = grid_spline(grid, lo, dx, lo - 1.0)
+    assert_allclose(v, grid[0, 0])
+    assert_allclose(dv, 0.0)
+
+
+def test_gaussian_grid_3d():
+    """Tests the spline of a three-dimensional grid away from the nodes,
+    where each weight must act on its own dimension."""
+
+    lo3 = np.array([-2.0, -1.0, -1.5])
+    dx3 = np.array([0.1, 0.08, 0.06])
+    c3 = np.array([0.3, -0.2, 0.1])
+    w3 = np.array([0.4, 0.3, 0.5])
+    grid = np.zeros((41, 26, 51))
+    grid_add_gaussian(grid, lo3, dx3, c3, 1.0, w3)
+    for x in np.random.RandomState(12345).uniform([-0.3, -0.6, -0.4], [0.9, 0.2, 0.6], (20, 3)):
+        g = np.exp(-0.5 * (((x - c3) / w3) ** 2).sum())
+        v, dv = grid_spline(grid, lo3, dx3, x)
+        assert_allclose(v, g, atol=5e-3)
+        assert_allclose(dv, -g * (x - c3) / w3 ** 2, atol=5e-2)
@@ -0,0 +1,79 @@
+"""Tests the line searches that evaluate several trial points at once."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.utils.mintools import min_brent, min_brent_batch, min_approx_batch
+
+
+class Quartic(object):
+
+    """A function and its derivative, which keeps track of the points
+    evaluated one at a time and in batches."""
+
+    def __init__(self, center, curvature=0.5):
+        self.center = np.asarray(center, float)
+        self.curvature = curvature
+        self.calls = []
+        self.batches = []
+
+    def value(self, x):
+        d = np.asarray(x, float) - self.center
+        f = (d ** 4).sum() + self.curvature * (d ** 2).sum()
+        df = 4.0 * d ** 3 + 2.0 * self.curvature * d
+        return f, (df if df.ndim > 0 else float(df))
+
+    def __call__(self, x):
+        self.calls.append(x)
+        return self.value(x)
+
+    def batch(self, xs):
+        self.batches.append(len(xs))
+        return [self.value(x) for x in xs]
+
+
+def test_brent_batch():
+    """Checks that the batched Brent search finds the minimum of a quartic,
+    downhill and uphill from the initial step, as min_brent does."""
+
+    for x0, center in [(0.0, 1.3), (0.0, -0.7), (2.0, 1.3)]:
+        f = Quartic(center)
+        min_brent_batch(f, f(x0), x0, 1e-6, 100, 0.1, 4)
+        assert_allclose(f.calls[-1], center, atol=1e-4)
+        assert max(f.batches) <= 4
+
+        fref = Quartic(center)
+        min_brent(fref, fref(x0), x0, 1e-6, 100, 0.1)
+        assert_allclose(f.calls[-1], fref.calls[-1], atol=1e-4)
+
+
+def test_approx_batch():
+    """Checks that the batched approximate line search takes the longest of
+    the halved steps that satisfies the Armijo condition."""
+
+    f = Quartic([0.2, -0.1])
+    x0 = np.array([1.5, 1.0])
+    f0, df0 = f.value(x0)
+    d0 = -6.0 * df0 / np.sqrt((df0 ** 2).sum())
+
+    x, fx, dfx = min_approx_batch(f, x0, (f0, df0), d0, 10.0, 1e-8, 20, 4)
+
+    slope = np.dot(df0, d0)
+    lams = [0.5 ** k for k in range(20)]
+    lam = [l for l in lams if f.value(x0 + l * d0)[0] <= f0 + 1e-4 * l * slope][0]
+    assert lam < 1.0
+    assert_allclose(x, x0 + lam * d0)
+    assert_allclose(fx, f.value(x)[0])
+    assert_allclose(f.calls[-1], x)
+    assert f.batches == [4]
+
+    # the halved steps are all too long here, so the search must backtrack
+    # with the quadratic fit in a second batch
+    x, fx, dfx = min_approx_batch(f, x0, (f0, df0), 10.0 * d0 / 6.0, 10.0, 1e-8, 20, 2)
+    assert fx < f0
+    assert len(f.batches) > 2 and f.batches[1] == 2
@@ -0,0 +1,101 @@
+"""Tests the forces of the nudged elastic band."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.motion.neb import neb_forces
+
+
+def potential(bq):
+    """A potential with minima at (-1, 0, 0) and (1, 0, 0), joined by a
+    minimum energy path along the unit circle in the xy plane, that goes
+    through the saddle point at (0, 1, 0). Returns the energies and the
+    forces of the images."""
+
+    x, y, z = bq[:, 0], bq[:, 1], bq[:, 2]
+    r2 = x ** 2 + y ** 2
+    r = np.sqrt(r2)
+    be = 2.0 * (r - 1.0) ** 2 + y ** 2 / r2 + z ** 2
+    bf = np.zeros(bq.shape)
+    bf[:, 0] = -4.0 * (r - 1.0) * x / r + 2.0 * x * y ** 2 / r2 ** 2
+    bf[:, 1] = -4.0 * (r - 1.0) * y / r - 2.0 * y / r2 + 2.0 * y ** 3 / r2 ** 2
+    bf[:, 2] = -2.0 * z
+    return be, bf
+
+
+def test_tangents():
+    """Checks the upwind tangents, by projecting random forces out of them
+    without springs."""
+
+    bq = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 2.0, 0.0],
+                   [3.0, 2.0, 0.0], [3.0, 2.0, 1.0]])
+    bf = np.random.RandomState(12345).normal(size=bq.shape)
+    # rises, rises, peaks, falls
+    be = np.array([0.0, 1.0, 2.0, 5.0, 4.0])
+
+    nf = neb_forces(bq, bf.copy(), be, 0.0)
+
+    # towards the higher neighbour while the energy rises, and weighted by
+    # the energy differences at the maximum
+    tau = np.array([[0.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 0.0, 0.0],
+                    [2.0 * 1.0, 0.0, 3.0 * 1.0], [0.0, 0.0, 0.0]])
+    tau[3] /= np.linalg.norm(tau[3])
+    ref = bf - (bf * tau).sum(axis=1)[:, np.newaxis] * tau
+    assert_allclose(nf, ref)
+
+    # the end images keep their true forces
+    assert_allclose(nf[[0, -1]], bf[[0, -1]])
+
+
+def test_springs():
+    """Checks that without true forces the springs act along the tangents,
+    and that the climbing image feels no spring but climbs instead."""
+
+    bq = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [3.0, 0.0, 0.0],
+                   [4.0, 0.0, 0.0]])
+    be = np.array([0.0, 1.0, 0.5, 0.0])
+
+    nf = neb_forces(bq, np.zeros(bq.shape), be, 2.0)
+    assert_allclose(nf[1], [2.0 * (2.0 - 1.0), 0.0, 0.0])
+    assert_allclose(nf[2], [2.0 * (1.0 - 2.0), 0.0, 0.0])
+
+    bf = np.array([[0.0, 0.0, 0.0], [0.3, 0.4, 0.0], [0.1, 0.0, 0.0],
+                   [0.0, 0.0, 0.0]])
+    nf = neb_forces(bq, bf.copy(), be, 2.0, climb=True)
+    assert_allclose(nf[1], [-0.3, 0.4, 0.0])
+    assert_allclose(nf[2], [0.0 + 2.0 * (1.0 - 2.0), 0.0, 0.0])
+
+
+def test_band_relaxation():
+    """Relaxes a band on the analytic potential: the images must reach the
+    minimum energy path, evenly spaced by the springs, and the climbing
+    image the saddle point."""
+
+    nimg = 9
+    bq = np.zeros((nimg, 3))
+    bq[:, 0] = np.linspace(-1.0, 1.0, nimg)
+    bq[1:-1, 1] = 0.5
+    bq[1:-1, 2] = np.linspace(-0.1, 0.2, nimg - 2)
+
+    for climb in [False, True]:
+        q = bq.copy()
+        for i in range(5000):
+            be, bf = potential(q)
+            nf = neb_forces(q, bf, be, 1.0, climb)
+            q += 0.02 * nf
+
+        assert_allclose(nf, 0.0, atol=1e-8)
+        # the upwind tangents are one-sided, so the band cuts the corners
+        # of the path by a fraction of the sagitta between the images
+        assert_allclose(np.sqrt((q[:, :2] ** 2).sum(axis=1)), 1.0, atol=5e-2)
+        assert_allclose(q[:, 2], 0.0, atol=1e-8)
+        if climb:
+            assert_allclose(q[nimg // 2], [0.0, 1.0, 0.0], atol=1e-8)
+        else:
+            d = np.sqrt(((q[1:] - q[:-1]) ** 2).sum(axis=1))
+            assert_allclose(d, d.mean(), rtol=1e-2)
@@ -0,0 +1,47 @@
+"""Tests the FFT normal mode transformation against the matrix one."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.utils import nmtransform
+
+
+def check_fft_vs_matrix(nbeads, natoms, open_paths=None):
+    """Checks that nm_fft and nm_trans give the same transformations.
+
+    Args:
+       nbeads: The number of beads.
+       natoms: The number of atoms.
+       open_paths: An optional list of atoms treated as open paths.
+    """
+
+    ref = nmtransform.nm_trans(nbeads, open_paths=open_paths)
+    fft = nmtransform.nm_fft(nbeads, natoms, open_paths=open_paths)
+
+    q = np.random.uniform(-10.0, 10.0, (nbeads, 3 * natoms))
+    qnm = ref.b2nm(q)
+    assert_allclose(fft.b2nm(q), qnm, rtol=0, atol=1e-12)
+    assert_allclose(fft.nm2b(qnm), ref.nm2b(qnm), rtol=0, atol=1e-12)
+
+    # the results live in reusable buffers, so the round trip must still work
+    # when the output of one call is fed into the next one
+    assert_allclose(fft.nm2b(fft.b2nm(q).copy()), q, rtol=0, atol=1e-12)
+
+
+def test_closed_paths():
+    """FFT transformation of closed paths, even and odd number of beads."""
+
+    for nbeads in [1, 2, 3, 4, 5, 8, 17, 32]:
+        check_fft_vs_matrix(nbeads, 7)
+
+
+def test_open_paths():
+    """FFT transformation with some of the atoms treated as open paths."""
+
+    for nbeads in [2, 3, 4, 9, 16]:
+        check_fft_vs_matrix(nbeads, 7, open_paths=[0, 3, 6])
@@ -0,0 +1,218 @@
+"""Tests the background writer of the output streams, and the trajectory
+outputs."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+from ipi.utils.depend import dstrip
+from ipi.engine.beads import Beads
+from ipi.engine.cell import Cell
+from ipi.engine.simulation import Simulation
+from ipi.engine.forcefields import FFLennardJones, FFGridMetaD
+from ipi.engine.outputs import OutputWriter, TrajectoryOutput, CheckpointOutput
+from ipi.inputs.simulation import InputSimulation
+
+
+def test_writer():
+    """Checks that the writer keeps the order of the writes to each stream,
+    and completes them before closing the streams."""
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        names = [os.path.join(tmpdir, "out_%d" % i) for i in range(3)]
+        streams = [open(fn, "w") for fn in names]
+
+        # a tiny queue, so that the writes also wait for the writer
+        writer = OutputWriter(fsync_time=-1.0, fsync_bytes=100, queue_size=2)
+        writer.start()
+        for i in range(200):
+            for s in streams:
+                writer.write(s, "%d\n" % i)
+        writer.drain()
+        with open(names[0]) as f:
+            assert f.read() == "".join(["%d\n" % i for i in range(200)])
+
+        writer.write(streams[1], "end\n")
+        for s in streams:
+            writer.close(s)
+        writer.stop()
+        assert all([s.closed for s in streams])
+        with open(names[1]) as f:
+            assert f.read().split() == [str(i) for i in range(200)] + ["end"]
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+class DummyTrajs(object):
+
+    def __init__(self, beads):
+        self.beads = beads
+        self.traj_dict = {"positions": None}
+
+    def __getitem__(self, key):
+        return dstrip(self.beads.q), "length", "automatic"
+
+
+class DummySimulation(object):
+
+    step = 0
+
+
+class DummySystem(object):
+
+    def __init__(self, natoms, nbeads):
+        self.beads = Beads(natoms, nbeads)
+        self.beads.names[:] = ["H"] * natoms
+        self.beads.names[0] = "D"
+        self.cell = Cell(np.eye(3) * 10.0)
+        self.trajs = DummyTrajs(self.beads)
+        self.simul = DummySimulation()
+
+
+def test_traj_names():
+    """Checks that the trajectories follow the changes of the atom names,
+    as in alchemical exchanges."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        system = DummySystem(3, 2)
+        out = TrajectoryOutput(filename="traj", what="positions", format="xyz", ibead=0)
+        out.bind(system)
+        out.write()
+        system.beads.names[[0, 2]] = ["H", "D"]
+        system.simul.step += 1
+        out.write()
+        out.close_stream()
+        with open("traj_0.xyz") as f:
+            lines = f.read().split("\n")
+        names = [l.split()[0] for l in lines[2:5] + lines[7:10]]
+        assert names == ["D", "H", "H", "H", "H", "D"]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+class DummyFFSimulation(object):
+
+    def __init__(self, fflist):
+        self.syslist = []
+        self.smotion = None
+        self.fflist = fflist
+
+
+def test_snapshot_gridmetad():
+    """Checks that the checkpoints do not snapshot the state of a simulation
+    with a grid metadynamics bias, whose grid is not a depend object."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        with open("ghts.json", "w") as f:
+            json.dump({"stage": {"name": "metad"},
+                       "ghts": {"z": [2.0, 0.5], "n": [1.0, 1.0], "M": [[1.0, 0.0], [0.0, 2.0]]},
+                       "CV": [{"kind": "distance", "atoms": [1, 2]}, {"kind": "angle", "atoms": [1, 2, 3]}]}, f)
+
+        fflist = {"lj": FFLennardJones(name="lj", pars={"eps": 0.1, "sigma": 1.0})}
+        chk = CheckpointOutput()
+        chk.simul = DummyFFSimulation(fflist)
+        assert chk._can_snapshot()
+
+        fflist["bias"] = FFGridMetaD(name="bias", ghts_input="ghts.json", coordinate="cv",
+                                     grid_min=[0.0, 0.0], grid_max=[5.0, 3.2], grid_bins=[60, 50],
+                                     height=0.01, width=[0.3, 0.2], pace=2)
+        assert not chk._can_snapshot()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+simulation_xml = """
+<simulation verbosity='quiet' threading='False'>
+   <output prefix='snap'></output>
+   <total_steps> 10 </total_steps>
+   <prng><seed> 12345 </seed></prng>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   <system>
+      <initialize nbeads='4'>
+         <file mode='xyz' units='atomic_unit'> init.xyz </file>
+         <velocities mode='thermal' units='kelvin'> 20 </velocities>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> 20 </temperature>
+      </ensemble>
+      <motion mode='dynamics'>
+         <dynamics mode='nvt'>
+            <thermostat mode='pile_l'>
+               <tau units='femtosecond'> 100 </tau>
+            </thermostat>
+            <timestep units='femtosecond'> 1.0 </timestep>
+         </dynamics>
+      </motion>
+   </system>
+</simulation>
+"""
+
+
+def test_snapshot_restore():
+    """Checks that the soft-exit checkpoint holds the state stored at the
+    beginning of the step, and that writing it leaves the simulation as it
+    is."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        with open("init.xyz", "w") as f:
+            f.write("3\n# CELL(abcABC):  100.0  100.0  100.0  90.0  90.0  90.0\n")
+            for x in [[0.0, 0.0, 0.0], [7.0, 0.0, 0.0], [0.0, 7.5, 0.0]]:
+                f.write("Ar %f %f %f\n" % tuple(x))
+        with open("input.xml", "w") as f:
+            f.write(simulation_xml)
+        simul = Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+        for ff in simul.fflist.values():
+            ff.run()
+
+        motion = simul.syslist[0].motion
+        motion.step(step=0)
+        simul.step = 1
+        simul.chk.store()
+        assert simul.chk.snapshot is not None
+        ref = InputSimulation()
+        ref.store(simul)
+        ref = ref.write(name="simulation")
+
+        for simul.step in range(1, 3):
+            motion.step(step=simul.step)
+        q = dstrip(simul.syslist[0].beads.q).copy()
+        pnm = dstrip(simul.syslist[0].nm.pnm).copy()
+        ethermo = motion.thermostat.ethermo
+        state = simul.prng.state
+
+        simul.chk.restore()
+        assert simul.chk.status.write(name="simulation") == ref
+        assert (dstrip(simul.syslist[0].beads.q) == q).all()
+        assert (dstrip(simul.syslist[0].nm.pnm) == pnm).all()
+        assert motion.thermostat.ethermo == ethermo
+        assert (simul.prng.state[1] == state[1]).all() and simul.step == 2
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,53 @@
+"""Tests the finite differences of the scaled-coordinates estimators."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.properties import Properties, getall
+
+
+class Dummy(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def make_properties():
+    """Returns a Properties object whose scaled potentials follow a
+    quadratic in dbeta, and records the finite differences it asks for."""
+
+    prop = Properties()
+    prop.ensemble = Dummy(temp=1e-3)
+    prop.forces = Dummy(pot=2.0, potsc=0.0)
+    prop.beads = Dummy(nbeads=2, natoms=1)
+    prop.requests = []
+
+    def get_scaled_pots(dbetas, suzuki_chin=False):
+        prop.requests.append(list(dbetas))
+        return [(1.0 + 0.5 * d + d ** 2, 1.0 - 0.5 * d + d ** 2) for d in dbetas]
+
+    prop.get_scaled_pots = get_scaled_pots
+    return prop
+
+
+def test_yama_string_args():
+    """Checks that the arguments parsed from a property string are used,
+    including a negative fd_delta, which enables fd_levels."""
+
+    for name in ["get_yama_estimators", "get_scyama_estimators"]:
+        prop = make_properties()
+        (pname, unit, arglist, kwarglist) = getall("kinetic_yama(fd_delta=-0.01;fd_levels=3)")
+        assert kwarglist == {"fd_delta": "-0.01", "fd_levels": "3"}
+        getattr(prop, name)(*arglist, **kwarglist)
+        assert_allclose(prop.requests[0], [0.01, 0.005, 0.0025])
+
+        # a positive delta is used as it is
+        prop = make_properties()
+        eps = getattr(prop, name)(fd_delta="0.01", fd_levels="3")
+        assert_allclose(prop.requests, [[0.01]])
+        assert np.isfinite(eps).all()
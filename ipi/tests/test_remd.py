@@ -0,0 +1,276 @@
+"""Tests the acceptance of the exchanges between replicas."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import signal
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+import ipi.utils.softexit
+from ipi.engine.simulation import Simulation
+from ipi.engine.ensembles import ensemble_swap
+from ipi.engine.smotion.remd import exchange_probabilities
+
+
+system_xml = """
+   <system prefix="%d">
+      <initialize nbeads='4'>
+         <file mode='xyz' units='atomic_unit'> init.xyz </file>
+         <velocities mode='thermal' units='kelvin'> %f </velocities>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> %f </temperature>
+      </ensemble>
+      <motion mode='dynamics'>
+         <dynamics mode='nvt'>
+            <thermostat mode='langevin'>
+               <tau units='femtosecond'> 100 </tau>
+            </thermostat>
+            <timestep units='femtosecond'> 1.0 </timestep>
+         </dynamics>
+      </motion>
+   </system>
+"""
+
+simulation_xml = """
+<simulation verbosity='quiet' threading='False'>
+   <output prefix='remd'>%s</output>
+   <total_steps> %d </total_steps>
+   <prng><seed> %d </seed></prng>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   %s
+   <smotion mode="remd">
+      <remd>
+         <stride> 1 </stride>%s
+      </remd>
+   </smotion>
+</simulation>
+"""
+
+
+def load_remd(temps, outputs="", options="", steps=1, seed=12345, run=True):
+    """Sets up a replica exchange simulation of a small Lennard-Jones
+    cluster at the given temperatures, with different configurations in
+    the different replicas. The forcefields are started if run is True."""
+
+    natoms = 8
+    q = 7.0 * np.array([[i, j, k] for i in range(2) for j in range(2) for k in range(2)], float)
+    with open("init.xyz", "w") as f:
+        f.write("%d\n# CELL(abcABC):  100.0  100.0  100.0  90.0  90.0  90.0\n" % natoms)
+        for x in q:
+            f.write("Ar %f %f %f\n" % tuple(x))
+    with open("input.xml", "w") as f:
+        systems = "".join([system_xml % (k, t, t) for k, t in enumerate(temps)])
+        f.write(simulation_xml % (outputs, steps, seed, systems, options))
+
+    simul = Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+    rs = np.random.RandomState(12345)
+    for s in simul.syslist:
+        s.beads.q += rs.normal(0.0, 0.3, s.beads.q.shape)
+    if run:
+        for ff in simul.fflist.values():
+            ff.run()
+    return simul
+
+
+def run_in_tmpdir(test, *args, **kwargs):
+    """Runs a test in a temporary directory, and stops the forcefields."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        simul = load_remd(*args, **kwargs)
+        test(simul)
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def check_vectorized(simul):
+    rex = simul.smotion
+    assert rex.temperature_only()
+    nbeads = simul.syslist[0].beads.nbeads
+    nrep = len(simul.syslist)
+    pi, pj = np.arange(nrep - 1), np.arange(1, nrep)
+
+    for rescalekin in [True, False]:
+        rex.rescalekin = rescalekin
+        pxc = exchange_probabilities(*(rex.energies() + (nbeads, rescalekin, pi, pj)))
+
+        # the same probabilities, from actually swapping the ensembles
+        pswap = []
+        for i, j in zip(pi, pj):
+            lpens = simul.syslist[i].ensemble.lpens + simul.syslist[j].ensemble.lpens
+            p = simul.syslist[i].beads.p.copy()
+            rex.swap_ensembles(i, j)
+            newlpens = simul.syslist[i].ensemble.lpens + simul.syslist[j].ensemble.lpens
+            rex.swap_ensembles(i, j)
+            assert_allclose(simul.syslist[i].beads.p, p)
+            pswap.append(min(1.0, np.exp(newlpens - lpens)))
+
+        assert_allclose(pxc, pswap, rtol=1e-8)
+        assert (pxc < 1.0).any()
+
+
+def test_vectorized_probabilities():
+    """Checks the vectorized exchange probabilities against the ones
+    obtained by swapping the ensembles of each pair."""
+
+    run_in_tmpdir(check_vectorized, [15.0, 20.0, 28.0, 40.0])
+
+
+def check_eligibility(simul):
+    rex = simul.smotion
+    assert rex.temperature_only()
+
+    # the dynamical masses change with the temperature
+    simul.syslist[1].nm.mode = "pa-cmd"
+    assert not rex.temperature_only()
+    simul.syslist[1].nm.mode = "rpmd"
+
+    # the stress is not exchanged by the closed form
+    simul.syslist[2].ensemble.stressext = np.eye(3) * 1e-5
+    assert not rex.temperature_only()
+
+
+def test_eligibility():
+    """Checks that the closed form of the exchange probabilities is only
+    used for ensembles that differ only by their temperature."""
+
+    run_in_tmpdir(check_eligibility, [15.0, 20.0, 28.0])
+
+
+def check_two_replicas(simul):
+    s0, s1 = simul.syslist
+    e0, e1 = s0.ensemble, s1.ensemble
+    nbeads = s0.beads.nbeads
+    temp = np.asarray([e0.temp, e1.temp])
+    lpens = np.asarray([e0.lpens, e1.lpens])
+    upot = np.asarray([e.forces.pot + e.bias.pot for e in (e0, e1)])
+    wspring = np.asarray([s.beads.vpath * s.nm.omegan2 for s in (s0, s1)])
+
+    for rescalekin in [True, False]:
+        pxc = exchange_probabilities(temp, lpens, upot, wspring, nbeads, rescalekin, np.array([0]), np.array([1]))
+
+        # swaps the ensembles by hand, and rescales the momenta to the new
+        # temperatures if required
+        p0, p1 = s0.beads.p.copy(), s1.beads.p.copy()
+        ensemble_swap(e0, e1)
+        if rescalekin:
+            s0.beads.p *= np.sqrt(temp[1] / temp[0])
+            s1.beads.p *= np.sqrt(temp[0] / temp[1])
+        newlpens = e0.lpens + e1.lpens
+        ensemble_swap(e0, e1)
+        s0.beads.p, s1.beads.p = p0, p1
+
+        assert_allclose(pxc[0], min(1.0, np.exp(newlpens - lpens.sum())), rtol=1e-8)
+
+
+def test_two_replicas():
+    """Checks the exchange probability of two replicas against the one
+    obtained from the ensembles swapped by hand."""
+
+    run_in_tmpdir(check_two_replicas, [20.0, 20.5])
+
+
+def check_no_checkpoints(simul):
+    try:
+        simul.smotion.spawn(simul)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Distributed replica exchange accepted a checkpoint output")
+
+
+def test_distributed_checkpoints():
+    """Checks that checkpoints are rejected before the replicas are
+    distributed over processes, as they could not restart the run."""
+
+    run_in_tmpdir(check_no_checkpoints, [15.0, 25.0],
+                  outputs="<checkpoint filename='chk' stride='10'/>", options="<workers> 2 </workers>")
+
+
+def run_distributed(steps, stop=None):
+    """Runs four replicas in two worker processes, and returns the
+    exchanges written by the coordinator. If stop is not None, the second
+    worker stops after that number of steps."""
+
+    simul = load_remd([15.0, 16.0, 17.0, 18.0], options="<workers> 2 </workers>", steps=steps, run=False)
+    rex = simul.smotion
+    if stop is not None:
+        run_worker = rex.run_worker
+
+        def stopping_worker(simul, k, block, seed, conn):
+            if k == 1:
+                simul.tsteps = stop
+            run_worker(simul, k, block, seed, conn)
+
+        rex.run_worker = stopping_worker
+
+    def hang(sig, frame):
+        raise AssertionError("The replica exchange workers did not stop")
+
+    # the workers wait for their soft exit monitor to wake up before exiting
+    latency = ipi.utils.softexit.SOFTEXITLATENCY
+    ipi.utils.softexit.SOFTEXITLATENCY = 0.1
+    handlers = [(s, signal.getsignal(s)) for s in [signal.SIGINT, signal.SIGTERM, signal.SIGALRM]]
+    signal.signal(signal.SIGALRM, hang)
+    signal.alarm(120)
+    try:
+        simul.run()
+    finally:
+        signal.alarm(0)
+        for s, h in handlers:
+            signal.signal(s, h)
+        ipi.utils.softexit.SOFTEXITLATENCY = latency
+
+    with open("PARATEMP") as f:
+        return [[int(x) for x in l.split()] for l in f.readlines()]
+
+
+def in_tmpdir(test, *args):
+    """Runs a function in a temporary directory, and returns its result."""
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        return test(*args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def test_distributed_seed():
+    """Checks that two runs with the replicas in worker processes and the
+    same seed give the same exchanges."""
+
+    swaps = [in_tmpdir(run_distributed, 10) for i in range(2)]
+    assert len(swaps[0]) > 0
+    assert swaps[0] == swaps[1]
+    for l in swaps[0]:
+        assert sorted(l[1:]) == range(4)
+
+
+def test_distributed_stop():
+    """Checks that a worker that stops ends the other workers and the
+    coordinator."""
+
+    swaps = in_tmpdir(run_distributed, 20, 3)
+    # the exchanges of the steps before the worker stopped are kept
+    assert len(swaps) > 0 and max([l[0] for l in swaps]) < 3
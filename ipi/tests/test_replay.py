@@ -0,0 +1,102 @@
+"""Tests the replay of a trajectory with the forces of several frames in
+flight."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.simulation import Simulation
+from ipi.utils.depend import dstrip
+
+
+simulation_xml = """
+<simulation verbosity='quiet' threading='False'>
+   <output prefix='replay'></output>
+   <total_steps> 10 </total_steps>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   <system>
+      <initialize nbeads='1'>
+         <file mode='xyz' units='atomic_unit'> traj.xyz </file>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> 20 </temperature>
+      </ensemble>
+      <motion mode='replay'>
+         <file mode='xyz' units='atomic_unit'> traj.xyz </file>
+         <replay_window> 4 </replay_window>
+      </motion>
+   </system>
+</simulation>
+"""
+
+
+def test_window():
+    """Checks that the steps get the forces of their own frames, and that
+    the requests of the frames read ahead are withdrawn when they are
+    released and when the trajectory ends."""
+
+    nframes = 6
+    rs = np.random.RandomState(12345)
+    q0 = 7.0 * np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    frames = [q0 + rs.normal(0.0, 0.3, q0.shape) for i in range(nframes)]
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        with open("traj.xyz", "w") as f:
+            for q in frames:
+                f.write("3\n# CELL(abcABC):  100.0  100.0  100.0  90.0  90.0  90.0\n")
+                for x in q:
+                    f.write("Ar %f %f %f\n" % tuple(x))
+        with open("input.xml", "w") as f:
+            f.write(simulation_xml)
+        simul = Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+        ff = simul.fflist["lj"]
+        ff.run()
+
+        motion = simul.syslist[0].motion
+        forces = simul.syslist[0].forces
+        ref = forces.copy(simul.syslist[0].beads.copy(), simul.syslist[0].cell.copy())
+
+        for index in [0, 1, 4]:
+            motion._step_window(index)
+            assert_allclose(dstrip(motion.beads.q)[0], frames[index].flatten(), atol=1e-6)
+            ref.beads.q = dstrip(motion.beads.q)
+            assert_allclose(dstrip(forces.f), dstrip(ref.f))
+            # the frames read ahead are still queued
+            assert len(ff.requests) == len(motion._pending)
+        assert [i for i, c in motion._pending] == [5]
+        motion.release()
+        assert len(motion._pending) == 0 and len(ff.requests) == 0
+
+        # the withdrawn frame is read and computed again
+        motion._step_window(5)
+        ref.beads.q = dstrip(motion.beads.q)
+        assert_allclose(dstrip(forces.f), dstrip(ref.f))
+
+        try:
+            motion._step_window(nframes)
+            assert False
+        except EOFError:
+            pass
+        assert len(motion._pending) == 0 and len(ff.requests) == 0
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+            simul.syslist[0].motion.reader.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
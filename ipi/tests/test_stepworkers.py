@@ -0,0 +1,70 @@
+"""Tests the threads that step several systems at once."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import threading
+
+from ipi.engine.simulation import StepWorkers
+
+
+class DummyMotion(object):
+
+    def __init__(self, action=None):
+        self.action = action
+        self.nsteps = 0
+
+    def step(self, step=None):
+        if self.action is not None:
+            self.action()
+        self.nsteps += 1
+
+
+class DummySystem(object):
+
+    def __init__(self, motion, prefix):
+        self.motion = motion
+        self.prefix = prefix
+
+
+def test_step():
+    """Checks that all the systems are stepped at each step."""
+
+    syslist = [DummySystem(DummyMotion(), "s%d" % i) for i in range(4)]
+    stepper = StepWorkers(syslist)
+    for step in range(10):
+        stepper.step(step)
+    stepper.stop()
+    assert [s.motion.nsteps for s in syslist] == [10] * 4
+
+
+def test_stop_during_step():
+    """Checks that the threads that are stopped before they could start a
+    step are not left pending, and that a step returns once the threads
+    are stopped, as by a soft exit."""
+
+    syslist = [DummySystem(DummyMotion(), "s%d" % i) for i in range(4)]
+    stepper = StepWorkers(syslist)
+
+    # releases a step and stops the threads before any of them wakes up
+    with stepper._cond:
+        stepper._pending = len(syslist) - 1
+        stepper._gen += 1
+        stepper._step = 0
+        stepper._cond.notify_all()
+        stepper._running = False
+    for st in stepper._threads:
+        st.join(5.0)
+        assert not st.is_alive()
+    assert stepper._pending == 0
+    assert [s.motion.nsteps for s in syslist[1:]] == [0] * 3
+
+    # a step with threads that will never complete it must not hang
+    stepper._pending = 0
+    stepping = threading.Thread(target=stepper.step, args=(1,))
+    stepping.daemon = True
+    stepping.start()
+    stepping.join(5.0)
+    assert not stepping.is_alive()
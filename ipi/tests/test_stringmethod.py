@@ -0,0 +1,66 @@
+"""Tests the redistribution of the images of the string method."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ipi.engine.motion.stringmethod import reparametrize, tangents
+
+
+def test_line():
+    """Images that are unevenly spaced on a straight line must end up
+    evenly spaced on the same line, with the end images in place."""
+
+    a = np.array([0.5, -1.0, 2.0, 0.0, 1.0, 3.0])
+    b = np.array([1.5, 2.0, -1.0, 4.0, 1.0, 0.0])
+    s = np.array([0.0, 0.05, 0.1, 0.6, 0.65, 0.9, 1.0])
+    bq = a + s[:, np.newaxis] * (b - a)
+
+    nq = reparametrize(bq)
+    assert_allclose(nq, a + np.linspace(0.0, 1.0, len(s))[:, np.newaxis] * (b - a), atol=1e-12)
+    assert (nq[0] == bq[0]).all() and (nq[-1] == bq[-1]).all()
+
+    # an evenly spaced path is left alone
+    assert_allclose(reparametrize(nq), nq)
+
+
+def test_circle():
+    """Images that are unevenly spaced on an arc of a circle must end up
+    evenly spaced along it, with the end images in place."""
+
+    nimg = 101
+    theta = np.pi * np.linspace(0.0, 1.0, nimg) ** 2
+    bq = np.zeros((nimg, 3))
+    bq[:, 0] = np.cos(theta)
+    bq[:, 1] = np.sin(theta)
+
+    nq = reparametrize(bq)
+    assert (nq[0] == bq[0]).all() and (nq[-1] == bq[-1]).all()
+
+    # the new images lie on the chords between the old ones, so they are
+    # at most a sagitta inside the circle
+    r = np.sqrt((nq ** 2).sum(axis=1))
+    sagitta = 1.0 - np.cos(0.5 * np.diff(theta).max())
+    assert (r <= 1.0 + 1e-12).all() and (r >= 1.0 - sagitta).all()
+    assert_allclose(np.arctan2(nq[:, 1], nq[:, 0]), np.linspace(0.0, np.pi, nimg), atol=1e-3)
+    d = np.sqrt(((nq[1:] - nq[:-1]) ** 2).sum(axis=1))
+    assert_allclose(d, np.pi / (nimg - 1), rtol=1e-2)
+
+    # the tangents are those of the circle, up to the small displacements
+    # of the images off the circle
+    btau = tangents(nq)
+    phi = np.arctan2(nq[:, 1], nq[:, 0])
+    assert_allclose(btau[1:-1], np.array([-np.sin(phi), np.cos(phi), 0.0 * phi]).T[1:-1], atol=5e-3)
+
+
+def test_degenerate():
+    """A path whose images all coincide is returned as it is."""
+
+    bq = np.ones((5, 6))
+    nq = reparametrize(bq)
+    assert_allclose(nq, bq)
+    assert nq is not bq
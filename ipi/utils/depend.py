@@ -16,6 +16,10 @@ normal mode representations of the positions and momenta. In this case any of
 the representations can be set manually, and all the other representations
 must keep in step.
 
+Once the network of dependencies is complete, it can optionally be frozen
+with dfreeze(), so that tainting an object reduces to setting a precomputed set
+of flags rather than walking the network recursively.
+
 For a more detailed discussion, see the reference manual.
 """
 
@@ -26,6 +30,7 @@ For a more detailed discussion, see the reference manual.
 
 import weakref
 import threading
+import copy
 
 import numpy as np
 
@@ -33,7 +38,31 @@ from ipi.utils.messages import verbosity, warning
 
 
 __all__ = ['depend_value', 'depend_array', 'synchronizer', 'dobject', 'dd',
-           'dpipe', 'dcopy', 'dstrip', 'depraise']
+           'dpipe', 'dcopy', 'dstrip', 'depraise', 'dfreeze', 'dthaw', 'depend_snapshot']
+
+
+# Frozen dependency network, see dfreeze(). Maps the id of the tainted flag
+# shared by a group of frozen objects onto a tuple with the flag itself, the
+# flags of all the groups downstream of it, the synchronized objects among
+# them, and the flags and synchronized objects that are checked to skip the
+# tainting when everything downstream is already tainted. Keeping the flag
+# holds it alive, so that its id cannot be reused by another object while
+# the network is frozen.
+_frozen = {}
+
+
+# Snapshots read in place of the live objects, see depend_snapshot.view().
+# Maps the id of a thread onto the snapshot that it reads.
+_views = {}
+
+
+def _isfrozen(tainted):
+    """Returns the frozen entry of a tainted flag, or None."""
+
+    frozen = _frozen.get(id(tainted))
+    if frozen is not None and frozen[0] is tainted:
+        return frozen
+    return None
 
 
 class synchronizer(object):
@@ -161,10 +190,14 @@ class depend_base(object):
 
     def hold(self):
         """ Sets depend object as on hold. """
+        if _frozen:
+            dthaw()
         self._active[:] = False
 
     def resume(self):
         """ Sets depend object as active again. """
+        if _frozen:
+            dthaw()
         self._active[:] = True
         if self._func is None:
             self.taint(taintme=False)
@@ -178,6 +211,8 @@ class depend_base(object):
 
         self._synchro = synchro
         if self._synchro is not None and self._name not in self._synchro.synced:
+            if _frozen and any(_isfrozen(v._tainted) is not None for v in self._synchro.synced.values()):
+                dthaw()
             self._synchro.synced[self._name] = self
             self._synchro.manual = self._name
 
@@ -201,6 +236,8 @@ class depend_base(object):
                 be tainted. True by default.
         """
 
+        if _frozen and _isfrozen(newdep._tainted) is not None:
+            dthaw()
         newdep._dependants.append(weakref.ref(self))
         if tainted:
             self.taint(taintme=True)
@@ -218,6 +255,9 @@ class depend_base(object):
         tainted, as it is assumed that synchro objects only depend on each
         other.
 
+        If the object is part of a frozen network, all the objects downstream
+        are tainted at once using the flags precomputed by dfreeze().
+
         Args:
            taintme: A boolean giving whether self should be tainted at the end.
               True by default.
@@ -226,6 +266,32 @@ class depend_base(object):
         if not self._active:
             return
 
+        if _frozen:
+            frozen = _isfrozen(self._tainted)
+            if frozen is not None:
+                tainted, down, synced, front, fsynced = frozen
+                clean = False
+                for t in front:
+                    if not t[0]:
+                        clean = True
+                        break
+                else:
+                    for t, s, name in fsynced:
+                        if not (t[0] or name == s.manual):
+                            clean = True
+                            break
+                if clean:
+                    for t in down:
+                        t[0] = True
+                    for t, s, name in synced:
+                        if name == s.manual:
+                            t[0] = False
+                if self._synchro is not None:
+                    self._tainted[0] = (taintme and (not self._name == self._synchro.manual))
+                else:
+                    self._tainted[0] = taintme
+                return
+
         self._tainted[:] = True
         for item in self._dependants:
             if (not item()._tainted[0]):
@@ -325,10 +391,18 @@ class depend_value(depend_base):
         is recalculated if tainted.
         """
 
-        with self._threadlock:
+        # in a frozen network only takes the lock if an update is needed
+        if _frozen:
             if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+                with self._threadlock:
+                    if self._tainted[0]:
+                        self.update_auto()
+                        self.taint(taintme=False)
+        else:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
 
         return self._value
 
@@ -555,10 +629,18 @@ class depend_array(np.ndarray, depend_base):
            index: A slice variable giving the appropriate slice to be read.
         """
 
-        with self._threadlock:
+        # in a frozen network only takes the lock if an update is needed
+        if _frozen:
             if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+                with self._threadlock:
+                    if self._tainted[0]:
+                        self.update_auto()
+                        self.taint(taintme=False)
+        else:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
 
         if self.__scalarindex(index, self.ndim):
             return dstrip(self)[index]
@@ -585,10 +667,18 @@ class depend_array(np.ndarray, depend_base):
         # It is worth duplicating this code that is also used in __getitem__ as this
         # is called most of the time, and we avoid creating a load of copies pointing to the same depend_array
 
-        with self._threadlock:
+        # in a frozen network only takes the lock if an update is needed
+        if _frozen:
             if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+                with self._threadlock:
+                    if self._tainted[0]:
+                        self.update_auto()
+                        self.taint(taintme=False)
+        else:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
 
         return self
 
@@ -713,6 +803,8 @@ def dcopy(dfrom, dto):
     Args:
         see dpipe.
     """
+    if _frozen and (_isfrozen(dfrom._tainted) is not None or _isfrozen(dto._tainted) is not None):
+        dthaw()
     dto._dependants = dfrom._dependants
     dto._synchro = dfrom._synchro
     dto.add_synchro(dfrom._synchro)
@@ -726,6 +818,341 @@ def depraise(exception):
     raise exception
 
 
+def _dcollect(roots):
+    """Returns all the depend objects reachable from a list of objects.
+
+    Depend objects, i-PI objects, lists, tuples, sets and dictionaries are
+    explored recursively, following attributes, dependants and
+    synchronizers.
+    """
+
+    nodes = []
+    seen = set()
+    stack = list(roots)
+    while len(stack) > 0:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, depend_base):
+            nodes.append(obj)
+            stack.extend([w() for w in obj._dependants])
+            if obj._synchro is not None:
+                stack.extend(obj._synchro.synced.values())
+        elif isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, ddirect):
+            continue
+        elif type(obj).__module__.startswith("ipi.") and hasattr(obj, "__dict__"):
+            stack.extend(object.__getattribute__(obj, "__dict__").values())
+
+    return nodes
+
+
+def dfreeze(*roots):
+    """Freezes the network of dependencies reachable from some objects.
+
+    Once all the objects have been bound and the network will not change any
+    more, the recursive walk done by taint() can be replaced by a precomputed
+    set of flags. All the depend objects reachable from roots (through
+    attributes, containers, dependants and synchronizers) are collected and
+    grouped by their tainted flag, which is shared between an object and its
+    slices. The closure of the dependants of each group is computed once with
+    bitsets, and from then on tainting a frozen object just sets the flags of
+    all the groups downstream, in a flat loop, unless the objects that
+    immediately follow it show that they are tainted already.
+
+    The network is thawed automatically, falling back to the recursive
+    tainting, if a dependant or a synchronized object is added to a frozen
+    object, or if a frozen object is put on hold or resumed.
+
+    Args:
+        roots: The objects to start the search from. Depend objects, i-PI
+            objects, lists, tuples, sets and dictionaries are explored
+            recursively.
+    """
+
+    dthaw()
+
+    nodes = _dcollect(roots)
+
+    # groups together the objects that share the same flag
+    gid = {}
+    groups = []
+    for d in nodes:
+        if not id(d._tainted) in gid:
+            gid[id(d._tainted)] = len(groups)
+            groups.append([])
+        groups[gid[id(d._tainted)]].append(d)
+    ngroups = len(groups)
+
+    # direct links. objects on hold stop the tainting, so nothing is
+    # propagated through them
+    links = [set() for i in xrange(ngroups)]
+    for i, g in enumerate(groups):
+        for d in g:
+            down = [w() for w in d._dependants]
+            if d._synchro is not None:
+                down += d._synchro.synced.values()
+            for o in down:
+                if o is not None and o._active[0]:
+                    links[i].add(gid[id(o._tainted)])
+
+    # transitive closure as bitsets, iterated until they stop changing
+    closure = [0] * ngroups
+    for i in xrange(ngroups):
+        for j in links[i]:
+            closure[i] |= 1 << j
+    changed = True
+    while changed:
+        changed = False
+        for i in xrange(ngroups):
+            new = closure[i]
+            for j in links[i]:
+                new |= closure[j]
+            if new != closure[i]:
+                closure[i] = new
+                changed = True
+
+    synced = {}
+    for i, g in enumerate(groups):
+        if g[0]._synchro is not None:
+            synced[i] = (g[0]._tainted, g[0]._synchro, g[0]._name)
+
+    for i, g in enumerate(groups):
+        bits = np.frombuffer(bin(closure[i])[:1:-1], dtype="S1")
+        down = np.flatnonzero(bits == "1")
+
+        # the first objects downstream that are not synchronized. if they
+        # are all tainted, and so are the synchronized objects met on the way
+        # (except the manually set ones), then everything downstream is
+        # already tainted and there is nothing to do
+        front = set()
+        fsynced = set()
+        stack = list(links[i])
+        while len(stack) > 0:
+            j = stack.pop()
+            if j == i or j in front or j in fsynced:
+                continue
+            if j in synced:
+                fsynced.add(j)
+                stack.extend(links[j])
+            else:
+                front.add(j)
+
+        _frozen[id(g[0]._tainted)] = (g[0]._tainted,
+                                      [groups[j][0]._tainted for j in down],
+                                      [synced[j] for j in down if j in synced],
+                                      [groups[j][0]._tainted for j in front],
+                                      [synced[j] for j in fsynced])
+
+
+def dthaw():
+    """Thaws a network of dependencies frozen with dfreeze().
+
+    The objects keep their current tainted flags, and go back to the
+    recursive tainting mechanism.
+    """
+
+    _frozen.clear()
+
+
+class depend_snapshot(object):
+
+    """Keeps a copy of the independent quantities reachable from some objects.
+
+    The independent quantities are the depend objects that are not computed
+    from others, and, for each group of synchronized objects, the one that
+    was set last. Their values are copied into preallocated buffers, so that
+    taking a snapshot is cheap, and can be written back to put the objects
+    in the state they had when the snapshot was taken, or read in place of
+    the objects without changing them (see view()). Arrays that share their
+    memory with a larger array in the snapshot are not stored twice.
+
+    Attributes:
+        arrays: A list of the independent depend arrays.
+        values: A list of the independent depend values.
+        synchros: A list of the synchronizers of the synchronized groups.
+    """
+
+    def __init__(self, *roots):
+        """Initialises depend_snapshot.
+
+        Args:
+            roots: The objects to start the search from, as in dfreeze().
+        """
+
+        arrays = []
+        self.values = []
+        self.synchros = []
+        for d in _dcollect(roots):
+            if d._synchro is not None:
+                if not d._synchro in self.synchros:
+                    self.synchros.append(d._synchro)
+            elif d._func is None:
+                if isinstance(d, depend_array):
+                    arrays.append(d)
+                else:
+                    self.values.append(d)
+
+        # largest arrays first, so that slices are dropped in favour of the
+        # array they are taken from
+        arrays.sort(key=lambda d: -d.size)
+        self.arrays = []
+        for d in arrays:
+            if not any([np.may_share_memory(dstrip(d), dstrip(a)) for a in self.arrays]):
+                self.arrays.append(d)
+
+        self._abuf = [np.zeros_like(dstrip(d)) for d in self.arrays]
+        self._vbuf = [None] * len(self.values)
+        self._sbuf = [None] * len(self.synchros)
+        # the synchronized objects copied at each store, besides the one set
+        # last, so that they can be read without converting between them
+        self._snames = [None] * len(self.synchros)
+        for i, sync in enumerate(self.synchros):
+            self._sbuf[i] = (None, {})
+            for name, d in sync.synced.iteritems():
+                if isinstance(d, depend_array):
+                    self._sbuf[i][1][name] = np.zeros_like(dstrip(d))
+            self._snames[i] = []
+            for name in sorted(sync.synced.keys(), key=lambda n: -np.size(dstrip(sync.synced[n]))):
+                d = sync.synced[name]
+                if not isinstance(d, depend_array) or not any([np.may_share_memory(dstrip(d), dstrip(sync.synced[n])) for n in self._snames[i]]):
+                    self._snames[i].append(name)
+        self._vmap = None
+        self._amap = None
+
+    def store(self):
+        """Copies the current values into the snapshot."""
+
+        for d, buf in zip(self.arrays, self._abuf):
+            np.copyto(buf, dstrip(d))
+        for i, d in enumerate(self.values):
+            v = d._value
+            if isinstance(v, (np.ndarray, list, dict)):
+                v = copy.copy(v)
+            self._vbuf[i] = v
+        for i, sync in enumerate(self.synchros):
+            name = sync.manual
+            if name is None:
+                # never set since it was created, so any object will do
+                name = sorted(sync.synced.keys())[0]
+            bufs = self._sbuf[i][1]
+            for n in set(self._snames[i] + [name]):
+                d = sync.synced[n]
+                if isinstance(d, depend_array):
+                    np.copyto(bufs[n], dstrip(d.__get__(None, None)))
+                else:
+                    bufs[n] = copy.copy(d.get())
+            self._sbuf[i] = (name, bufs)
+
+    def restore(self):
+        """Sets the objects to the values in the snapshot, tainting their
+        dependants.
+
+        Only the objects whose value has changed since the snapshot are set.
+        """
+
+        for d, buf in zip(self.arrays, self._abuf):
+            if not np.array_equal(dstrip(d), buf):
+                d.set(buf)
+        for d, v in zip(self.values, self._vbuf):
+            if not _dsame(d._value, v):
+                d.set(v)
+        for sync, (name, bufs) in zip(self.synchros, self._sbuf):
+            if name is None:
+                continue
+            d = sync.synced[name]
+            if sync.manual != name or not _dsame(dstrip(d) if isinstance(d, depend_array) else d._value, bufs[name]):
+                d.set(bufs[name])
+
+    def view(self):
+        """Returns a context in which the objects in the snapshot read as
+        their values in the snapshot, without changing them.
+
+        The values are only seen by the thread that enters the context, and
+        only through the attributes of the objects that hold them, so that
+        other threads can keep working on the objects. Arrays are returned as
+        read-only ndarrays. The objects that are computed from others are
+        read as they are.
+        """
+
+        return _dview(self)
+
+    def _lookup(self, d):
+        """Returns the value of a depend object in the snapshot, or its
+        current value if it is not in the snapshot."""
+
+        if id(d) in self._vmap:
+            return self._vmap[id(d)]
+        if isinstance(d, depend_array):
+            # slices of the arrays in the snapshot
+            sd = dstrip(d)
+            for a, buf in self._amap:
+                if np.may_share_memory(sd, a) and a.flags.c_contiguous and sd.dtype == a.dtype:
+                    off = sd.__array_interface__["data"][0] - a.__array_interface__["data"][0]
+                    if 0 <= off < a.nbytes:
+                        v = np.ndarray(sd.shape, sd.dtype, buffer=buf, offset=off, strides=sd.strides)
+                        v.flags.writeable = False
+                        return v
+        return d.__get__(None, None)
+
+
+class _dview(object):
+
+    """Context manager returned by depend_snapshot.view()."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __enter__(self):
+        snap = self.snapshot
+        arrays = zip(snap.arrays, snap._abuf)
+        vmap = {}
+        for d, v in zip(snap.values, snap._vbuf):
+            vmap[id(d)] = v
+        for i, sync in enumerate(snap.synchros):
+            name, bufs = snap._sbuf[i]
+            if name is None:
+                continue
+            for n in set(snap._snames[i] + [name]):
+                d = sync.synced[n]
+                if isinstance(d, depend_array):
+                    arrays.append((d, bufs[n]))
+                else:
+                    vmap[id(d)] = bufs[n]
+
+        snap._amap = []
+        for d, buf in arrays:
+            v = buf.view()
+            v.flags.writeable = False
+            vmap[id(d)] = v
+            snap._amap.append((dstrip(d), buf))
+        snap._vmap = vmap
+        _views[threading.current_thread().ident] = snap
+        return snap
+
+    def __exit__(self, *args):
+        del _views[threading.current_thread().ident]
+        self.snapshot._vmap = None
+        self.snapshot._amap = None
+
+
+def _dsame(a, b):
+    """Checks whether two values stored in depend objects are the same."""
+
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    try:
+        return bool(a == b)
+    except ValueError:
+        return False
+
+
 class dobject(object):
 
     """Class that allows standard notation to be used for depend objects.
@@ -753,6 +1180,10 @@ class dobject(object):
 
         value = super(dobject, self).__getattribute__(name)
         if issubclass(value.__class__, depend_base):
+            if _views:
+                view = _views.get(threading.current_thread().ident)
+                if view is not None:
+                    return view._lookup(value)
             value = value.__get__(self, self.__class__)
         return value
 
@@ -18,11 +18,13 @@ bad data types, and failure to input required fields.
 # See the "licenses" directory for full license information.
 
 
+import threading
 from copy import copy
 
 import numpy as np
 
 from ipi.utils.io.inputs.io_xml import *
+from ipi.utils.io.inputs.io_npz import npz_read
 from ipi.utils.units import unit_to_internal, unit_to_user
 
 
@@ -940,12 +942,16 @@ class InputArray(InputValue):
        shape: The shape of the array.
     """
 
+    # the npz_archive to which each thread writes the arrays that are large
+    # enough, instead of the xml file. Set while writing a binary checkpoint
+    _archive = threading.local()
+
     attribs = copy(InputValue.attribs)
     attribs["shape"] = (InputAttribute, {"dtype": tuple, "help": "The shape of the array.", "default": (0,)})
     attribs["mode"] = (InputAttribute, {"dtype": str,
                                         "default": "manual",
-                                        "options": ["manual", "file"],
-                                        "help": "If 'mode' is 'manual', then the array is read from the content of 'cell' takes a 9-elements vector containing the cell matrix (row-major). If 'mode' is 'abcABC', then 'cell' takes an array of 6 floats, the first three being the length of the sides of the system parallelopiped, and the last three being the angles (in degrees) between those sides. Angle A corresponds to the angle between sides b and c, and so on for B and C. If mode is 'abc', then this is the same as for 'abcABC', but the cell is assumed to be orthorhombic. 'pdb' and 'chk' read the cell from a PDB or a checkpoint file, respectively."})
+                                        "options": ["manual", "file", "npz"],
+                                        "help": "If 'mode' is 'manual', then the array is read from the content of 'cell' takes a 9-elements vector containing the cell matrix (row-major). If 'mode' is 'abcABC', then 'cell' takes an array of 6 floats, the first three being the length of the sides of the system parallelopiped, and the last three being the angles (in degrees) between those sides. Angle A corresponds to the angle between sides b and c, and so on for B and C. If mode is 'abc', then this is the same as for 'abcABC', but the cell is assumed to be orthorhombic. 'pdb' and 'chk' read the cell from a PDB or a checkpoint file, respectively. If 'mode' is 'npz', the array is read from an uncompressed npz container, given as 'filename:key', as written in binary checkpoint files."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initialises InputArray.
@@ -978,6 +984,17 @@ class InputArray(InputValue):
 
         self.mode.store("manual")  # always store as an explicit array so files are self-contained
 
+    @staticmethod
+    def set_archive(archive):
+        """Sets the npz_archive to which the arrays written by the current
+        thread go, or None to write them to the xml file.
+
+        The archive is specific to the thread, so that checkpoints can be
+        written at the same time from different threads.
+        """
+
+        InputArray._archive.current = archive
+
     def fetch(self):
         """Returns the stored data in the user defined units."""
 
@@ -1008,6 +1025,17 @@ class InputArray(InputValue):
            A string giving the stored value in the appropriate xml format.
         """
 
+        archive = getattr(InputArray._archive, "current", None)
+        if archive is not None and len(self.value) >= archive.minsize:
+            # the data goes to the binary container, and the xml file only
+            # holds a reference to it
+            key = archive.add(self, self.value)
+            self.mode.store("npz")
+            try:
+                return Input.write(self, name=name, indent=indent, text=" " + archive.filename + ":" + key + " ")
+            finally:
+                self.mode.store("manual")
+
         rstr = ""
         if (len(self.value) > ELPERLINE):
             rstr += "\n" + indent + " [ "
@@ -1043,6 +1071,10 @@ class InputArray(InputValue):
             self.value = read_array(self.type, self._text)
         elif mode == "file":
             self.value = np.loadtxt(self._text.strip(), comments="#", dtype=self.type).flatten()
+        elif mode == "npz":
+            # memory-maps the array from the container, given as filename:key
+            filename, key = self._text.strip().rsplit(":", 1)
+            self.value = npz_read(filename, key).reshape(-1)
         else:
             raise ValueError("Unsupported array reading mode")
 
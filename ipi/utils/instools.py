@@ -1,11 +1,17 @@
 import numpy as np
+import struct
 
+from ipi.utils.depend import dstrip
 from ipi.utils.messages import verbosity, info
+from ipi.utils.nmtransform import mk_o_rs_matrix
 from ipi.utils import units
 import ipi.utils.mathtools as mt
 import os.path
 
 
+hessian_magic = "IPIHESS1"
+
+
 def banded_hessian(h, im, shift=0.001):
     """Given Hessian in the reduced format (h), construct
     the upper band hessian including the RP terms"""
@@ -90,74 +96,175 @@ def red2comp(h, nbeads, natoms):
     return h0
 
 
-def get_hessian(h, gm, x0, d=0.0005):
+def interpolate_path(x, nbeads):
+    """Interpolates the half ring polymer to a new number of beads. It is
+    taken to be an open path, as in tools/py/Instanton_interpolation.py
+
+       IN     x       = array with one row per bead
+              nbeads  = new number of beads
+
+       OUT    array with one row per bead of the new path
+        """
+    info(" @Instanton: Interpolating the path to %d beads" % nbeads, verbosity.high)
+    x = dstrip(x)
+    return np.dot(mk_o_rs_matrix(x.shape[0], nbeads), x.reshape((x.shape[0], -1)))
+
+
+def interpolate_hessian(h, natoms, nbeads):
+    """Interpolates the reduced physical hessian to a new number of beads.
+    Each element is interpolated along the path as the positions are.
+
+       IN     h       = reduced physical hessian
+              natoms  = number of atoms
+              nbeads  = new number of beads
+
+       OUT    reduced physical hessian of the new path
+        """
+    ii = natoms * 3
+    h = dstrip(h).reshape((ii, -1, ii)).transpose(1, 0, 2)
+    h = interpolate_path(h, nbeads).reshape((nbeads, ii, ii))
+    return h.transpose(1, 0, 2).reshape((ii, ii * nbeads))
+
+
+def _hessian_record(ncol):
+    """Returns the data type of a row of the hessian checkpoint file."""
+
+    return np.dtype([("index", "<i8"), ("row", "<f8", (ncol,))])
+
+
+def _hessian_header(h, x0, d):
+    """Returns the header of the hessian checkpoint file, which identifies
+    the calculation by the shape of the hessian, the displacement and the
+    reference positions."""
+
+    return hessian_magic + struct.pack("<2qd", h.shape[0], h.shape[1], d) + x0.astype("<f8").tostring()
+
+
+def open_hessian_chk(filename, h, x0, d):
+    """Opens the checkpoint file of a hessian calculation.
+
+    The file contains a header followed by one record per computed row, which
+    are appended as soon as they are known. Since all the records have the
+    same size, the number of rows that were saved follows from the size of the
+    file, and a record that was only partially written is discarded. A file
+    that belongs to a different calculation is overwritten.
+
+    Args:
+        filename: The name of the checkpoint file.
+        h: The hessian, whose rows are filled with the saved values.
+        x0: The positions at which the hessian is computed.
+        d: The finite difference displacement.
+
+    Returns:
+        The file object, open for appending, and the list of the indices of
+        the rows that were read.
+    """
+
+    header = _hessian_header(h, x0, d)
+    dtype = _hessian_record(h.shape[1])
+    done = []
+    try:
+        f = open(filename, "r+b")
+    except IOError:
+        f = open(filename, "w+b")
+
+    if f.read(len(header)) == header:
+        f.seek(0, 2)
+        nrec = (f.tell() - len(header)) // dtype.itemsize
+        f.seek(len(header))
+        records = np.fromfile(f, dtype=dtype, count=nrec)
+        h[records["index"]] = records["row"]
+        done = list(records["index"])
+        f.truncate(len(header) + nrec * dtype.itemsize)
+        if nrec > 0:
+            info(" @Instanton: Found %d rows of the hessian in %s" % (nrec, filename), verbosity.low)
+    else:
+        f.seek(0)
+        f.truncate()
+        f.write(header)
+    f.seek(0, 2)
+    return f, done
+
+
+def get_hessian(h, gm, x0, d=0.0005, asr="none", window=1, chkfile="hessian.tmp"):
     """Compute the physical hessian
+
+       The configurations displaced along the degrees of freedom of up to
+       window rows are queued at the same time, each on its own copy of the
+       forces of the gradient mapper, so that several clients can work at once.
+       Each row is saved in a binary checkpoint file as soon as it is computed,
+       and the rows found in it are not computed again.
+
        IN     h       = physical hessian
               gm      = gradient mapper
               x0      = position vector
+              d       = finite difference displacement
+              asr     = if 'poly' or 'crystal', the potential is taken to be
+                        invariant to translations, and the rows of the last
+                        atom are obtained from the others
+              window  = number of rows computed at the same time
+              chkfile = name of the checkpoint file
 
        OUT    h       = physical hessian
         """
     # TODO What about the case you have numerical gradients?
 
-
     info(" @Instanton: Computing hessian", verbosity.low)
     ii = gm.dbeads.natoms * 3
     h[:] = np.zeros((h.shape), float)
-
-    # Ask Michele about transfer force here I
-    # ddbeads = gm.dbeads.copy()
-    # ddcell = gm.dcell.copy()
-    # ddforces = gm.dforces.copy(ddbeads, ddcell)
-
-
-    i0 = -1
-    #Check if there is a temporal file:
-    for i in range(ii,-1,-1):
-        try:
-            b = np.loadtxt('hessian_' + str(i) + '.tmp')
-        except IOError:
-            pass
-        else:
-            h[:, :] = b[:, :]
-            i0=i
-            print('We have found a temporary file ( hessian_' + str(i) + '.tmp). ')
-            if b.shape == h.shape: #Check that the last temporal file was properly written
-                break
-            else:
-                continue
-
-
-    for j in range(i0+1,ii):
+    x0 = dstrip(x0).copy()
+
+    # the configuration at x0 is computed together with the displaced ones
+    gm.set_pos(x0)
+    gm.dforces.queue()
+
+    # with translational invariance, moving all the atoms leaves the gradient
+    # unchanged, so the rows of one atom are minus the sum of the others
+    inferred = []
+    if asr in ["poly", "crystal"] and gm.dbeads.natoms > 1:
+        inferred = range(ii - 3, ii)
+
+    chk, done = open_hessian_chk(chkfile, h, x0, d)
+    todo = [j for j in range(ii) if j not in done and j not in inferred]
+
+    free = gm.fd_copies(2 * max(window, 1))
+    pending = []
+    while len(todo) > 0 or len(pending) > 0:
+        while len(todo) > 0 and len(free) > 1:
+            j = todo.pop(0)
+            fpm = []
+            for sign in [1.0, -1.0]:
+                f = free.pop()
+                x = x0.copy()
+                x[:, j] = x0[:, j] + sign * d
+                f.beads.q = x
+                f.queue()
+                fpm.append(f)
+            pending.append((j, fpm))
+
+        j, fpm = pending.pop(0)
         info(" @Instanton: Computing hessian: %d of %d" % ((j + 1), ii), verbosity.low)
-        x = x0.copy()
-
-        x[:, j] = x0[:, j] + d
-        e, f1 = gm(x)
-        x[:, j] = x0[:, j] - d
-        e, f2 = gm(x)
+        f1 = -dstrip(fpm[0].f)
+        f2 = -dstrip(fpm[1].f)
+        free += fpm
         g = (f1 - f2) / (2 * d)
 
-
-
         h[j,:] = g.flatten()
 
-        f = open('hessian_'+str(j)+'.tmp', 'w')
-        #print >> f, 'STEP %i' % j
-        np.savetxt(f, h)
-        f.close()
+        record = np.zeros(1, dtype=_hessian_record(h.shape[1]))
+        record["index"] = j
+        record["row"] = h[j]
+        chk.write(record.tostring())
+        chk.flush()
+        os.fsync(chk.fileno())
 
-    u, g = gm(x0)  # Keep the mapper updated
+    for j in inferred:
+        h[j,:] = -h[j % 3:ii - 3:3].sum(axis=0)
 
-    # Ask Michele about transfer force here II
-    # gm.dbeads.q = ddbeads.q
-    # gm.dforces.transfer_forces(ddforces)
+    dstrip(gm.dforces.f)  # Keep the mapper updated
 
-    for i in range(ii):
-        try:
-            os.remove('hessian_' + str(i) + '.tmp')
-        except OSError:
-            pass
+    chk.close()
+    os.remove(chkfile)
 
 def clean_hessian(h, q, natoms, nbeads, m, m3, asr, mofi=False):
     """
@@ -349,7 +456,7 @@ def print_instanton_geo(prefix, step, nbeads, natoms, names, q, pots, cell, shif
 
 def print_instanton_hess(prefix, step, hessian):
 
-    np.set_printoptions(precision=7, suppress=True, threshold=np.nan, linewidth=3000)
+    np.set_printoptions(precision=7, suppress=True, threshold=np.inf, linewidth=3000)
     outfile = open(prefix + '.hess_'+str(step), 'w')
     np.savetxt(outfile, hessian.reshape(1, hessian.size))
     outfile.close()
@@ -0,0 +1,156 @@
+"""Functions used to print trajectories and read configurations in the
+ipibin binary format.
+
+An ipibin file starts with a fixed header, followed by frames that all have
+the same size, so that the frames can be appended to the file one after the
+other, and that frame i starts at a known offset. The header contains, as
+little-endian 8-byte integers, the number of atoms, the width of the atom
+labels, the width of the comment field and the total size of the header,
+followed by the atom labels and padded to a multiple of 8 bytes. Each frame
+contains the cell (9 doubles), the 3*natoms values of the atomic property
+and the comment line. All the frames can be memory-mapped at once with
+mmap_ipibin().
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import sys
+import struct
+
+import numpy as np
+
+from ipi.utils.depend import dstrip
+from ipi.utils.units import Elements
+
+
+__all__ = ['print_ipibin', 'read_ipibin', 'mmap_ipibin', 'ipibin_dtype']
+
+
+magic = "IPIBIN01"
+fmt_sizes = "<4q"
+comment_width = 256
+
+
+def ipibin_dtype(natoms, comment_width=comment_width):
+    """Returns the data type of a frame of an ipibin file.
+
+    Args:
+        natoms: The number of atoms.
+        comment_width: The number of characters of the comment field.
+    """
+
+    return np.dtype([("cell", "<f8", (3, 3)),
+                     ("data", "<f8", (3 * natoms,)),
+                     ("comment", "S%d" % comment_width)])
+
+
+def _header(names):
+    """Returns the header of an ipibin file with the given atom labels."""
+
+    width = max([1] + [len(n) for n in names])
+    labels = np.asarray(names, dtype="S%d" % width).tostring()
+    size = len(magic) + struct.calcsize(fmt_sizes) + len(labels)
+    size += -size % 8
+    header = magic + struct.pack(fmt_sizes, len(names), width, comment_width, size) + labels
+    return header + "\0" * (size - len(header))
+
+
+def _read_header(filedesc):
+    """Reads the header of an ipibin file.
+
+    Args:
+        filedesc: An open readable file object, positioned at the start of
+            the file.
+
+    Returns:
+        The atom labels, the data type of the frames and the size of the header.
+    """
+
+    start = filedesc.read(len(magic) + struct.calcsize(fmt_sizes))
+    if len(start) == 0:
+        raise EOFError("Empty ipibin file")
+    if start[:len(magic)] != magic:
+        raise ValueError("The file is not in the ipibin format")
+    natoms, width, cwidth, size = struct.unpack(fmt_sizes, start[len(magic):])
+    names = np.frombuffer(filedesc.read(natoms * width), dtype="S%d" % width)
+    return names, ipibin_dtype(natoms, cwidth), size
+
+
+def print_ipibin(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
+    """Appends an atomic configuration to an ipibin file.
+
+    The header is written if the file is empty. The stream must therefore
+    report its position correctly with tell().
+
+    Args:
+        atoms: An atoms object giving the atom positions (or properties).
+        cell: A cell object giving the system box.
+        filedesc: An open writable file object. Defaults to standard output.
+        title: This gives a string to be appended to the comment line.
+    """
+
+    try:
+        start = filedesc.tell() == 0
+    except IOError:
+        raise ValueError("The ipibin format can only be written to a seekable stream")
+
+    names = dstrip(atoms.names)
+    if start:
+        filedesc.write(_header(names))
+    if len(title) > comment_width:
+        raise ValueError("The comment line is too long for the ipibin format")
+
+    frame = np.zeros(1, dtype=ipibin_dtype(len(names)))
+    frame["cell"] = dstrip(cell.h) * cell_conv
+    frame["data"] = dstrip(atoms.q) * atoms_conv
+    frame["comment"] = title
+    filedesc.write(frame.tostring())
+
+
+def read_ipibin(filedesc):
+    """Reads the next frame of an ipibin file and returns data in raw format
+    for further units transformation and other post processing.
+
+    Args:
+        filedesc: An open readable file object from an ipibin file.
+
+    Returns:
+        i-PI comment line, cell array, data (positions, forces, etc.), atoms names and masses
+    """
+
+    pos = filedesc.tell()
+    filedesc.seek(0)
+    names, dtype, size = _read_header(filedesc)
+    filedesc.seek(max(pos, size))
+
+    buff = filedesc.read(dtype.itemsize)
+    if len(buff) < dtype.itemsize:
+        raise EOFError
+    frame = np.frombuffer(buff, dtype=dtype)[0]
+    masses = Elements.masses(names)
+
+    return frame["comment"], frame["cell"].copy(), frame["data"].copy(), names, masses
+
+
+def mmap_ipibin(filename):
+    """Maps all the complete frames of an ipibin file in memory.
+
+    Args:
+        filename: The name of the ipibin file.
+
+    Returns:
+        The atom labels, and a read-only record array with one element per
+        frame and the fields "cell", "data" and "comment".
+    """
+
+    with open(filename, "rb") as f:
+        names, dtype, size = _read_header(f)
+        f.seek(0, 2)
+        nframes = (f.tell() - size) // dtype.itemsize
+
+    if nframes == 0:
+        return names, np.zeros(0, dtype=dtype)
+    return names, np.memmap(filename, dtype=dtype, mode="r", offset=size, shape=(nframes,))
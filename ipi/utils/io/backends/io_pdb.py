@@ -20,6 +20,31 @@ from ipi.utils.units import Elements
 __all__ = ['print_pdb_path', 'print_pdb', 'read_pdb']
 
 
+def format_pdb_atoms(fmt_atom, names, qs, first=1):
+    """Formats the ATOM records of a pdb frame.
+
+    All the records are formatted with a single string operation, which is
+    much faster than formatting and writing one atom at a time.
+
+    Args:
+        fmt_atom: The format string of a single ATOM record, taking the
+            serial number, the label and the three coordinates.
+        names: An array with the atom labels.
+        qs: An array with the 3*natoms coordinates to be printed.
+        first: The serial number of the first atom.
+
+    Returns:
+        A string with one ATOM record per atom.
+    """
+
+    natoms = len(names)
+    data = np.empty((natoms, 5), dtype=object)
+    data[:, 0] = np.arange(first, first + natoms)
+    data[:, 1] = names
+    data[:, 2:] = np.reshape(qs, (natoms, 3))
+    return (fmt_atom * natoms) % tuple(data.ravel())
+
+
 def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1.0):
     """Prints all the bead configurations, into a pdb formatted file.
 
@@ -34,7 +59,9 @@ def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
     """
 
     fmt_cryst = "CRYST1%9.3f%9.3f%9.3f%7.2f%7.2f%7.2f%s%4i\n"
-    fmt_atom = "ATOM  %5i %4s%1s%3s %1s%4i%1s  %8.3f%8.3f%8.3f%6.2f%6.2f          %2s%2i\n"
+    # ATOM records with residue 1, occupancy and temperature factor 0, and
+    # the other optional fields left blank
+    fmt_atom = "ATOM  %5i %4s   1     1   %8.3f%8.3f%8.3f  0.00  0.00             0\n"
     fmt_conect = "CONECT%5i%5i\n"
 
     a, b, c, alpha, beta, gamma = mt.h2abc_deg(cell.h * cell_conv)
@@ -44,20 +71,20 @@ def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
 
     natoms = beads.natoms
     nbeads = beads.nbeads
+    qs = dstrip(beads.q) * atoms_conv
+    lab = dstrip(beads.names)
     for j in range(nbeads):
-        for i in range(natoms):
-            qs = dstrip(beads.q) * atoms_conv
-            lab = dstrip(beads.names)
-            data = (j * natoms + i + 1, lab[i], ' ', '  1', ' ', 1, ' ',
-                    qs[j][3 * i], qs[j][3 * i + 1], qs[j][3 * i + 2], 0.0, 0.0, '  ', 0)
-            filedesc.write(fmt_atom % data)
+        filedesc.write(format_pdb_atoms(fmt_atom, lab, qs[j], j * natoms + 1))
 
     if nbeads > 1:
-        for i in range(natoms):
-            filedesc.write(fmt_conect % (i + 1, (nbeads - 1) * natoms + i + 1))
-        for j in range(nbeads - 1):
-            for i in range(natoms):
-                filedesc.write(fmt_conect % (j * natoms + i + 1, (j + 1) * natoms + i + 1))
+        # connects the last bead to the first, then each bead to the next one
+        serial = np.arange(1, nbeads * natoms + 1).reshape((nbeads, natoms))
+        conect = np.empty((nbeads, natoms, 2), dtype=int)
+        conect[0, :, 0] = serial[0]
+        conect[0, :, 1] = serial[-1]
+        conect[1:, :, 0] = serial[:-1]
+        conect[1:, :, 1] = serial[1:]
+        filedesc.write((fmt_conect * (nbeads * natoms)) % tuple(conect.ravel().tolist()))
 
     filedesc.write("END\n")
 
@@ -76,7 +103,9 @@ def print_pdb(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_c
     """
 
     fmt_cryst = "CRYST1%9.3f%9.3f%9.3f%7.2f%7.2f%7.2f%s%4i\n"
-    fmt_atom = "ATOM  %5i %4s%1s%3s %1s%4i%1s   %8.3f%8.3f%8.3f%6.2f%6.2f          %2s%2i\n"
+    # ATOM records with residue 1, occupancy and temperature factor 0, and
+    # the other optional fields left blank
+    fmt_atom = "ATOM  %5i %4s   1     1    %8.3f%8.3f%8.3f  0.00  0.00             0\n"
 
     if title != "":
         filedesc.write("TITLE   %70s\n" % (title))
@@ -86,13 +115,9 @@ def print_pdb(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_c
     z = 1
     filedesc.write(fmt_cryst % (a, b, c, alpha, beta, gamma, " P 1        ", z))
 
-    natoms = atoms.natoms
     qs = dstrip(atoms.q) * atoms_conv
     lab = dstrip(atoms.names)
-    for i in range(natoms):
-        data = (i + 1, lab[i], ' ', '  1', ' ', 1, ' ',
-                qs[3 * i], qs[3 * i + 1], qs[3 * i + 2], 0.0, 0.0, '  ', 0)
-        filedesc.write(fmt_atom % data)
+    filedesc.write(format_pdb_atoms(fmt_atom, lab, qs))
 
     filedesc.write("END\n")
 
@@ -137,23 +162,15 @@ def read_pdb(filedesc):
     h = mt.abc2h(a, b, c, alpha, beta, gamma)
     cell = h
 
-    natoms = 0
+    # collects the ATOM records, and converts their fixed-width fields in bulk
+    lines = []
     body = filedesc.readline()
-    qatoms = []
-    names = []
-    masses = []
     while (body.strip() != "" and body.strip() != "END"):
-        natoms += 1
-        name = body[12:16].strip()
-        names.append(name)
-        masses.append(Elements.mass(name))
-        x = float(body[31:39])
-        y = float(body[39:47])
-        z = float(body[47:55])
-        qatoms.append(x)
-        qatoms.append(y)
-        qatoms.append(z)
-
+        lines.append(body)
         body = filedesc.readline()
 
-    return comment, cell, np.asarray(qatoms), np.asarray(names, dtype='|S4'), np.asarray(masses)
+    names = np.asarray([l[12:16].strip() for l in lines], dtype='|S4')
+    masses = Elements.masses(names)
+    qatoms = np.asarray([x for l in lines for x in (l[31:39], l[39:47], l[47:55])], float)
+
+    return comment, cell, qatoms, names, masses
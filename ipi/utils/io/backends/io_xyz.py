@@ -9,6 +9,7 @@ in the XYZ format.
 
 import sys
 import re
+import itertools
 
 import numpy as np
 
@@ -22,6 +23,27 @@ __all__ = ['print_xyz_path', 'print_xyz', 'read_xyz', 'iter_xyz']
 deg2rad = np.pi / 180.0
 
 
+def format_xyz_atoms(names, qs):
+    """Formats the atom lines of a XYZ frame.
+
+    All the lines are formatted with a single string operation, which is
+    much faster than formatting and writing one atom at a time.
+
+    Args:
+        names: An array with the atom labels.
+        qs: An array with the 3*natoms coordinates to be printed.
+
+    Returns:
+        A string with one line per atom.
+    """
+
+    natoms = len(names)
+    data = np.empty((natoms, 4), dtype=object)
+    data[:, 0] = names
+    data[:, 1:] = np.reshape(qs, (natoms, 3))
+    return ("%8s %12.5e %12.5e %12.5e\n" * natoms) % tuple(data.ravel())
+
+
 def print_xyz_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1.0):
     """Prints all the bead configurations into a XYZ formatted file.
 
@@ -39,12 +61,11 @@ def print_xyz_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
     fmt_header = "%d\n# bead: %d CELL(abcABC): %10.5f  %10.5f  %10.5f  %10.5f  %10.5f  %10.5f \n"
     natoms = beads.natoms
     nbeads = beads.nbeads
+    qs = dstrip(beads.q) * atoms_conv
+    lab = dstrip(beads.names)
     for j in range(nbeads):
         filedesc.write(fmt_header % (natoms, j, a, b, c, alpha, beta, gamma))
-        for i in range(natoms):
-            qs = dstrip(beads.q) * atoms_conv
-            lab = dstrip(beads.names)
-            filedesc.write("%8s %12.5e %12.5e %12.5e\n" % (lab[i], qs[j][3 * i], qs[j][3 * i + 1], qs[j][3 * i + 2]))
+        filedesc.write(format_xyz_atoms(lab, qs[j]))
 
 
 def print_xyz(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
@@ -65,8 +86,7 @@ def print_xyz(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_c
     # direct access to avoid unnecessary slow-down
     qs = dstrip(atoms.q) * atoms_conv
     lab = dstrip(atoms.names)
-    for i in range(natoms):
-        filedesc.write("%8s %12.5e %12.5e %12.5e\n" % (lab[i], qs[3 * i], qs[3 * i + 1], qs[3 * i + 2]))
+    filedesc.write(format_xyz_atoms(lab, qs))
 
 
 # Cell type patterns
@@ -115,30 +135,26 @@ def read_xyz(filedesc):
         h = np.array([[-1.0, 0.0, 0.0], [0.0, -1.0, 0.0], [0.0, 0.0, -1.0]])
     cell = h
 
-    qatoms = np.zeros(3 * natoms)
-    names = np.zeros(natoms, dtype='|S4')
-    masses = np.zeros(natoms)
-
-    # Extracting a time-frame information
-    atom_counter = 0
-    for iat, line in enumerate(filedesc):
-        body = line.split()
-        names[iat], masses[iat] = body[0], Elements.mass(body[0])
-        x, y, z = float(body[1]), float(body[2]), float(body[3])
-
-        # TODO: The following in matrices would use vectorial computaiton
-        if usegenh:
-            # must convert from the input cell parameters to the internal convention
-            u = np.array([x, y, z])
-            us = np.dot(u, invgenh)
-            u = np.dot(h, us)
-            x, y, z = u
-
-        qatoms[3 * iat], qatoms[3 * iat + 1], qatoms[3 * iat + 2] = x, y, z
-        atom_counter += 1
-        if atom_counter == natoms:
-            break
-
-    if natoms != len(names):
+    # reads all the atom lines at once, and converts them in bulk
+    lines = list(itertools.islice(filedesc, natoms))
+    if len(lines) != natoms:
         raise ValueError("The number of atom records does not match the header of the xyz file.")
+    body = "".join(lines).split()
+    if len(body) == 4 * natoms:
+        names = np.asarray(body[0::4], dtype='|S4')
+        del body[0::4]
+    else:
+        # some lines have extra columns, so they must be split one by one
+        body = [line.split() for line in lines]
+        names = np.asarray([b[0] for b in body], dtype='|S4')
+        body = [x for b in body for x in b[1:4]]
+    qatoms = np.asarray(body, float)
+    if len(qatoms) != 3 * natoms:
+        raise ValueError("Malformed atom records in the xyz file.")
+    masses = Elements.masses(names)
+
+    if usegenh:
+        # must convert from the input cell parameters to the internal convention
+        qatoms = np.dot(np.dot(qatoms.reshape((natoms, 3)), invgenh), h.T).reshape(3 * natoms)
+
     return comment, cell, qatoms, names, masses
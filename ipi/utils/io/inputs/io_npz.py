@@ -0,0 +1,131 @@
+"""Functions used to keep the large arrays of the checkpoint files in
+binary npz containers, next to the XML file that refers to them.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2015 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import struct
+import zipfile
+
+import numpy as np
+from numpy.lib import format as npformat
+
+
+__all__ = ['npz_archive', 'npz_write', 'npz_read']
+
+
+class npz_archive(object):
+
+    """Class to collect the arrays to be written to a npz container.
+
+    Attributes:
+        filename: The name of the npz container.
+        minsize: The number of elements below which arrays are not added to
+            the container, but written as text.
+        arrays: A dictionary with the arrays to be written, indexed by key.
+    """
+
+    def __init__(self, filename, minsize=1000):
+        """Initialises npz_archive.
+
+        Args:
+            filename: The name of the npz container.
+            minsize: The smallest number of elements of an array that goes
+                to the container.
+        """
+
+        self.filename = filename
+        self.minsize = minsize
+        self.arrays = {}
+        self._keys = {}
+
+    def add(self, owner, value):
+        """Adds an array to the container.
+
+        Args:
+            owner: The object the array belongs to. The same object always
+                gets the same key, so that writing it twice stores the array
+                only once.
+            value: The array to be stored.
+
+        Returns:
+            The key of the array in the container.
+        """
+
+        if not id(owner) in self._keys:
+            self._keys[id(owner)] = "arr_%d" % len(self._keys)
+        key = self._keys[id(owner)]
+        self.arrays[key] = value
+        return key
+
+    def write(self):
+        """Writes the container to file."""
+
+        npz_write(self.filename, self.arrays)
+
+
+def npz_write(filename, arrays):
+    """Writes some arrays to an uncompressed npz container.
+
+    The container is first written to a temporary file and then moved in
+    place, so that a file with the given name is always complete.
+
+    Args:
+        filename: The name of the container.
+        arrays: A dictionary with the arrays to be written, indexed by key.
+    """
+
+    tmpname = filename + ".tmp"
+    with open(tmpname, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmpname, filename)
+
+
+def npz_read(filename, key, mmap=True):
+    """Reads an array from a npz container.
+
+    Arrays are stored uncompressed by npz_write(), so they can be mapped
+    directly in memory from the container without reading them in full.
+
+    Args:
+        filename: The name of the container.
+        key: The key of the array in the container.
+        mmap: Whether the array should be memory-mapped when possible.
+
+    Returns:
+        The array, as a copy-on-write memory map or as an ordinary array.
+    """
+
+    zf = zipfile.ZipFile(filename)
+    try:
+        info = zf.getinfo(key + ".npy")
+        if mmap and info.compress_type == zipfile.ZIP_STORED:
+            with open(filename, "rb") as f:
+                # skips the local header of the zip entry, whose name and
+                # extra field can differ in length from the central directory
+                f.seek(info.header_offset)
+                header = f.read(30)
+                if header[:4] != "PK\x03\x04":
+                    raise ValueError("Corrupted entry " + key + " in npz container " + filename)
+                nname, nextra = struct.unpack("<HH", header[26:30])
+                f.seek(info.header_offset + 30 + nname + nextra)
+                version = npformat.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = npformat.read_array_header_1_0(f)
+                else:
+                    shape, fortran, dtype = npformat.read_array_header_2_0(f)
+                offset = f.tell()
+            if not dtype.hasobject and np.prod(shape) > 0:
+                # copy-on-write, so that the array can be modified in place
+                # without touching the container
+                return np.memmap(filename, dtype=dtype, mode="c", offset=offset,
+                                 shape=shape, order=("F" if fortran else "C"))
+        return npformat.read_array(zf.open(info))
+    finally:
+        zf.close()
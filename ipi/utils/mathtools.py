@@ -14,7 +14,7 @@ from ipi.utils.messages import verbosity, warning
 
 __all__ = ['matrix_exp', 'stab_cholesky', 'h2abc', 'h2abc_deg', 'abc2h',
            'invert_ut3x3', 'det_ut3x3', 'eigensystem_ut3x3', 'exp_ut3x3',
-           'root_herm', 'logsumlog']
+           'root_herm', 'logsumlog', 'grid_add_gaussian', 'grid_spline']
 
 
 def logsumlog(lasa, lbsb):
@@ -365,3 +365,92 @@ def root_herm(A):
         warning("Checking decomposition after negative eigenvalue: \n" + str(A - np.dot(rv, rv.T)), verbosity.low)
 
     return rv
+
+
+def grid_add_gaussian(grid, lo, dx, center, height, width, cutoff=6.0):
+    """Adds a Gaussian to the values of a function on a regular grid.
+
+    Only the nodes closer to the center than cutoff times the width in
+    every direction are changed. As the Gaussian is a product of
+    one-dimensional ones, it is built as an outer product on that window.
+
+    Args:
+       grid: The values at the nodes, with one axis per dimension. It is
+          changed in place.
+       lo: The coordinates of the first node.
+       dx: The spacing of the nodes along each dimension.
+       center: The center of the Gaussian.
+       height: The height of the Gaussian.
+       width: The standard deviations along each dimension.
+       cutoff: The number of standard deviations after which the Gaussian
+          is neglected.
+    """
+
+    window = []
+    gauss = np.asarray(height, float)
+    for k in range(grid.ndim):
+        first = max(int(np.ceil((center[k] - cutoff * width[k] - lo[k]) / dx[k])), 0)
+        last = min(int(np.floor((center[k] + cutoff * width[k] - lo[k]) / dx[k])), grid.shape[k] - 1)
+        if last < first:
+            return
+        x = lo[k] + dx[k] * np.arange(first, last + 1)
+        gauss = np.multiply.outer(gauss, np.exp(-0.5 * ((x - center[k]) / width[k]) ** 2))
+        window.append(slice(first, last + 1))
+
+    grid[tuple(window)] += gauss
+
+
+def grid_spline(grid, lo, dx, x):
+    """Interpolates a function known on a regular grid with cubic
+    (Catmull-Rom) splines along each dimension.
+
+    Each evaluation uses the 4**ndim nearest nodes, whatever the number of
+    nodes of the grid. Outside of the grid the value at the closest edge is
+    returned, and the gradient along the directions that are out of range
+    vanishes.
+
+    Args:
+       grid: The values at the nodes, with one axis per dimension.
+       lo: The coordinates of the first node.
+       dx: The spacing of the nodes along each dimension.
+       x: The point at which the function is evaluated.
+
+    Returns:
+       The value and the gradient of the interpolated function at x.
+    """
+
+    ndim = grid.ndim
+    nodes = []
+    w = []
+    dw = []
+    for k in range(ndim):
+        n = grid.shape[k]
+        u = (x[k] - lo[k]) / dx[k]
+        inside = (u >= 0.0 and u <= n - 1)
+        u = min(max(u, 0.0), n - 1.0)
+        i = min(int(u), n - 2)
+        t = u - i
+        nodes.append(np.clip(np.arange(i - 1, i + 3), 0, n - 1))
+        w.append(0.5 * np.array([-t ** 3 + 2 * t ** 2 - t,
+                                 3 * t ** 3 - 5 * t ** 2 + 2,
+                                 -3 * t ** 3 + 4 * t ** 2 + t,
+                                 t ** 3 - t ** 2]))
+        if inside:
+            dw.append(0.5 * np.array([-3 * t ** 2 + 4 * t - 1,
+                                      9 * t ** 2 - 10 * t,
+                                      -9 * t ** 2 + 8 * t + 1,
+                                      3 * t ** 2 - 2 * t]) / dx[k])
+        else:
+            dw.append(np.zeros(4))
+
+    block = grid[np.ix_(*nodes)]
+
+    def contract(weights):
+        v = block
+        for wk in weights:
+            v = np.tensordot(wk, v, axes=(0, 0))
+        return v
+
+    value = float(contract(w))
+    grad = np.array([contract(w[:k] + [dw[k]] + w[k + 1:]) for k in range(ndim)])
+    return value, grad
@@ -23,6 +23,8 @@ Functions:
             method with derivatives. Uses 'bracket' function.
         min_approx: Does approximate n-D minimization (line search) based 
             on sufficient function decrease in the search direction
+        min_brent_batch, min_approx_batch: Variants of 'min_brent' and
+            'min_approx' that evaluate several trial points at the same time
         min_trm: Does approximate n-D minimization inside a trust-region
 
         BFGS: Constructs an approximate inverse Hessian to determine 
@@ -480,10 +482,197 @@ def min_approx(fdf, x0, fdf0, d0, big_step, tol, itmax):
     info(" @MINIMIZE: Finished minimization, energy = %f" % fx, verbosity.debug)
     return (x, fx, dfx)
 
+# Line searches with several trial points evaluated at the same time
+
+
+def min_brent_batch(fdf, fdf0, x0, tol, itmax, init_step, npts):
+    """Given a maximum number of iterations and a convergence tolerance,
+     minimizes the specified function like 'min_brent', but evaluates npts
+     trial points at the same time in each iteration.
+     The bracket is extended by golden section steps, and is then narrowed
+     around the best point, using the secant estimate of the minimum from the
+     derivatives and evenly spaced points on the side where the derivative
+     points to.
+     Arguments:
+            x0: initial x-value
+            fdf: function to minimize, which must provide a batch() method
+                 that evaluates it at a list of points at the same time
+            fdf0: initial function value
+            tol: convergence tolerance
+            itmax: maximum allowed iterations
+            init_step: initial step size
+            npts: number of trial points evaluated at the same time
+    """
+
+    gold = 1.618034  # Golden ratio
+    zeps = 1.0e-10  # Safeguard against trying to find fractional precision for min that is exactly zero
+
+    if fdf0 is None: fdf0 = fdf(x0)
+    known = {x0: fdf0}
+
+    # Extend the bracket until the function goes up again.
+    # line holds the points along the search, in order
+    info(" @BRACKET: Started bracketing", verbosity.debug)
+    line = [x0]
+    trial = [x0 + init_step]
+    j = 1
+    while True:
+        while len(trial) < npts:
+            prev = (line + trial)[-2:]
+            trial.append(prev[1] + gold * (prev[1] - prev[0]))
+        for u, fu in zip(trial, fdf.batch(trial)):
+            known[u] = fu
+        line += trial
+        trial = []
+        j += 1
+
+        rise = [i for i in range(1, len(line)) if known[line[i]][0] > known[line[i - 1]][0]]
+        if len(rise) > 0 and rise[0] == 1 and line[0] == x0:
+            # uphill from the start, switch direction
+            line = [line[1], line[0]]
+            trial = [line[1] + gold * (line[1] - line[0])]
+        elif len(rise) > 0:
+            ax, bx, cx = line[rise[0] - 2], line[rise[0] - 1], line[rise[0]]
+            break
+        else:
+            line = line[-2:]
+        if j > itmax:
+            ax, bx, cx = line[-2], line[-1], line[-1]
+            break
+    info(" @BRACKET: Bracketing completed: (%f, %f, %f)" % (ax, bx, cx), verbosity.debug)
+
+    # Narrow the bracket around the best point
+    a, b = min(ax, cx), max(ax, cx)
+    x = bx
+    info(" @MINIMIZE: Started 1D minimization", verbosity.debug)
+    while j <= itmax:
+        fx, dfx = known[x]
+        tol1 = tol * abs(x) + zeps
+        xm = 0.5 * (a + b)
+        if abs(x - xm) <= (2.0 * tol1 - 0.5 * (b - a)):
+            break
+
+        # the minimum is on the downhill side of x
+        if dfx >= 0.0:
+            lo, hi = a, x
+        else:
+            lo, hi = x, b
+
+        trial = []
+        other = lo if dfx >= 0.0 else hi
+        dfo = known[other][1]
+        if dfo != dfx:
+            u = x - dfx * (x - other) / (dfx - dfo)
+            trial += [v for v in (u, u - tol1, u + tol1) if lo + tol1 < v < hi - tol1]
+        trial = trial[:npts]
+        nfill = npts - len(trial)
+        trial += [lo + (hi - lo) * (i + 1.0) / (nfill + 1.0) for i in range(nfill)]
+        trial = [u for u in trial if u not in known]
+        if len(trial) == 0:
+            break
+
+        for u, fu in zip(trial, fdf.batch(trial)):
+            known[u] = fu
+
+        inside = sorted([u for u in known if a <= u <= b])
+        best = min(range(len(inside)), key=lambda i: known[inside[i]][0])
+        x = inside[best]
+        a = inside[max(best - 1, 0)]
+        b = inside[min(best + 1, len(inside) - 1)]
+        j += 1
+
+    if j > itmax:
+        info(" @MINIMIZE: Error -- maximum iterations for minimization (%d) exceeded, exiting minimization" % itmax, verbosity.low)
+    info(" @MINIMIZE: Finished minimization, energy = %f" % known[x][0], verbosity.debug)
+    fdf(x)  # Evaluate again to update lm.dforces object
+
+
+def min_approx_batch(fdf, x0, fdf0, d0, big_step, tol, itmax, npts):
+    """Does the same approximate line search as 'min_approx', but evaluates
+    npts decreasing step lengths at the same time, and takes the longest
+    one that gives a sufficient function decrease. If none does, the next
+    steps are chosen from a quadratic fit to the shortest one.
+        Arguments:
+            fdf: function and its gradient, which must provide a batch()
+                 method that evaluates them at a list of points at the same time
+            fdf0: initial function and gradient value
+            d0: n-dimensional initial direction
+            x0: n-dimensional initial point
+            big_step: maximum step size
+            tol: tolerance for exiting line search
+            itmax: maximum number of iterations for the line search
+            npts: number of step lengths evaluated at the same time
+    """
+
+    # Initializations and constants
+    info(" @MINIMIZE: Started approx. line search", verbosity.debug)
+    n = len(x0.flatten())
+    if fdf0 is None: fdf0 = fdf(x0)
+    f0, df0 = fdf0
+    if d0 is None: d0 = -df0 / np.sqrt(np.dot(df0.flatten(), df0.flatten()))
+    alf = 1.0e-4
+
+    # Step size
+    stepsum = np.sqrt(np.dot(d0.flatten(), d0.flatten()))
+
+    # Scale if attempted step is too large
+    if stepsum > big_step:
+        info(" @MINIMIZE: Scaled step size for line search", verbosity.debug)
+        d0 = np.multiply(d0, big_step / stepsum)
+
+    slope = np.dot(df0.flatten(), d0.flatten())
+
+    if slope >= 0.0:
+        info(" @MINIMIZE: Warning -- gradient is >= 0 (%f)" % slope, verbosity.low)
+
+    test = np.amax(np.divide(np.absolute(d0.flatten()), np.maximum(np.absolute(x0.flatten()), np.ones(n))))
+
+    # Setup to try Newton step first
+    alamin = tol / test
+    alam = 1.0
+
+    # Minimization Loop
+    i = 1
+    while i < itmax:
+        # halves the step down to the first one below the minimum step
+        lams = [alam]
+        while len(lams) < min(npts, itmax - i) and lams[-1] >= alamin:
+            lams.append(0.5 * lams[-1])
+        res = fdf.batch([np.add(x0, (lam * d0)) for lam in lams])
+        info(" @MINIMIZE: Calculated %d energies" % len(lams), verbosity.debug)
+
+        for lam, (fx, dfx) in zip(lams, res):
+            x = np.add(x0, (lam * d0))
+
+            # Check for convergence on change in x
+            if lam < alamin:
+                fdf(x)
+                info(" @MINIMIZE: Convergence in position, exited line search", verbosity.debug)
+                return (x0, fx, dfx)
+
+            # Sufficient function decrease
+            elif fx <= (f0 + alf * lam * slope):
+                fdf(x)
+                info(" @MINIMIZE: Sufficient function decrease, exited line search", verbosity.debug)
+                return (x, fx, dfx)
+
+        # No convergence; backtrack from the shortest step with a quadratic fit,
+        # with a coefficient between 0.1 and 0.5
+        info(" @MINIMIZE: No convergence on step; backtrack to find point", verbosity.debug)
+        tmplam = -slope * lam * lam / (2.0 * (fx - f0 - slope * lam))
+        alam = max(min(tmplam, 0.5 * lam), 0.1 * lam)
+
+        i += len(lams)
+
+    fdf(x)
+    info(" @MINIMIZE: Error - maximum iterations for line search (%d) exceeded, exiting search" % itmax, verbosity.low)
+    info(" @MINIMIZE: Finished minimization, energy = %f" % fx, verbosity.debug)
+    return (x, fx, dfx)
+
 # BFGS algorithm with approximate line search
 
 
-def BFGS(x0, d0, fdf, fdf0, invhessian, big_step, tol, itmax):
+def BFGS(x0, d0, fdf, fdf0, invhessian, big_step, tol, itmax, npts=1):
     """BFGS minimization. Uses approximate line minimizations.
     Does one step.
         Arguments:
@@ -494,6 +683,7 @@ def BFGS(x0, d0, fdf, fdf0, invhessian, big_step, tol, itmax):
             big_step: limit on step length
             tol: convergence tolerance
             itmax: maximum number of allowed iterations
+            npts: number of trial steps of the line search evaluated at the same time
     """
 
     info(" @MINIMIZE: Started BFGS", verbosity.debug)
@@ -506,7 +696,10 @@ def BFGS(x0, d0, fdf, fdf0, invhessian, big_step, tol, itmax):
     big_step = big_step * max(np.sqrt(linesum), n)
 
     # Perform approximate line minimization in direction d0
-    x, u, g = min_approx(fdf, x0, fdf0, d0, big_step, tol, itmax)
+    if npts > 1:
+        x, u, g = min_approx_batch(fdf, x0, fdf0, d0, big_step, tol, itmax, npts)
+    else:
+        x, u, g = min_approx(fdf, x0, fdf0, d0, big_step, tol, itmax)
     d_x = np.subtract(x, x0)
 
     # Update invhessian.
@@ -710,7 +903,7 @@ def min_trm(f, h, tr):
 # L-BFGS algorithm with approximate line search
 
 
-def L_BFGS(x0, d0, fdf, qlist, glist, fdf0, big_step, tol, itmax, m, scale, k):
+def L_BFGS(x0, d0, fdf, qlist, glist, fdf0, big_step, tol, itmax, m, scale, k, npts=1):
     """L-BFGS minimization. Uses approximate line minimizations.
     Does one step.
         Arguments:
@@ -725,6 +918,7 @@ def L_BFGS(x0, d0, fdf, qlist, glist, fdf0, big_step, tol, itmax, m, scale, k):
             big_step = limit on step length
             tol = convergence tolerance
             itmax = maximum number of allowed iterations
+            npts = number of trial steps of the line search evaluated at the same time
     """
 
     zeps = 1.0e-10
@@ -740,7 +934,10 @@ def L_BFGS(x0, d0, fdf, qlist, glist, fdf0, big_step, tol, itmax, m, scale, k):
     big_step = big_step * max(np.sqrt(linesum), n)
 
     # Perform approximate line minimization in direction d0
-    x, u, g = min_approx(fdf, x0, fdf0, d0, big_step, tol, itmax)
+    if npts > 1:
+        x, u, g = min_approx_batch(fdf, x0, fdf0, d0, big_step, tol, itmax, npts)
+    else:
+        x, u, g = min_approx(fdf, x0, fdf0, d0, big_step, tol, itmax)
 
     # Compute difference of positions (gradients)
     # Build list of previous 'd_positions (d_gradients)'
@@ -245,10 +245,15 @@ class nm_rescale(object):  # !! TODO - make compatible with a open path formulat
 #      return np.dot(self._b2tob1,q)
 
 
-class nm_fft(object):  # ! TODO add (matrix-version) of the open path transformation here
+class nm_fft(object):
 
     """Uses Fast Fourier transforms to do normal mode transformations.
 
+    All the work arrays are double precision and are allocated, together with
+    the FFT plans, once for the given number of beads and atoms. The arrays
+    returned by b2nm and nm2b are owned by the transform and are overwritten
+    by the next call, so they must be copied if they have to be kept.
+
     Attributes:
        fft: The fast-Fourier transform function to transform between the
           bead and normal mode representations.
@@ -260,14 +265,18 @@ class nm_fft(object):  # ! TODO add (matrix-version) of the open path transforma
           them to the bead representation.
        nbeads: The number of beads.
        natoms: The number of atoms.
+       _qnm: The buffer that holds the result of b2nm.
+       _ocols: The indices of the columns that belong to open path atoms.
     """
 
     def __init__(self, nbeads, natoms, open_paths=None):
-        """Initializes nm_trans.
+        """Initializes nm_fft.
 
         Args:
            nbeads: The number of beads.
            natoms: The number of atoms.
+           open_paths: An optional list of the indices of the atoms that are
+              treated as open paths.
         """
 
         self.nbeads = nbeads
@@ -275,27 +284,37 @@ class nm_fft(object):  # ! TODO add (matrix-version) of the open path transforma
         if open_paths is None:
             open_paths = []
         self._open = open_paths
-        # for atoms with open path we still use the matrix transformation
+        # for atoms with open path we still use the matrix transformation,
+        # done at once on all the affected columns
         self._b2o_nm = mk_o_nm_matrix(nbeads)
         self._o_nm2b = self._b2o_nm.T
+        self._ocols = (3 * np.asarray(open_paths, int)[:, np.newaxis] + np.arange(3)).flatten()
+
+        # number of modes that have both a cosine and a sine component
+        self._nc = (nbeads - 1) // 2
+        self._qnm = np.zeros((nbeads, 3 * natoms), float)
         try:
             import pyfftw
             info("Import of PyFFTW successful", verbosity.medium)
-            self.qdummy = pyfftw.n_byte_align_empty((nbeads, 3 * natoms), 16, 'float32')
-            self.qnmdummy = pyfftw.n_byte_align_empty((nbeads // 2 + 1, 3 * natoms), 16, 'complex64')
+            if hasattr(pyfftw, "empty_aligned"):
+                empty = lambda shape, dtype: pyfftw.empty_aligned(shape, dtype)
+            else:
+                empty = lambda shape, dtype: pyfftw.n_byte_align_empty(shape, 16, dtype)
+            self.qdummy = empty((nbeads, 3 * natoms), 'float64')
+            self.qnmdummy = empty((nbeads // 2 + 1, 3 * natoms), 'complex128')
             self.fft = pyfftw.FFTW(self.qdummy, self.qnmdummy, axes=(0,), direction='FFTW_FORWARD')
             self.ifft = pyfftw.FFTW(self.qnmdummy, self.qdummy, axes=(0,), direction='FFTW_BACKWARD')
         except ImportError:  # Uses standard numpy fft library if nothing better
                             # is available
             info("Import of PyFFTW unsuccessful, using NumPy library instead", verbosity.medium)
-            self.qdummy = np.zeros((nbeads, 3 * natoms), dtype='float32')
-            self.qnmdummy = np.zeros((nbeads // 2 + 1, 3 * natoms), dtype='complex64')
+            self.qdummy = np.zeros((nbeads, 3 * natoms), dtype='float64')
+            self.qnmdummy = np.zeros((nbeads // 2 + 1, 3 * natoms), dtype='complex128')
 
             def dummy_fft(self):
-                self.qnmdummy = np.fft.rfft(self.qdummy, axis=0)
+                self.qnmdummy[:] = np.fft.rfft(self.qdummy, axis=0)
 
             def dummy_ifft(self):
-                self.qdummy = np.fft.irfft(self.qnmdummy, n=self.nbeads, axis=0)
+                self.qdummy[:] = np.fft.irfft(self.qnmdummy, n=self.nbeads, axis=0)
             self.fft = lambda: dummy_fft(self)
             self.ifft = lambda: dummy_ifft(self)
 
@@ -307,31 +326,24 @@ class nm_fft(object):  # ! TODO add (matrix-version) of the open path transforma
               in the bead representation.
         """
 
-        if self.nbeads == 1:
+        nb = self.nbeads
+        if nb == 1:
             return q
         self.qdummy[:] = q
         self.fft()
-        if self.nbeads == 2:
-            return self.qnmdummy.real / np.sqrt(self.nbeads)
-
-        nmodes = self.nbeads / 2
 
-        self.qnmdummy /= np.sqrt(self.nbeads)
-        qnm = np.zeros(q.shape)
-        qnm[0, :] = self.qnmdummy[0, :].real
-
-        if self.nbeads % 2 == 0:
-            self.qnmdummy[1:-1, :] *= np.sqrt(2)
-            (qnm[1:nmodes, :], qnm[self.nbeads:nmodes:-1, :]) = (self.qnmdummy[1:-1, :].real, self.qnmdummy[1:-1, :].imag)
-            qnm[nmodes, :] = self.qnmdummy[nmodes, :].real
-        else:
-            self.qnmdummy[1:, :] *= np.sqrt(2)
-            (qnm[1:nmodes + 1, :], qnm[self.nbeads:nmodes:-1, :]) = (self.qnmdummy[1:, :].real, self.qnmdummy[1:, :].imag)
-
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            qnm[:, 3 * io] = np.dot(self._b2o_nm, q[:, 3 * io])
-            qnm[:, 3 * io + 1] = np.dot(self._b2o_nm, q[:, 3 * io + 1])
-            qnm[:, 3 * io + 2] = np.dot(self._b2o_nm, q[:, 3 * io + 2])
+        nmodes = nb // 2
+        nc = self._nc
+        qc = self.qnmdummy
+        qnm = self._qnm
+        np.multiply(qc[0].real, np.sqrt(1.0 / nb), out=qnm[0])
+        np.multiply(qc[1:nc + 1].real, np.sqrt(2.0 / nb), out=qnm[1:nc + 1])
+        np.multiply(qc[1:nc + 1].imag, np.sqrt(2.0 / nb), out=qnm[nb - 1:nmodes:-1])
+        if nb % 2 == 0:
+            np.multiply(qc[nmodes].real, np.sqrt(1.0 / nb), out=qnm[nmodes])
+
+        if len(self._ocols) > 0:
+            qnm[:, self._ocols] = np.dot(self._b2o_nm, q[:, self._ocols])
         return qnm
 
     def nm2b(self, qnm):
@@ -342,32 +354,25 @@ class nm_fft(object):  # ! TODO add (matrix-version) of the open path transforma
               in the normal mode representation.
         """
 
-        if self.nbeads == 1:
+        nb = self.nbeads
+        if nb == 1:
             return qnm
-        if self.nbeads == 2:
-            self.qnmdummy[:] = qnm
-            self.ifft()
-            return self.qdummy * np.sqrt(self.nbeads)
-
-        nmodes = self.nbeads / 2
-        odd = self.nbeads - 2 * nmodes  # 0 if even, 1 if odd
-
-        qnm_complex = np.zeros((nmodes + 1, len(qnm[0, :])), complex)
-        qnm_complex[0, :] = qnm[0, :]
-        if not odd:
-            (qnm_complex[1:-1, :].real, qnm_complex[1:-1, :].imag) = (qnm[1:nmodes, :], qnm[self.nbeads:nmodes:-1, :])
-            qnm_complex[1:-1, :] /= np.sqrt(2)
-            qnm_complex[nmodes, :] = qnm[nmodes, :]
-        else:
-            (qnm_complex[1:, :].real, qnm_complex[1:, :].imag) = (qnm[1:nmodes + 1, :], qnm[self.nbeads:nmodes:-1, :])
-            qnm_complex[1:, :] /= np.sqrt(2)
-
-        self.qnmdummy[:] = qnm_complex
+
+        nmodes = nb // 2
+        nc = self._nc
+        # the inverse transform may destroy its input, so the whole
+        # complex buffer is filled at every call
+        qc = self.qnmdummy
+        np.multiply(qnm[0], np.sqrt(nb), out=qc[0].real)
+        qc[0].imag = 0.0
+        np.multiply(qnm[1:nc + 1], np.sqrt(0.5 * nb), out=qc[1:nc + 1].real)
+        np.multiply(qnm[nb - 1:nmodes:-1], np.sqrt(0.5 * nb), out=qc[1:nc + 1].imag)
+        if nb % 2 == 0:
+            np.multiply(qnm[nmodes], np.sqrt(nb), out=qc[nmodes].real)
+            qc[nmodes].imag = 0.0
+
         self.ifft()
-        q = np.zeros(qnm.shape)
-        q = self.qdummy * np.sqrt(self.nbeads)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            q[:, 3 * io] = np.dot(self._o_nm2b, qnm[:, 3 * io])
-            q[:, 3 * io + 1] = np.dot(self._o_nm2b, qnm[:, 3 * io + 1])
-            q[:, 3 * io + 2] = np.dot(self._o_nm2b, qnm[:, 3 * io + 2])
+        q = self.qdummy
+        if len(self._ocols) > 0:
+            q[:, self._ocols] = np.dot(self._o_nm2b, qnm[:, self._ocols])
         return q
@@ -9,6 +9,8 @@ to/from atomic units.
 
 import re
 
+import numpy as np
+
 from ipi.utils.messages import verbosity, info
 
 
@@ -186,6 +188,23 @@ class Elements(dict):
             info("Unknown element given, you must specify the mass", verbosity.low)
             return -1.0
 
+    @classmethod
+    def masses(cls, labels):
+        """Function to access the masses of many atoms at once.
+
+        Each distinct label is only looked up once, which is much faster for
+        large systems than calling mass() for every atom.
+
+        Args:
+            labels: An array with the atomic symbols of the atoms.
+
+        Returns:
+            An array with the masses of the atoms.
+        """
+
+        unique, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        return np.asarray([cls.mass(l) for l in unique], float)[inverse]
+
 
 # these are the conversion FROM the unit stated to internal (atomic) units
 UnitMap = {
@@ -48,7 +48,7 @@ from ipi.utils.units import unit_to_internal, unit_to_user, Constants, Elements
 from ipi.utils.instools import red2comp, clean_hessian
 from ipi.engine.motion.instanton import  SpringMapper
 
-np.set_printoptions(precision=6, suppress=True, threshold=np.nan)
+np.set_printoptions(precision=6, suppress=True, threshold=np.inf)
 
 # UNITS
 K2au    = unit_to_internal("temperature", "kelvin", 1.0)
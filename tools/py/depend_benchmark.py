@@ -0,0 +1,120 @@
+#!/usr/bin/env python2
+
+""" depend_benchmark.py
+
+Relies on the infrastructure of i-pi, so the ipi package should
+be installed in the Python module directory, or the i-pi
+main directory must be added to the PYTHONPATH environment variable.
+
+Micro-benchmarks for the depend machinery. Builds dependency networks
+of different shapes and sizes, and measures the time needed to set a
+quantity (tainting everything downstream) and to read back the
+dependent quantities (updating them), with and without freezing the
+network with dfreeze().
+
+The networks are:
+   chain: each value depends on the previous one.
+   fan: all the values depend on a single root.
+   layers: layers of ten values, each depending on all the values of the
+      previous layer.
+
+Syntax:
+   depend_benchmark.py [nrepeats]
+"""
+
+
+import sys
+import time
+
+import numpy as np
+
+from ipi.utils.depend import depend_value, depend_array, dfreeze, dthaw
+
+
+def val(d):
+    """Returns the value of a depend_value, or the first element of a depend_array."""
+
+    if isinstance(d, depend_value):
+        return d.get()
+    return d[0]
+
+
+def build_chain(n):
+    """Returns a root array and a chain of n values depending on it."""
+
+    root = depend_array(name="root", value=np.zeros(3))
+    nodes = []
+    prev = root
+    for i in range(n):
+        nodes.append(depend_value(name="c%d" % i, func=(lambda p=prev: val(p) + 1.0), dependencies=[prev]))
+        prev = nodes[-1]
+    return root, nodes
+
+
+def build_fan(n):
+    """Returns a root array and n values depending on it."""
+
+    root = depend_array(name="root", value=np.zeros(3))
+    nodes = [depend_value(name="f%d" % i, func=(lambda: root[0] * 2.0), dependencies=[root]) for i in range(n)]
+    return root, nodes
+
+
+def build_layers(n, width=10):
+    """Returns a root array and n values arranged in fully connected layers."""
+
+    root = depend_array(name="root", value=np.zeros(3))
+    nodes = []
+    prev = [root]
+    for l in range(n // width):
+        layer = []
+        for i in range(width):
+            layer.append(depend_value(name="l%d_%d" % (l, i),
+                                      func=(lambda ps=prev: sum(val(p) for p in ps)),
+                                      dependencies=prev))
+        nodes += layer
+        prev = layer
+    return root, nodes
+
+
+def bench(root, nodes, nrep):
+    """Times tainting and updating a network.
+
+    Returns:
+       A tuple with the times in microseconds needed to taint the network
+       when it is up to date, to taint it again when it is already tainted,
+       and to update all the values after the root has changed.
+    """
+
+    ttaint = tretaint = tupdate = 0.0
+    for i in range(nrep):
+        t0 = time.time()
+        for v in nodes:
+            v.get()
+        t1 = time.time()
+        root[0] = i
+        t2 = time.time()
+        root[0] = i
+        t3 = time.time()
+        tupdate += t1 - t0
+        ttaint += t2 - t1
+        tretaint += t3 - t2
+
+    return ttaint / nrep * 1e6, tretaint / nrep * 1e6, tupdate / nrep * 1e6
+
+
+def main(nrep=200):
+
+    print "# %8s %6s %8s %14s %14s %14s" % ("network", "size", "frozen", "taint [us]", "retaint [us]", "update [us]")
+    for name, build in [("chain", build_chain), ("fan", build_fan), ("layers", build_layers)]:
+        for n in [10, 100, 500]:
+            for frozen in [False, True]:
+                root, nodes = build(n)
+                if frozen:
+                    dfreeze([root] + nodes)
+                bench(root, nodes, 2)
+                print "  %8s %6d %8s %14.2f %14.2f %14.2f" % ((name, n, frozen) + bench(root, nodes, nrep))
+                dthaw()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
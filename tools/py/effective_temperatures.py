@@ -8,7 +8,7 @@ for all degrees of freedom. The output is saved to 'prefix.effective_temperature
 in the folder which contains the input files. The results are printed out in the format: "atom",
 "effective temperatures for x, y, and z directions", and "average effective temperature".
 
-The script assumes that the input files are in 'xyz' format and prefix.for_*.xyz (forces)
+The script assumes that the input files are in 'xyz' (or 'ipibin') format and prefix.for_*.xyz (forces)
 naming scheme. This requires the following lines in input.xml file:
 <trajectory filename='force' stride='1' format='xyz' cell_units='angstrom'>
 forces </trajectory>
@@ -23,6 +23,7 @@ The computed effective temperatures are in Kelvin.
 import numpy as np
 import sys
 import glob
+import os
 
 from ipi.utils.units import unit_to_internal, unit_to_user, Constants
 from ipi.utils.io import read_file
@@ -59,6 +60,7 @@ def effectiveTemperatures(prefix, temp, ss=0):
 
     # open input and output files
     ifor = [open(fn, "r") for fn in fns_for]
+    mfor = [os.path.splitext(fn)[1][1:] for fn in fns_for]  # formats from the extensions
     iOut = open(fn_out, "w")
 
     # Some constants
@@ -77,7 +79,7 @@ def effectiveTemperatures(prefix, temp, ss=0):
 
         try:
             for i in range(nbeads):
-                ret = read_file("xyz", ifor[i], dimension='force')["atoms"]
+                ret = read_file(mfor[i], ifor[i], dimension='force')["atoms"]
                 if natoms == 0:
                     m, natoms, names = ret.m, ret.natoms, ret.names
                     f = np.zeros((nbeads, 3 * natoms))
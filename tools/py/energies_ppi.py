@@ -11,7 +11,7 @@ located in the folder which contains the input files. The results are printed ou
 "improved potential energy estimator", "potential energy estimator", "potential energy PPI correction",
 "improved kinetic energy estimator", "virial kinetic energy estimator", "kinetic energy energy PPI correction".
 
-The script assumes that the input files are in 'xyz' format, with prefix.out (contains simulation time and
+The script assumes that the input files are in 'xyz' (or 'ipibin') format, with prefix.out (contains simulation time and
 potential energy among other output properties), prefix.pos_*.xyz (positions) and
 prefix.for_*.xyz (forces) naming scheme. This requires the following lines in input.xml file:
 <properties filename='out' stride='n'> [step, time, potential] </properties>
@@ -88,7 +88,9 @@ def energies(prefix, temp, ss=0, unit=''):
 
     # open input and output files
     ipos = [open(fn, "r") for fn in fns_pos]
+    mpos = [os.path.splitext(fn)[1][1:] for fn in fns_pos]  # formats from the extensions
     ifor = [open(fn, "r") for fn in fns_for]
+    mfor = [os.path.splitext(fn)[1][1:] for fn in fns_for]  # formats from the extensions
     iU = open(fns_iU, "r")
     iE = open(fn_out_en, "w")
 
@@ -126,13 +128,13 @@ def energies(prefix, temp, ss=0, unit=''):
 
         try:
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i], dimension='length')["atoms"]
+                ret = read_file(mpos[i], ipos[i], dimension='length')["atoms"]
                 if natoms == 0:
                     m, natoms = ret.m, ret.natoms
                     q = np.zeros((nbeads, 3 * natoms))
                     f = np.zeros((nbeads, 3 * natoms))
                 q[i, :] = ret.q
-                f[i, :] = read_file("xyz", ifor[i], dimension='force')["atoms"].q
+                f[i, :] = read_file(mfor[i], ifor[i], dimension='force')["atoms"].q
             U, time = read_U(iU, potentialEnergyUnit, potentialEnergy_index, time_index)
         except EOFError:  # finished reading files
             sys.exit(0)
@@ -9,7 +9,7 @@ frame. The output is saved to 'prefix.heat_capacity.dat' file which is located i
 files. The results are printed out in the format: "time frame", "improved heat capacity estimator", "primitive heat
 capacity estimator", "PPI correction".
 
-The script assumes that the input files are in 'xyz' format, with prefix.out (contains simulation time and
+The script assumes that the input files are in 'xyz' (or 'ipibin') format, with prefix.out (contains simulation time and
 potential energy among other output properties), prefix.pos_*.xyz (positions) and prefix.for_*.xyz (forces) naming
 scheme. This would require the following lines in input.xml file:
 <properties filename='out' stride='n'> [step, time, potential] </properties>
@@ -86,7 +86,9 @@ def heatCapacity(prefix, temp, ss=0):
 
     # open input and output files
     ipos = [open(fn, "r") for fn in fns_pos]
+    mpos = [os.path.splitext(fn)[1][1:] for fn in fns_pos]  # formats from the extensions
     ifor = [open(fn, "r") for fn in fns_for]
+    mfor = [os.path.splitext(fn)[1][1:] for fn in fns_for]  # formats from the extensions
     iU = open(fns_iU, "r")
     iC = open(fn_out_en, "w")
 
@@ -117,13 +119,13 @@ def heatCapacity(prefix, temp, ss=0):
 
         try:
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i], dimension='length')["atoms"]
+                ret = read_file(mpos[i], ipos[i], dimension='length')["atoms"]
                 if natoms == 0:
                     m, natoms = ret.m, ret.natoms
                     q = np.zeros((nbeads, 3 * natoms))
                     f = np.zeros((nbeads, 3 * natoms))
                 q[i, :] = ret.q
-                f[i, :] = read_file("xyz", ifor[i], dimension='force')["atoms"].q
+                f[i, :] = read_file(mfor[i], ifor[i], dimension='force')["atoms"].q
             U, time = read_U(iU, potentialEnergyUnit, potentialEnergy_index, time_index)
         except EOFError:  # finished reading files
             sys.exit(0)
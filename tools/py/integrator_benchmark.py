@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+
+""" integrator_benchmark.py
+
+Relies on the infrastructure of i-pi, so the ipi package should
+be installed in the Python module directory, or the i-pi
+main directory must be added to the PYTHONPATH environment variable.
+
+Micro-benchmarks for the momentum and centroid steps of the velocity
+Verlet integrator. Sets up a path integral NVE simulation of a
+Lennard-Jones cluster with the centre of mass and a few atoms fixed,
+computes the forces once, and then times the pstep, pconstraints and
+qcstep methods of the integrator, which only read the forces.
+
+The forces of the first call are computed by the Python Lennard-Jones
+forcefield, which scales with the square of the number of atoms, so
+the setup takes a while for large systems.
+
+Running the script on two versions of i-PI gives the speedup of the
+changes between them.
+
+Syntax:
+   integrator_benchmark.py [nbeads] [natoms] [nrepeats]
+"""
+
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from ipi.engine.simulation import Simulation
+from ipi.utils.depend import dstrip
+
+
+input_xml = """
+<simulation verbosity='quiet' threading='False'>
+   <output prefix='bench'></output>
+   <total_steps> 1 </total_steps>
+   <fflj name='lj' pbc='False'>
+      <parameters> { eps: 0.0005, sigma: 6.0 } </parameters>
+   </fflj>
+   <system>
+      <initialize nbeads='%d'>
+         <file mode='xyz' units='atomic_unit'> init.xyz </file>
+         <velocities mode='thermal' units='kelvin'> 20 </velocities>
+      </initialize>
+      <forces><force forcefield='lj'></force></forces>
+      <ensemble>
+         <temperature units='kelvin'> 20 </temperature>
+      </ensemble>
+      <motion mode='dynamics'>
+         <fixcom> True </fixcom>
+         <fixatoms> [ 0, 1, 2, 3 ] </fixatoms>
+         <dynamics mode='nve'>
+            <timestep units='femtosecond'> 1.0 </timestep>
+         </dynamics>
+      </motion>
+   </system>
+</simulation>
+"""
+
+
+def setup(nbeads, natoms):
+    """Writes the input of a Lennard-Jones cluster on a cubic lattice, and
+    returns the simulation that it defines."""
+
+    nside = int(np.ceil(natoms ** (1.0 / 3.0)))
+    q = 7.0 * np.array([[i, j, k] for i in range(nside) for j in range(nside) for k in range(nside)], float)[:natoms]
+    with open("init.xyz", "w") as f:
+        f.write("%d\n# CELL(abcABC):  1000.0  1000.0  1000.0  90.0  90.0  90.0\n" % natoms)
+        for x in q:
+            f.write("Ar %f %f %f\n" % tuple(x))
+    with open("input.xml", "w") as f:
+        f.write(input_xml % nbeads)
+
+    return Simulation.load_from_xml("input.xml", custom_verbosity="quiet")
+
+
+def bench(integrator, nrep):
+    """Times the steps of an integrator.
+
+    Returns:
+       A tuple with the times in milliseconds needed for a momentum step,
+       for the application of the constraints and for a centroid step.
+    """
+
+    times = []
+    for step in [integrator.pstep, integrator.pconstraints, integrator.qcstep]:
+        step()
+        t0 = time.time()
+        for i in range(nrep):
+            step()
+        times.append((time.time() - t0) / nrep * 1e3)
+    return tuple(times)
+
+
+def main(nbeads=64, natoms=1000, nrep=100):
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    simul = None
+    try:
+        os.chdir(tmpdir)
+        simul = setup(nbeads, natoms)
+        for ff in simul.fflist.values():
+            ff.run()
+
+        motion = simul.syslist[0].motion
+        dstrip(motion.forces.f)
+
+        print "# %6s %6s %14s %14s %14s" % ("nbeads", "natoms", "pstep [ms]", "pconstr [ms]", "qcstep [ms]")
+        print "  %6d %6d %14.3f %14.3f %14.3f" % ((nbeads, natoms) + bench(motion.integrator, nrep))
+    finally:
+        if simul is not None:
+            for ff in simul.fflist.values():
+                ff.stop()
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
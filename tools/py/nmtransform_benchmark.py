@@ -0,0 +1,73 @@
+#!/usr/bin/env python2
+
+""" nmtransform_benchmark.py
+
+Relies on the infrastructure of i-pi, so the ipi package should
+be installed in the Python module directory, or the i-pi
+main directory must be added to the PYTHONPATH environment variable.
+
+Micro-benchmarks for the FFT normal mode transformation. Measures the
+time of a transformation to the normal modes and back with nm_fft, for
+ring polymers of different sizes, with and without open paths, and its
+largest deviation from the matrix transformation of nm_trans.
+
+The FFT is done with pyFFTW if it can be imported, and with NumPy
+otherwise. Running the script on two versions of i-PI gives the speedup
+of the changes between them.
+
+Syntax:
+   nmtransform_benchmark.py [nrepeats]
+"""
+
+
+import sys
+import time
+
+import numpy as np
+
+from ipi.utils.nmtransform import nm_fft, nm_trans
+from ipi.utils.messages import verbosity
+
+
+def bench(nmt, q, nrep):
+    """Returns the time in milliseconds needed to transform q to the normal
+    modes and back."""
+
+    nmt.nm2b(nmt.b2nm(q))
+    t0 = time.time()
+    for i in range(nrep):
+        nmt.nm2b(nmt.b2nm(q))
+    return (time.time() - t0) / nrep * 1e3
+
+
+def error(nmt, q):
+    """Returns the largest deviation of the fft transformation of q from
+    the matrix one. The transform should not have been used before, as the
+    work arrays of some implementations change type after the first call."""
+
+    ref = nm_trans(nmt.nbeads, open_paths=nmt._open)
+    qnm = np.array(nmt.b2nm(q))
+    err = np.absolute(qnm - ref.b2nm(q)).max()
+    return max(err, np.absolute(nmt.nm2b(ref.b2nm(q)) - q).max())
+
+
+def main(nrep=200):
+
+    verbosity.level = "quiet"
+    try:
+        import pyfftw
+        print "# using pyFFTW"
+    except ImportError:
+        print "# using NumPy"
+
+    print "# %6s %6s %6s %14s %14s" % ("nbeads", "natoms", "open", "time [ms]", "max error")
+    for nbeads, natoms, nopen in [(32, 1000, 0), (128, 100, 0), (32, 1000, 100), (31, 1000, 0)]:
+        q = np.random.RandomState(12345).uniform(-10.0, 10.0, (nbeads, 3 * natoms))
+        opaths = range(0, natoms, natoms // nopen) if nopen > 0 else None
+        err = error(nm_fft(nbeads, natoms, open_paths=opaths), q)
+        nmt = nm_fft(nbeads, natoms, open_paths=opaths)
+        print "  %6d %6d %6d %14.3f %14.2e" % (nbeads, natoms, nopen, bench(nmt, q, nrep), err)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -7,7 +7,7 @@ kinetic energy estimator for each particle and time frame, printing it out in
 the same format as it would have been obtained had the run included the
 kinetic_cv and kinetic_od output trajectories.
 
-Assumes the input files are in xyz format and atomic units, with
+Assumes the input files are in xyz (or ipibin) format and atomic units, with
 prefix.pos_*.xyz and prefix.for_*.xyz naming scheme.
 
 Syntax:
@@ -18,6 +18,7 @@ Syntax:
 import numpy as np
 import sys
 import glob
+import os
 from ipi.utils.io import read_file
 from ipi.engine.beads import Beads
 from ipi.utils.depend import dstrip
@@ -59,7 +60,9 @@ def main(prefix, temp):
 
     # open input and output files
     ipos = [open(fn, "r") for fn in fns_pos]
+    mpos = [os.path.splitext(fn)[1][1:] for fn in fns_pos]  # formats from the extensions
     ifor = [open(fn, "r") for fn in fns_for]
+    mfor = [os.path.splitext(fn)[1][1:] for fn in fns_for]  # formats from the extensions
     ikin = open(fn_out_kin, "w")
     ikod = open(fn_out_kod, "w")
 
@@ -75,9 +78,9 @@ def main(prefix, temp):
         # load one frame
         try:
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i])
+                ret = read_file(mpos[i], ipos[i])
                 pos = ret["atoms"]
-                ret = read_file("xyz", ifor[i])
+                ret = read_file(mfor[i], ifor[i])
                 force = ret["atoms"]
                 if natoms == 0:
                     natoms = pos.natoms
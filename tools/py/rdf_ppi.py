@@ -9,7 +9,7 @@ standard i-PI output files and computes a conventional and PPI radial distributi
 The output is saved to two files which are created in the folder which contains the input files.
 The results are printed out in the format: "distance", "RDF".
 
-The script assumes that the input files are in 'xyz' format, with prefix.pos_*.xyz (positions) and
+The script assumes that the input files are in 'xyz' (or 'ipibin') format, with prefix.pos_*.xyz (positions) and
 prefix.for_*.xyz (forces) naming scheme.
 This would require the following lines in input.xml file:
 <trajectory filename='pos' stride='n' format='xyz' cell_units='angstrom'> positions </trajectory>
@@ -76,7 +76,9 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
 
     # open input and output files
     ipos = [open(fn, "r") for fn in fns_pos]
+    mpos = [os.path.splitext(fn)[1][1:] for fn in fns_pos]  # formats from the extensions
     ifor = [open(fn, "r") for fn in fns_for]
+    mfor = [os.path.splitext(fn)[1][1:] for fn in fns_for]  # formats from the extensions
     # iRDF, iRDFq = open(fn_out_rdf, "w"), open(fn_out_rdf_q, "w")
 
     # Species for RDF
@@ -114,7 +116,7 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
 
         try:
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i], dimension='length')
+                ret = read_file(mpos[i], ipos[i], dimension='length')
                 if natoms == 0:
                     mass, natoms = ret["atoms"].m, ret["atoms"].natoms
                     pos = np.zeros((nbeads, 3 * natoms), order='F')
@@ -123,7 +125,7 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
                 inverseCell = ret["cell"].get_ih()
                 cellVolume = ret["cell"].get_volume()
                 pos[i, :] = ret["atoms"].q
-                force[i, :] = read_file("xyz", ifor[i], dimension='force')["atoms"].q
+                force[i, :] = read_file(mfor[i], ifor[i], dimension='force')["atoms"].q
         except EOFError:  # finished reading files
             noteof = False
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python2
+
+""" thermostat_benchmark.py
+
+Relies on the infrastructure of i-pi, so the ipi package should
+be installed in the Python module directory, or the i-pi
+main directory must be added to the PYTHONPATH environment variable.
+
+Micro-benchmarks for the path integral Langevin thermostats. Binds the
+PILE_L and PILE_G thermostats to the normal modes of ring polymers of
+different sizes, and measures the time of a thermostat step.
+
+Running the script on two versions of i-PI gives the speedup of the
+changes between them.
+
+Syntax:
+   thermostat_benchmark.py [nrepeats]
+"""
+
+
+import sys
+import time
+
+import numpy as np
+
+from ipi.engine.beads import Beads
+from ipi.engine.normalmodes import NormalModes
+from ipi.engine.ensembles import Ensemble
+from ipi.engine.motion import Motion
+from ipi.engine.thermostats import ThermoPILE_L, ThermoPILE_G
+from ipi.utils.prng import Random
+
+
+def setup(nbeads, natoms):
+    """Returns the normal modes of a ring polymer with random positions
+    and momenta."""
+
+    rs = np.random.RandomState(12345)
+    beads = Beads(natoms, nbeads)
+    beads.q = rs.uniform(size=(nbeads, 3 * natoms))
+    beads.p = rs.normal(size=(nbeads, 3 * natoms))
+    beads.m = np.ones(natoms) * 1837.0
+    nm = NormalModes(mode="rpmd", transform_method="matrix")
+    nm.bind(Ensemble(temp=1e-3), Motion(), beads=beads)
+    return nm
+
+
+def bench(thermo, nrep):
+    """Returns the time in milliseconds needed for a thermostat step."""
+
+    thermo.step()
+    t0 = time.time()
+    for i in range(nrep):
+        thermo.step()
+    return (time.time() - t0) / nrep * 1e3
+
+
+def main(nrep=50):
+
+    print "# %6s %6s %14s %14s" % ("nbeads", "natoms", "PILE_L [ms]", "PILE_G [ms]")
+    for nbeads, natoms in [(256, 8), (64, 64), (32, 1000)]:
+        nm = setup(nbeads, natoms)
+        times = []
+        for cls in [ThermoPILE_L, ThermoPILE_G]:
+            thermo = cls(temp=nbeads * 1e-3, dt=40.0, tau=400.0)
+            thermo.bind(nm=nm, prng=Random(seed=12345))
+            times.append(bench(thermo, nrep))
+        print "  %6d %6d %14.3f %14.3f" % ((nbeads, natoms) + tuple(times))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])